@@ -1,6 +1,8 @@
+import time
 from math import floor, ceil
 
-from vnpy.trader.utility import BarGenerator, ArrayManager
+from vnpy.trader.constant import Direction
+from vnpy.trader.utility import BarGenerator
 from vnpy_spreadtrading import (
     SpreadStrategyTemplate,
     SpreadAlgoTemplate,
@@ -11,6 +13,10 @@ from vnpy_spreadtrading import (
     BarData
 )
 
+# 共享代码库 spread_toolkit 需先在仓库根目录执行 pip install -e . 安装
+from spread_toolkit.instrumentation import HotPathMetrics
+from spread_toolkit.rolling import create_stats
+
 
 class ZscoreGridStrategy(SpreadStrategyTemplate):
     """"""
@@ -22,6 +28,14 @@ class ZscoreGridStrategy(SpreadStrategyTemplate):
     max_pos = 25
     payup = 10
     interval = 5
+    zscore_mode = "sma" # "sma"为固定窗口均值、标准差，"ewma"为指数加权
+    diff_algos = False # 目标委托的方向、价格、数量不变时不撤单重发
+    metrics_file = "" # 策略停止时写入耗时统计的文件，为空时不写入
+
+    # 设置为SpreadSignalHub实例后，同一价差上的多个策略共用K线合成和滚动统计量
+    signal_hub = None
+    # 设置为MetricsExporter实例后，策略的耗时统计通过其HTTP接口输出
+    metrics_exporter = None
 
     ma_value = 0.0
     z_score = 0.0
@@ -33,6 +47,9 @@ class ZscoreGridStrategy(SpreadStrategyTemplate):
         "max_pos",
         "payup",
         "interval",
+        "zscore_mode",
+        "diff_algos",
+        "metrics_file",
     ]
     variables = [
         "ma_value",
@@ -50,8 +67,30 @@ class ZscoreGridStrategy(SpreadStrategyTemplate):
         """"""
         super().__init__(strategy_engine, strategy_name, spread, setting)
 
-        self.bg = BarGenerator(self.on_spread_bar)
-        self.am = ArrayManager(self.ma_window + 10)
+        # 与原先ArrayManager(ma_window + 10)相同，收到足够的K线后才开始交易
+        self.warmup_bars = self.ma_window + 10
+        self.bar_count = 0
+
+        # 热路径耗时统计，tick_ns 为正在处理的tick到达的时间，用于计算tick到下单决策的耗时
+        self.metrics = HotPathMetrics(
+            strategy_name,
+            metrics = ["on_spread_data", "on_spread_tick", "tick_to_decision", "on_spread_signal"],
+            counters = ["algo_skipped", "algo_cancels", "algo_starts"],
+        )
+        self.tick_ns = None
+        # 当前挂单对应的目标委托 (方向, 价格, 数量)
+        self.active_order = None
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.register(self.metrics)
+
+        # 信号中心只提供固定窗口的统计量，ewma模式下仍由策略自己计算
+        self.use_signal_hub = self.signal_hub is not None and self.zscore_mode == "sma"
+        if self.use_signal_hub:
+            self.signal_hub.subscribe(self.spread_name, self.ma_window, self.on_spread_signal)
+        else:
+            self.bg = BarGenerator(self.on_spread_bar)
+            # 均值、标准差每根K线增量更新一次，不再对整个缓存重新计算
+            self.stats = create_stats(self.zscore_mode, self.ma_window)
 
     def on_init(self):
         """
@@ -72,53 +111,68 @@ class ZscoreGridStrategy(SpreadStrategyTemplate):
         Callback when strategy is stopped.
         """
         self.write_log("策略停止")
+
+        if self.metrics_file:
+            self.metrics.write(self.metrics_file)
     def on_spread_data(self):
         """
         Callback when spread price is updated.
         """
+        start = time.perf_counter_ns()
         tick = self.get_spread_tick()
         self.on_spread_tick(tick)
+        self.metrics.observe_since("on_spread_data", start)
 
     def on_spread_tick(self, tick: TickData):
         """
         Callback when new spread tick data is generated.
         """
-        self.bg.update_tick(tick)
+        start = time.perf_counter_ns()
+        if self.use_signal_hub:
+            # 信号中心合成出K线时，把收到这个tick的时间随K线一起传回
+            self.signal_hub.update_tick(self.spread_name, tick, self, start)
+        else:
+            self.tick_ns = start
+            self.bg.update_tick(tick)
+            self.tick_ns = None
+        self.metrics.observe_since("on_spread_tick", start)
 
     def on_spread_bar(self, bar: BarData):
         """"""
-        self.am.update_bar(bar)
-        if not self.am.inited or not self.trading:
+        # 共用信号中心时，K线交给信号中心统一计算后再回调on_spread_signal
+        if self.use_signal_hub:
+            self.signal_hub.update_bar(self.spread_name, bar)
+            return
+
+        self.stats.update(bar.close_price)
+        self.on_spread_signal(bar, self.stats.mean, self.stats.std, self.tick_ns)
+
+    def on_spread_signal(self, bar: BarData, ma_value: float, std: float, tick_ns: int = None):
+        """
+        Callback when rolling mean and std of the spread are updated.
+        tick_ns 为合成出这根K线的tick到达的时间，加载历史K线时为None。
+        """
+        start = time.perf_counter_ns()
+        self.bar_count += 1
+        if self.bar_count < self.warmup_bars or not self.trading:
             return
-        
-        # 撤销之前的挂单
-        self.stop_all_algos()
 
         # 计算当前 z_score
-        self.ma_value = self.am.sma(self.ma_window)
+        self.ma_value = ma_value
         self.price_change = bar.close_price - self.ma_value
-        self.std = self.am.std(self.ma_window)
-        self.z_score = self.price_change / self.std
+        self.std = std
+        self.z_score = self.price_change / self.std if self.std > 0 else 0.0
 
         # 超价委托
         long_price = bar.close_price * 1.01
         short_price = bar.close_price * 0.99
 
         # 如果价格穿越均线全部平仓
+        order = None
         if self.spread_pos > 0 and self.price_change >= 0:
-            self.start_short_algo(
-                short_price,
-                abs(self.spread_pos),
-                payup=self.payup,
-                interval=self.interval
-            )
+            order = (Direction.SHORT, short_price, abs(self.spread_pos))
         elif self.spread_pos < 0 and self.price_change <= 0:
-            self.start_long_algo(
-                long_price,
-                abs(self.spread_pos),
-                payup=self.payup,
-                interval=self.interval
-            )
+            order = (Direction.LONG, long_price, abs(self.spread_pos))
         # 若无持仓则判断条件是否开仓
         else:
             if self.price_change > (0 + self.std):
@@ -126,27 +180,49 @@ class ZscoreGridStrategy(SpreadStrategyTemplate):
                 target_pos = max(-self.max_pos, target_pos)
 
                 if target_pos < self.spread_pos:
-                    self.start_short_algo(
-                        short_price,
-                        abs(target_pos - self.spread_pos),
-                        payup=self.payup,
-                        interval=self.interval
-                    )
+                    order = (Direction.SHORT, short_price, abs(target_pos - self.spread_pos))
             
             elif self.price_change < (0 - self.std):
                 target_pos = -ceil(self.z_score + 1) * self.volume_multiplier
                 target_pos = min(self.max_pos, target_pos)
                 if target_pos > self.spread_pos:
-                    self.start_long_algo(
-                        long_price,
-                        abs(target_pos - self.spread_pos),
-                        payup=self.payup,
-                        interval=self.interval
-                    )
-        
+                    order = (Direction.LONG, long_price, abs(target_pos - self.spread_pos))
+
+        self.send_target_order(order)
+
+        # 只统计由tick合成的K线，加载历史数据时没有tick
+        if tick_ns is not None:
+            self.metrics.observe_since("tick_to_decision", tick_ns)
+        self.metrics.observe_since("on_spread_signal", start)
+
         # 更新图形界面
         self.put_event()
 
+    def send_target_order(self, order: tuple):
+        """
+        撤销之前的挂单，按目标委托 (方向, 价格, 数量) 启动新的价差算法，order 为None时只撤单。
+        diff_algos 为True且目标委托与仍在运行的挂单相同时，保留原挂单。
+        """
+        if self.diff_algos and order == self.active_order and (order is None or self.algoids):
+            if order is not None:
+                self.metrics.increment("algo_skipped")
+            return
+
+        if self.algoids:
+            self.metrics.increment("algo_cancels", len(self.algoids))
+        self.stop_all_algos()
+        self.active_order = None
+        if order is None:
+            return
+
+        direction, price, volume = order
+        if direction == Direction.LONG:
+            self.start_long_algo(price, volume, payup=self.payup, interval=self.interval)
+        else:
+            self.start_short_algo(price, volume, payup=self.payup, interval=self.interval)
+        self.active_order = order
+        self.metrics.increment("algo_starts")
+
     def on_spread_pos(self):
         """
         Callback when spread position is updated.
@@ -0,0 +1,148 @@
+"""
+本地的模拟行情服务，用于测试、比较并发下载。
+
+FakeDataServer 在后台线程中运行一个HTTP服务，行情由 SyntheticDataSource 生成，
+可以设置每个请求的延迟、按比例随机返回503错误、超过每秒请求数量时返回429错误，
+并记录请求数量、同时进行的请求数量的峰值以及每个合约被请求的次数。
+HttpDataSource 为对应的客户端，实现 DataSource 接口，可以交给 PriceCache 或 ConcurrentFetcher 使用。
+"""
+
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from spread_toolkit.datasource import DataSource
+from synthetic import SyntheticDataSource
+
+
+class FakeDataServer:
+    """
+    latency 为每个请求的处理时间（秒），failure_rate 为返回503错误的比例，
+    rate_limit 为每秒最多处理的请求数量，超过时返回429错误，为None时不限制。
+    """
+
+    def __init__(
+        self,
+        source: SyntheticDataSource = None,
+        latency: float = 0.05,
+        failure_rate: float = 0.0,
+        rate_limit: float = None,
+        seed: int = 0,
+    ) -> None:
+        self.source = source if source is not None else SyntheticDataSource()
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak_active = 0
+        self.recent = collections.deque()
+        self.stats = {"requests": 0, "served": 0, "failed": 0, "throttled": 0}
+        self.contract_requests = collections.Counter()
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeDataServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> "FakeDataServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(request.path).query))
+        with self.lock:
+            self.stats["requests"] += 1
+            self.contract_requests[query.get("order_book_id")] += 1
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 1.0:
+                self.recent.popleft()
+            throttled = self.rate_limit is not None and len(self.recent) >= self.rate_limit
+            if not throttled:
+                self.recent.append(now)
+            failed = not throttled and self.rng.random() < self.failure_rate
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            time.sleep(self.latency)
+            if throttled or failed:
+                with self.lock:
+                    self.stats["throttled" if throttled else "failed"] += 1
+                request.send_error(429 if throttled else 503)
+                return
+            price = self.source.get_price(query["order_book_id"], query["start_date"], query["end_date"], query.get("frequency", "1d"))
+            body = json.dumps({
+                "index": pd.DatetimeIndex(price.index).as_unit("ns").asi8.tolist(),
+                "columns": list(price.columns),
+                "data": price.to_numpy().tolist(),
+            }).encode("utf-8")
+            request.send_response(200)
+            request.send_header("Content-Type", "application/json")
+            request.send_header("Content-Length", str(len(body)))
+            request.end_headers()
+            request.wfile.write(body)
+            with self.lock:
+                self.stats["served"] += 1
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class HttpDataSource(DataSource):
+    """
+    FakeDataServer 的客户端，HTTP错误、连接错误时抛出 OSError（urllib.error.URLError）。
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30.0) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1d") -> pd.DataFrame:
+        query = urllib.parse.urlencode({
+            "order_book_id": order_book_id,
+            "start_date": str(pd.Timestamp(start_date).date()),
+            "end_date": str(pd.Timestamp(end_date).date()),
+            "frequency": frequency,
+        })
+        with urllib.request.urlopen(f"{self.base_url}/price?{query}", timeout = self.timeout) as response:
+            payload = json.loads(response.read())
+        index = pd.DatetimeIndex(np.asarray(payload["index"], dtype = np.int64).view("datetime64[ns]"))
+        return pd.DataFrame(np.asarray(payload["data"], dtype = np.float64).reshape(len(index), -1), index = index, columns = payload["columns"])
@@ -0,0 +1,69 @@
+"""
+比较顺序下载和并发下载一个多腿价差公式全部合约行情所需的时间。
+
+行情来自本地的 FakeDataServer，每个请求有固定延迟，可以按比例注入503错误、设置每秒请求上限：
+
+    python benchmarks/fetch_benchmark.py
+    python benchmarks/fetch_benchmark.py --latency 0.1 --failure-rate 0.05 --rate 20 --max-workers 16
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCHMARK_DIR))
+sys.path.append(BENCHMARK_DIR)
+from fake_server import FakeDataServer, HttpDataSource
+from spread_toolkit.analysis import SpreadCalculation
+from spread_toolkit.fetcher import ConcurrentFetcher
+from synthetic import SyntheticDataSource
+
+
+INSTRUMENTS_CSV = os.path.join(os.path.dirname(BENCHMARK_DIR), "2.Futures Inter-commodity arbitrage analysis", "20230722_all_instruments.csv")
+
+FORMULA = "RB10 + HC10 - I09*1.6 - J09*0.5 - JM09*0.3"
+
+
+def run(catalog, server: FakeDataServer, args, max_workers: int) -> dict:
+    fetcher = ConcurrentFetcher(
+        HttpDataSource(server.url),
+        max_workers = max_workers,
+        rate = args.rate,
+        retries = args.retries,
+        backoff = args.backoff,
+    )
+    with fetcher:
+        calculation = SpreadCalculation(args.formula, args.years, catalog = catalog, fetcher = fetcher)
+        start = time.perf_counter()
+        calculation.calculate_spread()
+        elapsed = time.perf_counter() - start
+    return {"max_workers": max_workers, "seconds": elapsed, "rows": len(calculation.spread), **fetcher.stats}
+
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(description = "顺序下载与并发下载的耗时比较")
+    parser.add_argument("--formula", default = FORMULA)
+    parser.add_argument("--years", type = int, default = 15)
+    parser.add_argument("--latency", type = float, default = 0.05, help = "模拟服务每个请求的延迟（秒）")
+    parser.add_argument("--failure-rate", type = float, default = 0.0, help = "模拟服务返回503错误的比例")
+    parser.add_argument("--server-rate-limit", type = float, default = None, help = "模拟服务每秒最多处理的请求数量")
+    parser.add_argument("--rate", type = float, default = None, help = "客户端令牌桶每秒的请求数量")
+    parser.add_argument("--max-workers", type = int, default = 8)
+    parser.add_argument("--retries", type = int, default = 3)
+    parser.add_argument("--backoff", type = float, default = 0.05)
+    args = parser.parse_args(argv)
+
+    catalog = SpreadCalculation.load_catalog(INSTRUMENTS_CSV)
+    source = SyntheticDataSource(catalog.all_instruments)
+    for max_workers in (1, args.max_workers):
+        with FakeDataServer(source, args.latency, args.failure_rate, args.server_rate_limit) as server:
+            result = run(catalog, server, args, max_workers)
+            result.update(peak_server_concurrency = server.peak_active, server_requests = server.stats["requests"])
+        print(", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}" for key, value in result.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
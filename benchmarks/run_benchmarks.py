@@ -0,0 +1,433 @@
+"""
+价差分析、价差策略的性能基准测试。
+
+全部离线运行：合约信息使用仓库中的 20230703_all_instruments.csv、20230722_all_instruments.csv，
+行情使用 synthetic.SyntheticDataSource 生成，并预先写入临时目录中的 PriceCache，
+计时的部分与每晚任务读取本地缓存的情况相同。
+
+    python benchmarks/run_benchmarks.py                          # 运行全部基准，结果写入 benchmarks/results/
+    python benchmarks/run_benchmarks.py --save-baseline          # 同时保存为基准线 benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline other.json --threshold 0.2 --filter calculate_spread
+
+基准线与机器有关，应在运行每晚任务的同一台机器上生成。有基准线时逐项比较最短耗时，慢于基准线超过 threshold（默认20%）的项目列为性能退化，
+此时返回值为1，可以直接用在定时任务或CI中。plotly、vnpy没有安装时跳过对应的基准。
+"""
+
+import argparse
+import datetime as dt
+import gc
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.append(REPO_DIR)
+sys.path.append(BENCHMARK_DIR)
+from spread_toolkit.formula import compile_formula
+from spread_toolkit.price_cache import PriceCache
+from synthetic import SyntheticDataSource
+
+
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+CALENDAR_DIR = os.path.join(REPO_DIR, "1.Futures calendar arbitrage analysis")
+
+INTER_COMMODITY_DIR = os.path.join(REPO_DIR, "2.Futures Inter-commodity arbitrage analysis")
+
+STRATEGY_DIR = os.path.join(REPO_DIR, "3.Introduction to a Spread Trading Tool")
+
+# 1到5条腿的价差公式，均使用 20230722_all_instruments.csv 中的合约
+FORMULAS_BY_LEGS = {
+    1: "RB10",
+    2: "RB10 - HC10",
+    3: "RB10*1.6 - I09 - J09*0.5",
+    4: "RB10 + HC10 - I09*1.6 - J09*0.5",
+    5: "RB10 + HC10 - I09*1.6 - J09*0.5 - JM09*0.3",
+}
+
+# 跨期价差公式，使用 20230703_all_instruments.csv 中的合约
+CALENDAR_FORMULAS = ["MA05 - MA09", "RB01 - RB05", "I01 - I05", "M01 - M05", "TA01 - TA05"]
+
+# 各频率回溯的年数，分钟数据每个合约约9万根K线
+YEARS_TRACE_BACK = {"1d": 10, "1m": 2}
+
+
+class Benchmark:
+    """
+    setup 返回计时所需的对象，run(对象) 为计时的部分；items 为每次run处理的数据量（如K线数量），用于计算单位耗时。
+    """
+
+    def __init__(self, name: str, setup, run, params: dict = None, repeat: int = None) -> None:
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.params = params or {}
+        self.repeat = repeat
+
+
+def load_module(name: str, path: str):
+    """
+    目录名中有空格和点，不能直接import，按文件路径导入。
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Workspace:
+    """
+    各个基准共用的合约信息、合成行情和本地缓存，只在第一次用到时创建。
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+        self.modules = {}
+        self.caches = {}
+        self.calculations = {}
+
+    def module(self, folder: str):
+        if folder not in self.modules:
+            self.modules[folder] = load_module(f"spread_analysis_{len(self.modules)}", os.path.join(folder, "spread_analysis.py"))
+        return self.modules[folder]
+
+    def calculation(self, folder: str, formula: str, frequency: str = "1d", **kwargs):
+        module = self.module(folder)
+        calculation = module.SpreadCalculation(
+            formula,
+            YEARS_TRACE_BACK[frequency],
+            frequency = frequency,
+            price_cache = self.price_cache(folder),
+            verbose = False,
+            show_figure = False,
+            **kwargs,
+        )
+        return calculation
+
+    def price_cache(self, folder: str) -> PriceCache:
+        if folder not in self.caches:
+            catalog = self.module(folder).SpreadCalculation.load_catalog(self.module(folder).INSTRUMENTS_CSV)
+            source = SyntheticDataSource(catalog.all_instruments)
+            self.caches[folder] = PriceCache(os.path.join(self.cache_dir, os.path.basename(folder)), source)
+        return self.caches[folder]
+
+    def calculated(self, folder: str, formula: str, frequency: str = "1d"):
+        """
+        计算好价差的 SpreadCalculation，第一次调用时同时把行情写入本地缓存。
+        """
+        key = (folder, formula, frequency)
+        if key not in self.calculations:
+            calculation = self.calculation(folder, formula, frequency)
+            calculation.calculate_spread()
+            self.calculations[key] = calculation
+        return self.calculations[key]
+
+
+def contract_info_benchmarks(workspace: Workspace) -> list:
+    benchmarks = []
+    for folder, formulas in ((CALENDAR_DIR, CALENDAR_FORMULAS), (INTER_COMMODITY_DIR, list(FORMULAS_BY_LEGS.values()))):
+        def setup(folder = folder, formulas = formulas):
+            calculation = workspace.calculation(folder, formulas[0])
+            legs = [leg for formula in formulas for leg in compile_formula(formula).dependencies]
+            return calculation, legs
+
+        def run(state):
+            calculation, legs = state
+            for leg in legs:
+                calculation.get_contract_info(leg)
+            return len(legs)
+
+        kind = "calendar" if folder == CALENDAR_DIR else "inter_commodity"
+        benchmarks.append(Benchmark(f"get_contract_info[{kind}]", setup, run, {"formulas": formulas}))
+    return benchmarks
+
+
+def calculate_spread_benchmarks(workspace: Workspace) -> list:
+    benchmarks = []
+    for frequency in ("1d", "1m"):
+        for legs, formula in FORMULAS_BY_LEGS.items():
+            def setup(formula = formula, frequency = frequency):
+                # 先完整计算一次，行情写入本地缓存，计时部分只读取缓存和计算
+                workspace.calculated(INTER_COMMODITY_DIR, formula, frequency)
+                return workspace.calculation(INTER_COMMODITY_DIR, formula, frequency)
+
+            def run(calculation):
+                calculation.calculate_spread()
+                return len(calculation.spread)
+
+            benchmarks.append(Benchmark(
+                f"calculate_spread[{frequency},{legs}legs]",
+                setup,
+                run,
+                {"formula": formula, "frequency": frequency, "years_trace_back": YEARS_TRACE_BACK[frequency]},
+                repeat = 3 if frequency != "1d" else None,
+            ))
+
+    def setup_calendar():
+        workspace.calculated(CALENDAR_DIR, CALENDAR_FORMULAS[0])
+        return workspace.calculation(CALENDAR_DIR, CALENDAR_FORMULAS[0], trade_period_filter = True)
+
+    def run_calendar(calculation):
+        calculation.calculate_spread()
+        return len(calculation.spread)
+
+    benchmarks.append(Benchmark("calculate_spread[1d,calendar,filtered]", setup_calendar, run_calendar, {"formula": CALENDAR_FORMULAS[0]}))
+    return benchmarks
+
+
+def seasonal_benchmarks(workspace: Workspace) -> list:
+    benchmarks = []
+    for frequency in ("1d", "1m"):
+        def setup(frequency = frequency):
+            return workspace.calculated(INTER_COMMODITY_DIR, FORMULAS_BY_LEGS[2], frequency)
+
+        def run(calculation):
+            calculation.split_by_year()
+            return len(calculation.spread)
+
+        benchmarks.append(Benchmark(f"split_by_year[{frequency}]", setup, run, {"formula": FORMULAS_BY_LEGS[2]}))
+
+        def setup_mask(frequency = frequency):
+            calculation = workspace.calculated(CALENDAR_DIR, CALENDAR_FORMULAS[0], frequency)
+            return calculation, calculation.spread.index
+
+        def run_mask(state):
+            calculation, index = state
+            mask = calculation.find_arbitrage_period_mask(5, 9)
+            mask(index)
+            return len(index)
+
+        benchmarks.append(Benchmark(f"find_arbitrage_period_mask[{frequency}]", setup_mask, run_mask, {"formula": CALENDAR_FORMULAS[0]}))
+    return benchmarks
+
+
+def figure_benchmarks(workspace: Workspace) -> list:
+    benchmarks = []
+    for frequency in ("1d", "1m"):
+        for webgl, max_points in ((False, None), (True, 2000)):
+            def setup(frequency = frequency, webgl = webgl, max_points = max_points):
+                import plotly  # noqa: F401
+
+                calculation = workspace.calculated(INTER_COMMODITY_DIR, FORMULAS_BY_LEGS[2], frequency)
+                calculation.webgl = webgl
+                calculation.max_points = max_points
+                data = calculation.spread.copy()
+                data.index = data.index.astype(str)
+                return calculation, data
+
+            def run(state):
+                calculation, data = state
+                calculation.create_figure(data)
+                return len(data)
+
+            mode = "webgl" if webgl else "scatter"
+            benchmarks.append(Benchmark(f"create_figure[{frequency},{mode}]", setup, run, {"webgl": webgl, "max_points": max_points}, repeat = 3))
+    return benchmarks
+
+
+def strategy_benchmarks(workspace: Workspace) -> list:
+    benchmarks = []
+    for zscore_mode in ("sma", "ewma"):
+        def setup(zscore_mode = zscore_mode):
+            from vnpy.trader.constant import Exchange, Interval
+            from vnpy.trader.object import BarData
+            from spread_toolkit.replay import ReplayStrategyEngine
+
+            module = load_module("zscore_grid_strategy", os.path.join(STRATEGY_DIR, "zscore_grid_strategy.py"))
+            closes = 100.0 + np.cumsum(np.random.default_rng(0).normal(0.0, 1.0, 20000))
+            start = dt.datetime(2023, 1, 3, 9, 0)
+            bars = [
+                BarData(
+                    gateway_name = "SPREAD",
+                    symbol = "spread",
+                    exchange = Exchange.LOCAL,
+                    datetime = start + dt.timedelta(minutes = i),
+                    interval = Interval.MINUTE,
+                    open_price = close,
+                    high_price = close,
+                    low_price = close,
+                    close_price = close,
+                )
+                for i, close in enumerate(closes.tolist())
+            ]
+            return module.ZscoreGridStrategy, ReplayStrategyEngine, bars
+
+        def run(state):
+            strategy_class, engine_class, bars = state
+            engine = engine_class(record_calls = False)
+            strategy = engine.add_strategy(strategy_class, "benchmark", {"zscore_mode": zscore_mode})
+            engine.init_strategies()
+            for bar in bars:
+                strategy.on_spread_bar(bar)
+            return len(bars)
+
+        benchmarks.append(Benchmark(f"on_spread_bar[{zscore_mode}]", setup, run, {"bars": 20000, "zscore_mode": zscore_mode}))
+    return benchmarks
+
+
+def monitor_benchmarks(workspace: Workspace) -> list:
+    def setup():
+        from spread_toolkit.monitor import UniverseMonitor, simulated_leg_ticks
+        from spread_toolkit.scanner import calendar_formulas
+
+        catalog = workspace.calculation(INTER_COMMODITY_DIR, FORMULAS_BY_LEGS[2]).catalog
+        formulas = calendar_formulas(catalog)
+        legs = UniverseMonitor(formulas).symbols
+        return UniverseMonitor, formulas, list(simulated_leg_ticks(legs, 10000, tick_probability = 0.1))
+
+    def run(state):
+        monitor_class, formulas, feed = state
+        monitor = monitor_class(formulas)
+        for timestamp, legs, prices in feed:
+            monitor.update(timestamp, legs, prices)
+        return len(feed)
+
+    return [Benchmark("UniverseMonitor.update[calendar universe]", setup, run, {"batches": 10000, "tick_probability": 0.1}, repeat = 3)]
+
+
+def all_benchmarks(workspace: Workspace) -> list:
+    return (
+        contract_info_benchmarks(workspace)
+        + calculate_spread_benchmarks(workspace)
+        + seasonal_benchmarks(workspace)
+        + figure_benchmarks(workspace)
+        + strategy_benchmarks(workspace)
+        + monitor_benchmarks(workspace)
+    )
+
+
+def measure(benchmark: Benchmark, repeat: int) -> dict:
+    """
+    先运行一次预热，再计时repeat次；计时期间关闭垃圾回收，与timeit相同。
+    """
+    try:
+        state = benchmark.setup()
+    except ImportError as e:
+        return {"status": "skipped", "reason": str(e), "params": benchmark.params}
+
+    items = benchmark.run(state)
+    repeat = benchmark.repeat or repeat
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            benchmark.run(state)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    best = min(timings)
+    return {
+        "status": "ok",
+        "min": best,
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "repeat": repeat,
+        "items": items,
+        "per_item_us": best / items * 1e6 if items else None,
+        "params": benchmark.params,
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd = REPO_DIR, capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": dt.datetime.now().isoformat(timespec = "seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    返回每个基准与基准线的比较 (名称, 基准线耗时, 本次耗时, 比例, 是否退化)，只比较两边都成功运行的项目。
+    """
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if result.get("status") != "ok" or base is None or base.get("status") != "ok":
+            continue
+        ratio = result["min"] / base["min"] if base["min"] > 0 else float("inf")
+        rows.append((name, base["min"], result["min"], ratio, ratio > 1.0 + threshold))
+    return rows
+
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(description = "价差分析、价差策略的性能基准测试")
+    parser.add_argument("--output", default = None, help = "结果文件，默认为 benchmarks/results/时间.json")
+    parser.add_argument("--baseline", default = DEFAULT_BASELINE, help = "用于比较的基准线文件")
+    parser.add_argument("--save-baseline", action = "store_true", help = "把本次结果保存为基准线")
+    parser.add_argument("--threshold", type = float, default = 0.2, help = "比基准线慢超过该比例视为性能退化")
+    parser.add_argument("--repeat", type = int, default = 5, help = "每个基准计时的次数")
+    parser.add_argument("--filter", default = None, help = "只运行名称中包含该字符串的基准")
+    parser.add_argument("--cache-dir", default = None, help = "合成行情的缓存目录，默认为临时目录")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        workspace = Workspace(args.cache_dir or temp_dir)
+        results = {}
+        for benchmark in all_benchmarks(workspace):
+            if args.filter and args.filter not in benchmark.name:
+                continue
+            result = measure(benchmark, args.repeat)
+            results[benchmark.name] = result
+            if result["status"] == "ok":
+                print(f"{benchmark.name:<45} {result['min'] * 1000:>10.2f} ms  (median {result['median'] * 1000:.2f} ms)")
+            else:
+                print(f"{benchmark.name:<45} skipped: {result['reason']}")
+
+    report = {"environment": environment(), "results": results}
+    os.makedirs(RESULTS_DIR, exist_ok = True)
+    output = args.output or os.path.join(RESULTS_DIR, dt.datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    with open(output, "w", encoding = "utf-8") as f:
+        json.dump(report, f, ensure_ascii = False, indent = 2)
+    print(f"results written to {output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding = "utf-8") as f:
+            baseline = json.load(f)
+        print(f"\ncompared with {args.baseline} ({baseline['environment'].get('commit')})")
+        for name, base, current, ratio, regressed in compare(results, baseline["results"], args.threshold):
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<45} {base * 1000:>10.2f} -> {current * 1000:>10.2f} ms  x{ratio:.2f}{flag}")
+            if regressed:
+                regressions.append(name)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding = "utf-8") as f:
+            json.dump(report, f, ensure_ascii = False, indent = 2)
+        print(f"baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+基准测试用的合成行情数据源，不需要网络和rqdatac账号。
+
+每个合约的价格为随机游走，随机数种子由合约代码计算，同一合约每次生成的行情完全相同；
+日线为工作日，分钟线只包含合约信息表中 trading_hours 开市的分钟。
+"""
+
+import os
+import sys
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# 共享代码库 spread_toolkit 位于仓库根目录
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from spread_toolkit.datasource import DataSource
+from spread_toolkit.trading_hours import SessionCalendar
+
+
+# 没有交易时段信息的合约使用的交易时段
+DEFAULT_TRADING_HOURS = "21:01-23:00,09:01-10:15,10:31-11:30,13:31-15:00"
+
+NANOSECONDS_PER_MINUTE = 60 * 1000 * 1000 * 1000
+
+
+class SyntheticDataSource(DataSource):
+    """
+    all_instruments 用于查找合约的交易时段，为None时所有合约使用 DEFAULT_TRADING_HOURS。
+    生成过的行情保存在内存中，同一合约重复请求时直接截取。
+    """
+
+    def __init__(self, all_instruments: pd.DataFrame = None, price: float = 3000.0, volatility: float = 0.01) -> None:
+        self.price = price
+        self.volatility = volatility
+        self.trading_hours = {}
+        if all_instruments is not None:
+            self.trading_hours = dict(zip(all_instruments["order_book_id"], all_instruments["trading_hours"]))
+        self.generated = {}
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1d") -> pd.DataFrame:
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+        key = (order_book_id, frequency)
+        cached = self.generated.get(key)
+        if cached is None or cached.index[0] > start or cached.index[-1] < end:
+            cached = self.generate(order_book_id, start, end, frequency)
+            self.generated[key] = cached
+        return cached.loc[start:end + pd.Timedelta(days = 1) - pd.Timedelta(1)]
+
+    def generate(self, order_book_id: str, start: pd.Timestamp, end: pd.Timestamp, frequency: str) -> pd.DataFrame:
+        days = pd.bdate_range(start.normalize(), end.normalize()).as_unit("ns").asi8
+        if frequency == "1d":
+            times = days
+        else:
+            trading_hours = self.trading_hours.get(order_book_id)
+            if not isinstance(trading_hours, str):
+                trading_hours = DEFAULT_TRADING_HOURS
+            minutes = np.flatnonzero(SessionCalendar.from_trading_hours(trading_hours).is_open)
+            times = (days[:, None] + minutes[None, :] * NANOSECONDS_PER_MINUTE).ravel()
+
+        # 随机数种子只取决于合约代码和频率，与调用顺序无关
+        rng = np.random.default_rng(zlib.crc32(f"{order_book_id}:{frequency}".encode("utf-8")))
+        close = self.price * np.exp(np.cumsum(rng.normal(0.0, self.volatility, len(times))))
+        close = np.round(close, 1)
+        spread = np.abs(rng.normal(0.0, self.volatility * self.price / 4, len(times)))
+        return pd.DataFrame(
+            {
+                "open": close,
+                "high": close + spread,
+                "low": close - spread,
+                "close": close,
+                "volume": rng.integers(1, 1000, len(times)).astype(np.float64),
+            },
+            index = pd.DatetimeIndex(times.view("datetime64[ns]"), name = "datetime"),
+        )
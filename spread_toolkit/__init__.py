@@ -0,0 +1,5 @@
+"""
+价差分析共享代码库。
+
+两个价差分析脚本（跨期、跨品种）和价差策略共用的数据、计算工具都放在这里。
+"""
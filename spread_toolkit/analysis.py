@@ -0,0 +1,459 @@
+"""
+价差计算和季节图。
+
+跨期（如 "MA05 - MA09"）和跨品种（如 "RB10 - HC10"）价差共用同一个 SpreadCalculation，
+两个价差分析目录下的 spread_analysis.py 只是在此基础上设置各自的合约信息文件和输出方式。
+
+导入本模块不会导入 rqdatac 和 plotly：下载数据时才初始化 rqdatac（见 session.ensure_rqdata），
+画图时才导入 plotly，导出静态图片时才导入 matplotlib。
+"""
+
+import os
+import re
+
+import pandas as pd
+
+from .continuous import active_contracts, align_continuous, build_continuous, roll_schedule
+from .fetcher import ConcurrentFetcher
+from .formula import compile_formula
+from .instrument_catalog import InstrumentCatalog
+from .panel import PricePanel
+from .plotting import create_figure, save_static_plot
+from .price_cache import PriceCache, contract_date_range, parse_date, stack_contract_prices
+from .seasonal import expiry_seasonal_frame, seasonal_frame
+from .seasonal_query import SeasonalIndex
+from .session import ensure_rqdata
+from .spread_store import SpreadRecord, SpreadStore
+from .streaming import default_chunk_days, price_field_for, spread_chunks, stream_aligned, stream_continuous
+from .trade_window import delivery_exit_mask, month_window_mask
+from .trading_hours import SessionCalendar
+
+
+class SpreadCalculation:
+    """
+    formula 为价差公式，years_trace_back 为回溯的年数。
+    instruments_csv 为保存好的 rqdatac.all_instruments(type = "Future") 文件，
+    snapshot_path 为合约信息目录的快照文件，默认与csv文件同名、扩展名为 .pkl；
+    catalog 和 instruments_csv 都为空时从rqdatac下载合约信息。
+    verbose 为True时打印合约查询、下载进度，show_figure 为True时画图后直接显示。
+    webgl 为True时用 go.Scattergl 画图，max_points 不为空时每条曲线降采样到max_points个点，
+    分钟数据、多年数据画图时建议同时使用。
+    每条腿的历年合约按换月计划拼接成连续序列：在 roll_reference 列（如 "de_listed_date"、"start_delivery_date"）
+    之前 roll_days_before 个工作日换到下一个合约；back_adjust 为 "difference" 或 "ratio" 时对换月前的价格复权。
+    分钟、tick数据只在各腿交易时段（trading_hours）的交集内计算价差，max_staleness 不为空时（如 "5min"），
+    某条腿在该时间点没有价格时使用同一交易时段内、不超过 max_staleness 的最近价格。
+    panel 为预先载入的 PricePanel（如全部品种的分钟行情），不为空时直接从中读取行情，不再下载。
+    fetcher 为 ConcurrentFetcher 时，所有腿的全部合约同时下载（受其并发数、频率限制），否则逐个合约顺序下载。
+    """
+    def __init__(
+        self,
+        formula,
+        years_trace_back,
+        trade_period_filter = False,
+        price_cache: PriceCache = None,
+        catalog: InstrumentCatalog = None,
+        exit_days_before_delivery: int = None,
+        frequency: str = "1d",
+        instruments_csv: str = None,
+        snapshot_path: str = None,
+        verbose: bool = False,
+        show_figure: bool = False,
+        webgl: bool = False,
+        max_points: int = None,
+        roll_reference: str = "de_listed_date",
+        roll_days_before: int = 0,
+        back_adjust: str = None,
+        max_staleness = None,
+        panel: PricePanel = None,
+        fetcher: ConcurrentFetcher = None,
+    ) -> None:
+        self.formula = formula
+        self.years_trace_back = years_trace_back
+        # 合约信息目录只解析一次，解析结果保存为快照文件，下次启动时直接读取。
+        if catalog is None:
+            catalog = self.load_catalog(instruments_csv, snapshot_path)
+        self.catalog = catalog
+        self.all_instruments = catalog.all_instruments
+        self.spread = pd.DataFrame()
+        self.trade_period_filter = trade_period_filter
+        # 本地行情缓存，为None时每次都从rqdatac下载
+        self.price_cache = price_cache
+        # 不为None时，可交易时间段还需满足距离各腿首个交割日不少于N个交易日
+        self.exit_days_before_delivery = exit_days_before_delivery
+        # 行情频率，"1d"为日线，"1m"为分钟线，"tick"为tick数据
+        self.frequency = frequency
+        self.price_field = price_field_for(frequency)
+        self.verbose = verbose
+        self.show_figure = show_figure
+        self.webgl = webgl
+        self.max_points = max_points
+        self.roll_reference = roll_reference
+        self.roll_days_before = roll_days_before
+        self.back_adjust = back_adjust
+        self.max_staleness = max_staleness
+        self.panel = panel
+        self.fetcher = fetcher
+        # 各条腿的连续序列，calculate_spread 之后可用
+        self.leg_series = {}
+
+    @staticmethod
+    def load_catalog(instruments_csv: str = None, snapshot_path: str = None) -> InstrumentCatalog:
+        if instruments_csv is None:
+            # 可以通过访问rqdatac接口来获取期货合约基本信息，也可以通过读取保存好的文件。
+            rqdatac = ensure_rqdata()
+            return InstrumentCatalog(rqdatac.all_instruments(type = "Future"))
+        if snapshot_path is None:
+            snapshot_path = os.path.splitext(instruments_csv)[0] + ".pkl"
+        return InstrumentCatalog.from_csv(instruments_csv, snapshot_path = snapshot_path)
+
+    def get_contract_instruments(self):
+        """
+        返回合约信息，不包括指数类信息
+        """
+        all_instruments = self.all_instruments
+        contract_instruments = all_instruments[all_instruments["listed_date"] != "0000-00-00"].copy()
+        self.contract_instruments = contract_instruments
+
+    def get_index_instruments(self):
+        """
+        返回指数类信息，不包括合约信息
+        """
+        all_instruments = self.all_instruments
+        index_instruments = all_instruments[all_instruments["listed_date"] == "0000-00-00"].copy()
+        self.index_instruments = index_instruments
+
+    def lookup_contract_info(
+        self,
+        contract_from_formula: str, # e.g. MA09
+        ):
+        """
+        从交易代码和rqdata获取的all_instruments信息表中，
+        获取相应的历史合约代码。
+        例如已知MA09，要求获取过去N年的09合约代码，包括上市日期，退市日期。
+        """
+        # 品种、月份的解析和筛选由合约信息目录完成，只需查询一次索引。
+        # 过去最新N年的期货合约， N由years_trace_back决定。
+        contract_instruments = self.catalog.lookup(contract_from_formula, self.years_trace_back)
+        if self.verbose:
+            print(f"{len(contract_instruments)} years of symbol {contract_from_formula} historical contracts are found.")
+        columns = ["order_book_id", "listed_date", "de_listed_date","maturity_date_year", "start_delivery_date"]
+        # 分钟、tick数据按各条腿交易时段的交集对齐
+        if "trading_hours" in contract_instruments:
+            columns.append("trading_hours")
+        return contract_instruments[columns]
+
+    def get_contract_info(self, contract_from_formula: str):
+        return self.lookup_contract_info(contract_from_formula)
+
+    def download_hist_data(self, contract_info, start_date = None, end_date = None):
+        """
+        下载合约信息表中全部合约的行情，start_date、end_date 为空时使用各合约的上市、退市日期。
+        使用 panel 时直接返回面板中这些合约的全部行情，不按日期截取。
+        """
+        if self.panel is not None:
+            return self.panel.select(contract_info["order_book_id"].to_list())
+        if self.fetcher is not None:
+            return self.fetch_contracts([contract_info], start_date, end_date)[0]
+        if self.price_cache is not None:
+            return self.price_cache.get_contracts_price(contract_info, self.frequency, start_date, end_date)
+        rqdatac = ensure_rqdata()
+        contracts_price = rqdatac.get_price(
+            order_book_ids=contract_info["order_book_id"].to_list(),
+            start_date = start_date if start_date is not None else contract_info["listed_date"].values[0],
+            end_date = end_date if end_date is not None else contract_info["de_listed_date"].values[-1],
+            frequency = self.frequency,
+        )
+        # rqdatac返回的历史数据有两个index，需要删去一个多余的order_book_id
+        contracts_price.reset_index(level='order_book_id', inplace = True)
+        # 按照时间顺序排序
+        contracts_price.sort_index(inplace = True)
+
+        return contracts_price
+
+    def fetch_contracts(self, contract_info_list: list, start_date = None, end_date = None) -> list:
+        """
+        用 self.fetcher 同时下载多条腿全部合约的行情，返回与 download_hist_data 格式相同的表格列表。
+        start_date、end_date 为空时使用各合约的上市、退市日期，不为空时也不超出上市、退市日期。
+        """
+        # PriceCache.get_price 需要上市、退市日期判断缓存是否完整，DataSource 没有这两个参数
+        pass_de_listed_date = isinstance(self.fetcher.data_source, PriceCache)
+        legs = []
+        for contract_info in contract_info_list:
+            futures = []
+            for _, row in contract_info.iterrows():
+                kwargs = {"de_listed_date": row["de_listed_date"], "listed_date": row["listed_date"]} if pass_de_listed_date else {}
+                start, end = contract_date_range(row, start_date, end_date)
+                futures.append(self.fetcher.submit(
+                    row["order_book_id"],
+                    start.date(),
+                    end.date(),
+                    self.frequency,
+                    **kwargs,
+                ))
+            legs.append((contract_info["order_book_id"].to_list(), futures))
+        return [stack_contract_prices(order_book_ids, [future.result() for future in futures]) for order_book_ids, futures in legs]
+
+    def split_by_year(self):
+        """
+        将价差按年份拆分，行为"01-01"到"12-31"的月日，列为年份。
+        日期用整数运算映射到闰年日历中的位置，一次性填入预先分配好的 (366天 × 年份) 矩阵，
+        2月29日固定占一行；日内数据每天只保留最后一个价格。
+        """
+        return seasonal_frame(self.spread["spread"])
+
+    def seasonal_index(self, window: int = 5) -> SeasonalIndex:
+        """
+        用于查询当前价差在往年同期中的百分位、分位数和持有期最大回撤，见 seasonal_query.SeasonalIndex。
+        """
+        return SeasonalIndex.from_spread(self.spread["spread"], window)
+
+    def expiry_seasonal(self, leg: str = None, max_days: int = 250) -> pd.DataFrame:
+        """
+        按距离到期日的交易日天数对齐的季节图数据，行为距离到期的天数，列为到期日，见 seasonal.expiry_seasonal_frame。
+        每个时间戳的到期日为 leg（默认为公式中的第一条腿）按换月计划当时使用的合约的退市日期，
+        换月方式与 calculate_spread 相同。
+        """
+        compiled_formula = compile_formula(self.formula)
+        leg = compiled_formula.dependencies[0] if leg is None else leg.strip()
+        contract_info_list = self.get_aligned_contract_info(compiled_formula.dependencies)
+        contract_info = contract_info_list[compiled_formula.dependencies.index(leg)]
+        schedule = roll_schedule(contract_info, self.roll_days_before, self.roll_reference)
+
+        spread = self.spread["spread"]
+        active = active_contracts(schedule, pd.DatetimeIndex(spread.index).as_unit("ns").asi8)
+        expiry = pd.DatetimeIndex([parse_date(date) for date in contract_info["de_listed_date"]]).to_numpy()
+        return expiry_seasonal_frame(spread, expiry[active], max_days)
+
+    def create_figure(self, data):
+        return create_figure(data, webgl = self.webgl, max_points = self.max_points)
+
+    def find_contract_month_as_int(self, contract: str):
+        """
+        根据合约名称如'MA05'返回最后两位数字，
+        即返回合约的月份
+        """
+        return int(re.findall(r"\d{2}$", contract)[0])
+
+    def get_contract_month_list(self, contract_symbol_list):
+        """
+        遍历合约名称列表
+        根据合约名称如'MA05'返回最后两位数字，
+        即返回合约的月份
+        """
+        return [self.find_contract_month_as_int(i) for i in contract_symbol_list]
+
+    def find_arbitrage_period_mask(self, contract_month_list: list):
+        """
+        返回筛选套利组合可交易时间段的筛选器
+        """
+        # 按合约月份生成查询表，再用索引的月份数组一次查表，得到布尔型NumPy数组
+        return lambda x: month_window_mask(x, contract_month_list)
+
+    def get_contract_info_list_and_available_lookback_window_list(self, contract_symbol_list):
+        contract_info_list = []
+        available_lookback_window_list = []
+        for i in contract_symbol_list:
+            contract_info = self.lookup_contract_info(i)
+            contract_info_list.append(contract_info)
+            available_lookback_window_list.append(len(contract_info))
+
+        return contract_info_list, available_lookback_window_list
+
+    def lookback_window_alignment(self, contract_info_list, available_lookback_window_list):
+        """
+        对获得的各品种年限进行矫正。
+        价差计算经常会遇到不同品种合约，上市时间不一样的情形。
+        例如（在rqdata上）螺纹钢最长能查询到15年的历史，铁矿最长只能查询到10年的历史，
+        当用到这两者做价差计算时，螺纹钢和铁矿必须在时间戳上进行对齐。
+        这也就意味着，螺纹钢比铁矿早五年的历史行情需要舍去的。
+        """
+        lookback_window_for_spread = min(available_lookback_window_list)
+        if lookback_window_for_spread < self.years_trace_back:
+            if self.verbose:
+                print(f"only {lookback_window_for_spread} years data is available for spread calculation.")
+            for num in range(len(contract_info_list)):
+                contract_info_list[num] = contract_info_list[num].tail(lookback_window_for_spread)
+
+        return contract_info_list
+
+    def clean_symbol_list(self, contract_symbol_list):
+        return [i.strip() for i in contract_symbol_list]
+
+    def calculate_spread(self, ):
+        # 公式只编译一次，同一公式在不同年限、参数下重复计算时直接使用缓存
+        compiled_formula = compile_formula(self.formula)
+        contract_symbol_list = compiled_formula.dependencies
+        contract_info_list = self.get_aligned_contract_info(contract_symbol_list)
+        self.leg_series = {}
+        # 使用并发下载时先同时提交所有腿的请求
+        prefetched = None
+        if self.fetcher is not None and self.panel is None:
+            if self.verbose:
+                print("downloading historical data for ", ", ".join(contract_symbol_list))
+            prefetched = self.fetch_contracts(contract_info_list)
+        for k, (i, j) in enumerate(zip(contract_symbol_list, contract_info_list)):
+            if self.verbose and prefetched is None:
+                print("downloading historical data for ", i)
+            contracts_price = prefetched[k] if prefetched is not None else self.download_hist_data(j)
+            # 历年合约按换月计划拼接，每个时间戳只有一个价格
+            schedule = roll_schedule(j, self.roll_days_before, self.roll_reference)
+            self.leg_series[i] = build_continuous(contracts_price, schedule, self.price_field, self.back_adjust)
+        self.spread = self.combine_legs(compiled_formula, contract_info_list)
+
+    def get_aligned_contract_info(self, contract_symbol_list):
+        contract_info_list, available_lookback_window_list = self.get_contract_info_list_and_available_lookback_window_list(contract_symbol_list)
+        # 对获得的各品种信息进行矫正，不同品种的合约上市时间不一样时，舍去较早的历史行情。
+        return self.lookback_window_alignment(contract_info_list, available_lookback_window_list)
+
+    def combine_legs(self, compiled_formula, contract_info_list) -> pd.DataFrame:
+        """
+        用 self.leg_series 中各条腿的连续序列计算价差，并按可交易时间段筛选。
+        """
+        # 各条腿的时间戳对齐后，价差直接用数组计算
+        series_list = [self.leg_series[i] for i in compiled_formula.dependencies]
+        times, matrix = align_continuous(series_list, self.leg_calendar(contract_info_list), self.max_staleness)
+        return self.spread_frame(compiled_formula, contract_info_list, times, matrix)
+
+    def leg_calendar(self, contract_info_list):
+        """
+        各条腿交易时段的交集，日线数据不需要交易时段，返回None。
+        """
+        if self.frequency == "1d":
+            return None
+        return SessionCalendar.intersection([SessionCalendar.from_contract_info(info) for info in contract_info_list])
+
+    def spread_frame(self, compiled_formula, contract_info_list, times, matrix) -> pd.DataFrame:
+        """
+        由对齐好的时间戳和价格矩阵计算价差表，并按可交易时间段筛选。
+        """
+        contract_symbol_list = compiled_formula.dependencies
+        spread = pd.DataFrame(
+            {"spread": compiled_formula.evaluate_matrix(matrix)},
+            index = pd.DatetimeIndex(times.view("datetime64[ns]")),
+        )
+        spread.dropna(axis = 0, inplace = True)
+        contract_month_list = self.get_contract_month_list(contract_symbol_list)
+        mask_for_trade_period = month_window_mask(spread.index, contract_month_list)
+        if self.exit_days_before_delivery is not None:
+            for contract_info in contract_info_list:
+                mask_for_trade_period &= delivery_exit_mask(spread.index, contract_info["start_delivery_date"], self.exit_days_before_delivery)
+        # trade_period_filer 是一个开关，如果是True，季节图上仅展示个人交易者可交易日期
+        # 否则展示季节图上展示价差全年日期行情
+        if self.trade_period_filter:
+            return spread.loc[mask_for_trade_period, :].copy()
+        return spread.copy()
+
+    def store_settings(self) -> dict:
+        """
+        影响价差结果的参数，参数不同的结果分开存储。
+        """
+        return {
+            "years_trace_back": self.years_trace_back,
+            "trade_period_filter": self.trade_period_filter,
+            "exit_days_before_delivery": self.exit_days_before_delivery,
+            "frequency": self.frequency,
+            "roll_reference": self.roll_reference,
+            "roll_days_before": self.roll_days_before,
+            "back_adjust": self.back_adjust,
+            "max_staleness": self.max_staleness,
+        }
+
+    def update_spread(self, store: SpreadStore, rebuild: bool = False) -> SpreadRecord:
+        """
+        增量计算价差：store 中已有结果时，只下载水位线当天及之后的行情、只计算新的价差并追加，
+        同时更新季节矩阵和汇总统计量；没有结果、rebuild 为True或使用复权时完整计算一次。
+        之后 self.spread 为完整的价差序列，返回存储的结果（含季节矩阵、分位数等统计量）。
+        存储的历史不会随 years_trace_back 向后滚动而删除最早的年份，需要时用 rebuild 重新计算。
+        """
+        settings = self.store_settings()
+        record = None if rebuild else store.load(self.formula, settings)
+        # 复权时每次换月都会改变全部历史价格，只能完整计算
+        if record is None or record.watermark is None or self.back_adjust is not None:
+            self.calculate_spread()
+            record = store.save(self.formula, settings, self.spread["spread"])
+        else:
+            record = store.append(self.formula, settings, self.calculate_spread_since(record.watermark)["spread"])
+        self.spread = record.spread.to_frame()
+        return record
+
+    def calculate_spread_since(self, watermark) -> pd.DataFrame:
+        """
+        只下载水位线当天仍在交易的合约、从水位线当天开始的行情，计算水位线之后的价差。
+        """
+        watermark = pd.Timestamp(watermark)
+        compiled_formula = compile_formula(self.formula)
+        contract_symbol_list = compiled_formula.dependencies
+        contract_info_list = self.get_aligned_contract_info(contract_symbol_list)
+        end = pd.Timestamp.today().normalize()
+
+        # 水位线之前已经退市的合约不需要下载
+        active_list = []
+        for j in contract_info_list:
+            de_listed = [parse_date(date) for date in j["de_listed_date"]]
+            active_list.append(j[[date is None or date >= watermark.normalize() for date in de_listed]])
+        # 与 calculate_spread 使用同一个数据来源：面板、并发下载、本地缓存或rqdatac
+        if self.fetcher is not None and self.panel is None:
+            contracts_prices = self.fetch_contracts(active_list, watermark.date(), end.date())
+        else:
+            contracts_prices = [self.download_hist_data(active, watermark.date(), end.date()) for active in active_list]
+
+        self.leg_series = {}
+        for i, j, contracts_price in zip(contract_symbol_list, contract_info_list, contracts_prices):
+            schedule = roll_schedule(j, self.roll_days_before, self.roll_reference)
+            self.leg_series[i] = build_continuous(contracts_price, schedule, self.price_field)
+
+        spread = self.combine_legs(compiled_formula, contract_info_list)
+        return spread[spread.index > watermark]
+
+    def stream_spread(self, chunk_days: int = None):
+        """
+        分钟、tick数据按时间分段下载、计算价差，返回生成器，每次得到一段价差序列。
+        内存占用只与每段的长度有关，chunk_days 为每段的天数。
+        行情来源（面板、并发下载、本地缓存或rqdatac）、换月、复权、对齐和可交易时间段筛选与 calculate_spread 相同，
+        各段拼接起来与 calculate_spread 的结果相同。
+        """
+        compiled_formula = compile_formula(self.formula)
+        contract_info_list = self.get_aligned_contract_info(compiled_formula.dependencies)
+        if chunk_days is None:
+            chunk_days = default_chunk_days(self.frequency)
+        chunks = spread_chunks(contract_info_list, chunk_days)
+        streams = [
+            stream_continuous(
+                self.download_hist_data,
+                contract_info,
+                roll_schedule(contract_info, self.roll_days_before, self.roll_reference),
+                chunks,
+                self.price_field,
+                self.back_adjust,
+            )
+            for contract_info in contract_info_list
+        ]
+        for times, matrix in stream_aligned(streams, self.leg_calendar(contract_info_list), self.max_staleness):
+            spread = self.spread_frame(compiled_formula, contract_info_list, times, matrix)
+            if len(spread):
+                yield spread["spread"]
+
+    def plot_spread_with_year(self, path: str = None):
+        """
+        path 不为空时不画交互图，直接导出为静态图片（.png、.svg），用于批量生成报告。
+        """
+        unsplited_data = self.spread.copy()
+        unsplited_data.index = unsplited_data.index.date
+        if path is not None:
+            return save_static_plot(unsplited_data, path, title = self.formula)
+        self.fig = self.create_figure(data = unsplited_data)
+        if self.show_figure:
+            self.fig.show()
+
+    def plot_spread_with_monthday(self, path: str = None):
+        """
+        path 不为空时不画交互图，直接导出为静态图片（.png、.svg），用于批量生成报告。
+        """
+        splited_spread_data = self.split_by_year().copy()
+        # 删除没有任何数据的日期，否则画图时会出现大量的空白。
+        splited_spread_data.dropna(axis = 0, thresh=1, inplace = True)
+        if path is not None:
+            return save_static_plot(splited_spread_data, path, title = self.formula)
+        self.fig = self.create_figure(data = splited_spread_data)
+        if self.show_figure:
+            self.fig.show()
@@ -0,0 +1,212 @@
+"""
+ZscoreGridStrategy 的向量化回测。
+
+策略在vnpy中只能逐根K线运行，参数研究很慢。这里用NumPy一次性计算全部均线、标准差和z_score，
+再复现策略的网格仓位逻辑：
+    1. 持多仓且价格回到均线之上（price_change >= 0），全部平仓；持空仓且回到均线之下时同样平仓。
+    2. 否则价格高于均线一个标准差以上时，目标仓位为 -floor(z_score - 1) * volume_multiplier，
+       不低于 -max_pos，目标仓位低于当前仓位时开空；
+       价格低于均线一个标准差以上时，目标仓位为 -ceil(z_score + 1) * volume_multiplier，
+       不高于 max_pos，目标仓位高于当前仓位时开多。
+假设价差算法在信号K线的收盘价全部成交。
+
+仓位只在“价格处于均线同一侧的连续区间”内单调变化（多仓只加不减、空仓只加不减），
+离开该区间的第一根K线平仓，因此每个区间内的仓位就是目标仓位的累计最大值（或最小值），
+只有“上一个区间是否留有仓位”需要按区间顺序递推，循环次数为区间数量而不是K线数量。
+"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+from .replay import ReplayStrategyEngine
+from .rolling import rolling_mean_std
+
+
+class BacktestResult:
+    """
+    positions 每根K线收盘后的仓位，pnl 每根K线的盈亏，trades 成交记录。
+    """
+
+    def __init__(self, close: pd.Series, signals: pd.DataFrame, positions: pd.Series, pnl: pd.Series, trades: pd.DataFrame) -> None:
+        self.close = close
+        self.signals = signals
+        self.positions = positions
+        self.pnl = pnl
+        self.trades = trades
+
+    @property
+    def total_pnl(self) -> float:
+        return float(self.pnl.sum())
+
+
+def zscore_grid_positions(
+    close: np.ndarray,
+    ma_window: int = 20,
+    volume_multiplier: float = 5,
+    max_pos: float = 25,
+    warmup: int = None,
+    mean: np.ndarray = None,
+    std: np.ndarray = None,
+):
+    """
+    返回 (仓位数组, 均线, 标准差, z_score)。
+    warmup 为开始交易前需要的K线数量，默认与策略中ArrayManager的大小 ma_window + 10 相同。
+    mean、std 可以传入预先计算好的滚动统计量（如参数优化时批量计算）。
+    """
+    close = np.asarray(close, dtype = np.float64)
+    n = len(close)
+    if warmup is None:
+        warmup = ma_window + 10
+    if mean is None or std is None:
+        mean, std = rolling_mean_std(close, ma_window)
+
+    price_change = close - mean
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        z_score = price_change / std
+
+    active = np.zeros(n, dtype = bool)
+    active[warmup - 1:] = True
+    active &= ~np.isnan(price_change)
+    side = np.where(active, np.sign(price_change), 0.0)
+    side[np.isnan(side)] = 0.0
+
+    # 开仓候选目标仓位的绝对值：多头区间为正的多头目标，空头区间为空头目标的绝对值
+    tradable = active & (std > 0)
+    with np.errstate(invalid = "ignore"):
+        long_target = np.where(tradable & (price_change < -std), -np.ceil(z_score + 1) * volume_multiplier, 0.0)
+        short_target = np.where(tradable & (price_change > std), np.floor(z_score - 1) * volume_multiplier, 0.0)
+    long_target = np.clip(long_target, 0.0, max_pos)
+    short_target = np.clip(short_target, 0.0, max_pos)
+    candidate = np.where(side < 0, long_target, np.where(side > 0, short_target, 0.0))
+
+    # 划分价格处于均线同一侧的连续区间
+    run_start = np.ones(n, dtype = bool)
+    run_start[1:] = side[1:] != side[:-1]
+    run_id = np.cumsum(run_start) - 1
+    starts = np.flatnonzero(run_start)
+    n_runs = len(starts)
+
+    # 区间第一根K线之外是否出现过开仓信号，以及第一根K线本身是否有开仓信号
+    rest_candidate = candidate.copy()
+    rest_candidate[starts] = 0.0
+    rest_has_entry = np.zeros(n_runs, dtype = bool)
+    np.logical_or.at(rest_has_entry, run_id, rest_candidate > 0)
+    first_has_entry = candidate[starts] > 0
+
+    # 上一个区间结束时仍有仓位，则本区间第一根K线只平仓、不开仓
+    blocked = np.zeros(n_runs, dtype = bool)
+    holding = False
+    for k in range(n_runs):
+        blocked[k] = holding
+        holding = rest_has_entry[k] or (first_has_entry[k] and not holding)
+    candidate[starts[blocked]] = 0.0
+
+    # 区间内仓位为目标仓位的累计最大值，加上区间编号的偏移量后一次累计完成分组累计
+    offset = run_id * (max_pos + 1.0)
+    size = np.maximum.accumulate(candidate + offset) - offset
+    positions = np.where(side < 0, size, -size)
+    positions[side == 0] = 0.0
+    return positions, mean, std, z_score
+
+
+def backtest_zscore_grid(
+    spread: pd.Series,
+    ma_window: int = 20,
+    volume_multiplier: float = 5,
+    max_pos: float = 25,
+    commission: float = 0.0,
+    slippage: float = 0.0,
+    warmup: int = None,
+) -> BacktestResult:
+    """
+    spread 为价差收盘价序列，如 SpreadCalculation.spread["spread"]。
+    commission、slippage 为每手价差的手续费和滑点，以价差价格单位计。
+    """
+    if isinstance(spread, pd.DataFrame):
+        spread = spread["spread"]
+    close = spread.to_numpy(dtype = np.float64)
+    positions, mean, std, z_score = zscore_grid_positions(close, ma_window, volume_multiplier, max_pos, warmup)
+
+    previous = np.concatenate([[0.0], positions[:-1]])
+    traded = positions - previous
+    price_change = np.concatenate([[0.0], np.diff(close)])
+    pnl = previous * price_change - np.abs(traded) * (commission + slippage)
+
+    trade_rows = np.flatnonzero(traded)
+    trades = pd.DataFrame({
+        "datetime": spread.index[trade_rows],
+        "direction": np.where(traded[trade_rows] > 0, "long", "short"),
+        "price": close[trade_rows],
+        "volume": np.abs(traded[trade_rows]),
+        "pos": positions[trade_rows],
+    })
+    signals = pd.DataFrame({"ma_value": mean, "std": std, "z_score": z_score}, index = spread.index)
+    return BacktestResult(
+        close = spread,
+        signals = signals,
+        positions = pd.Series(positions, index = spread.index, name = "pos"),
+        pnl = pd.Series(pnl, index = spread.index, name = "pnl"),
+        trades = trades,
+    )
+
+
+def load_strategy_class():
+    """
+    从 "3.Introduction to a Spread Trading Tool" 目录加载 ZscoreGridStrategy，需要安装vnpy。
+    """
+    path = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "3.Introduction to a Spread Trading Tool",
+        "zscore_grid_strategy.py",
+    )
+    spec = importlib.util.spec_from_file_location("zscore_grid_strategy", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.ZscoreGridStrategy
+
+
+def replay_strategy_positions(spread: pd.Series, setting: dict) -> np.ndarray:
+    """
+    把价差序列逐根K线回放给 ZscoreGridStrategy.on_spread_bar，返回每根K线后的仓位。
+    策略运行在 replay.ReplayStrategyEngine 中，每根K线之后价差算法以收盘价全部成交。
+    """
+    from vnpy.trader.constant import Exchange, Interval
+    from vnpy.trader.object import BarData
+
+    strategy_class = load_strategy_class()
+    engine = ReplayStrategyEngine(record_calls = False)
+    strategy = engine.add_strategy(strategy_class, "replay", setting)
+    strategy.trading = True
+
+    positions = np.zeros(len(spread))
+    for i, (timestamp, price) in enumerate(spread.items()):
+        bar = BarData(
+            symbol = "replay",
+            exchange = Exchange.LOCAL,
+            datetime = pd.Timestamp(timestamp).to_pydatetime(),
+            interval = Interval.MINUTE,
+            open_price = price,
+            high_price = price,
+            low_price = price,
+            close_price = price,
+            gateway_name = "REPLAY",
+        )
+        strategy.on_spread_bar(bar)
+        # 假设价差算法在信号K线的收盘价全部成交
+        engine.fill_all(bar.datetime, price)
+        positions[i] = strategy.spread_pos
+    return positions
+
+
+def verify_against_strategy(spread: pd.Series, setting: dict = None) -> bool:
+    """
+    检查向量化回测与事件驱动的 ZscoreGridStrategy 逐根K线得到的仓位是否一致。
+    """
+    setting = setting or {}
+    parameters = {name: setting[name] for name in ("ma_window", "volume_multiplier", "max_pos") if name in setting}
+    expected = replay_strategy_positions(spread, setting)
+    result = backtest_zscore_grid(spread, **parameters)
+    return bool(np.array_equal(expected, result.positions.to_numpy()))
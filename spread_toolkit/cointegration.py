@@ -0,0 +1,338 @@
+"""
+协整筛选和对冲比例估计。
+
+在同一行业（all_instruments 的 industry_name）的主力连续合约（如RB88、HC88、I88）中，
+枚举全部两两或三个一组的组合，估计对冲比例并做 Engle-Granger 协整检验、半衰期计算，
+输出排序好的候选价差公式，公式可以直接传给 SpreadCalculation。
+
+所有组合的回归放在同一批矩阵中计算：价格矩阵只下载、对齐一次，
+每组的 XᵀX、Xᵀy 用 einsum 一次算出，再批量求解，不需要逐对调用pandas或statsmodels。
+各品种上市时间不同，缺失值用权重为0的方式排除，不需要按组重新对齐。
+"""
+
+import itertools
+import re
+
+import numpy as np
+import pandas as pd
+
+from .instrument_catalog import InstrumentCatalog
+from .price_cache import PriceCache
+
+
+# Engle-Granger 残差检验的渐近临界值（MacKinnon 2010，协整回归含常数项），键为变量个数
+ENGLE_GRANGER_CRITICAL_VALUES = {
+    2: {"1%": -3.89644, "5%": -3.33613, "10%": -3.04445},
+    3: {"1%": -4.29374, "5%": -3.74066, "10%": -3.45218},
+}
+
+
+def batched_ols(y: np.ndarray, X: np.ndarray, mask: np.ndarray = None):
+    """
+    批量最小二乘。y 为 (组数, n)，X 为 (组数, n, p)，mask 为 (组数, n) 的有效值标记。
+    返回 (系数 (组数, p), 残差 (组数, n)，无效位置为空值, 残差方差 (组数,), 系数标准误 (组数, p))。
+    """
+    if mask is None:
+        mask = np.isfinite(y) & np.isfinite(X).all(axis = 2)
+    weight = mask.astype(np.float64)
+    y = np.where(mask, y, 0.0)
+    X = np.where(mask[:, :, None], X, 0.0)
+
+    xtx = np.einsum("kn,knp,knq->kpq", weight, X, X)
+    xty = np.einsum("kn,knp,kn->kp", weight, X, y)
+    # 个别组样本不足或共线时 XᵀX 不可逆，伪逆仍能给出结果，之后按样本数量筛选
+    xtx_inv = np.linalg.pinv(xtx)
+    beta = np.einsum("kpq,kq->kp", xtx_inv, xty)
+
+    residuals = y - np.einsum("knp,kp->kn", X, beta)
+    n_obs = weight.sum(axis = 1)
+    dof = np.maximum(n_obs - X.shape[2], 1.0)
+    sigma2 = (residuals * residuals * weight).sum(axis = 1) / dof
+    stderr = np.sqrt(np.maximum(sigma2[:, None] * np.diagonal(xtx_inv, axis1 = 1, axis2 = 2), 0.0))
+    residuals[~mask] = np.nan
+    return beta, residuals, sigma2, stderr
+
+
+def adf_statistic(residuals: np.ndarray, lags: int = 1) -> tuple:
+    """
+    批量ADF检验：Δe_t = γ·e_{t-1} + Σ φ_i·Δe_{t-i} + ε_t，不含常数项（残差均值为0）。
+    residuals 为 (组数, n)，空值所在的行不参与回归。返回 (γ的t统计量, 有效样本数)。
+    """
+    diff = np.diff(residuals, axis = 1)
+    target = diff[:, lags:]
+    columns = [residuals[:, lags:-1]]
+    for i in range(1, lags + 1):
+        columns.append(diff[:, lags - i:diff.shape[1] - i])
+    X = np.stack(columns, axis = 2)
+    mask = np.isfinite(target) & np.isfinite(X).all(axis = 2)
+    beta, _, _, stderr = batched_ols(target, X, mask)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        tstat = beta[:, 0] / stderr[:, 0]
+    return tstat, mask.sum(axis = 1)
+
+
+def half_life(residuals: np.ndarray) -> np.ndarray:
+    """
+    均值回复的半衰期（以K线数量计）：Δe_t = a + λ·e_{t-1}，半衰期为 -ln2/λ，λ不小于0时为无穷大。
+    """
+    target = np.diff(residuals, axis = 1)
+    X = np.stack([residuals[:, :-1], np.ones_like(target)], axis = 2)
+    beta, _, _, _ = batched_ols(target, X)
+    slope = beta[:, 0]
+    with np.errstate(divide = "ignore"):
+        return np.where(slope < 0, -np.log(2.0) / slope, np.inf)
+
+
+def rolling_hedge_ratios(y: np.ndarray, X: np.ndarray, window: int, step: int = 1, min_obs: int = None):
+    """
+    滚动窗口OLS，窗口每次向后移动step根K线。每个窗口内所有组一起批量求解。
+    返回 (窗口结束位置 (m,), 系数 (组数, m, p))，有效样本少于min_obs的窗口为空值。
+    """
+    n = y.shape[1]
+    min_obs = min_obs if min_obs is not None else window // 2
+    ends = list(range(min(window, n), n + 1, max(step, 1)))
+    if not ends or ends[-1] != n:
+        ends.append(n)
+    betas = np.full((y.shape[0], len(ends), X.shape[2]), np.nan)
+    for i, end in enumerate(ends):
+        start = max(end - window, 0)
+        y_window, X_window = y[:, start:end], X[:, start:end]
+        mask = np.isfinite(y_window) & np.isfinite(X_window).all(axis = 2)
+        beta, _, _, _ = batched_ols(y_window, X_window, mask)
+        beta[mask.sum(axis = 1) < min_obs] = np.nan
+        betas[:, i] = beta
+    return np.asarray(ends), betas
+
+
+def kalman_hedge_ratios(y: np.ndarray, X: np.ndarray, delta: float = 1e-4, initial_beta: np.ndarray = None, observation_var: np.ndarray = None):
+    """
+    卡尔曼滤波估计随时间变化的对冲比例，系数为随机游走：β_t = β_{t-1} + w_t，y_t = X_t·β_t + v_t。
+    所有组的状态一起更新，只对时间做循环；某组当天有缺失值时只做预测不做更新。
+    initial_beta、observation_var 一般用全样本OLS的系数和残差方差，
+    状态噪声取 delta 倍的单个样本的系数方差，与价格的量纲无关。返回每根K线滤波后的系数 (组数, n, p)。
+    """
+    k, n, p = X.shape
+    valid = np.isfinite(y) & np.isfinite(X).all(axis = 2)
+    if initial_beta is None or observation_var is None:
+        initial_beta, _, observation_var, _ = batched_ols(y, X, valid)
+
+    weight = valid.astype(np.float64)
+    X_filled = np.where(valid[:, :, None], X, 0.0)
+    xtx = np.einsum("kn,knp,knq->kpq", weight, X_filled, X_filled)
+    n_obs = np.maximum(weight.sum(axis = 1), 1.0)
+    state_noise = delta * observation_var[:, None, None] * n_obs[:, None, None] * np.linalg.pinv(xtx)
+
+    beta = np.array(initial_beta, dtype = np.float64)
+    cov = np.array(state_noise)
+    result = np.full((k, n, p), np.nan)
+    for t in range(n):
+        cov = cov + state_noise
+        x = X_filled[:, t]
+        ok = valid[:, t]
+        error = np.where(ok, y[:, t], 0.0) - np.einsum("kp,kp->k", x, beta)
+        cov_x = np.einsum("kpq,kq->kp", cov, x)
+        variance = np.einsum("kp,kp->k", x, cov_x) + observation_var
+        gain = cov_x / variance[:, None]
+        beta = beta + np.where(ok[:, None], gain * error[:, None], 0.0)
+        cov = cov - np.where(ok[:, None, None], gain[:, :, None] * cov_x[:, None, :], 0.0)
+        result[:, t] = beta
+    return result
+
+
+def dominant_symbols(catalog: InstrumentCatalog, suffix: str = "88", industry_names: list = None) -> dict:
+    """
+    返回 {行业: [主力连续合约代码]}，主力连续合约为 all_instruments 中"品种代码 + suffix"的合约，如RB88。
+    """
+    instruments = catalog.all_instruments
+    instruments = instruments[instruments["listed_date"] == "0000-00-00"]
+    instruments = instruments[instruments["order_book_id"] == instruments["underlying_symbol"] + suffix]
+    if industry_names is not None:
+        instruments = instruments[instruments["industry_name"].isin(industry_names)]
+    groups = {}
+    for industry_name, order_book_id in zip(instruments["industry_name"], instruments["order_book_id"]):
+        if isinstance(industry_name, str):
+            groups.setdefault(industry_name, []).append(order_book_id)
+    return groups
+
+
+def dominant_month(catalog: InstrumentCatalog, order_book_id: str) -> str:
+    """
+    主力连续合约当前对应的合约月份，如RB88的trading_code为RB2310时返回"10"。
+    """
+    instruments = catalog.all_instruments
+    trading_code = instruments.loc[instruments["order_book_id"] == order_book_id, "trading_code"]
+    if trading_code.empty or not isinstance(trading_code.iloc[0], str):
+        return None
+    digits = re.findall(r"\d+", trading_code.iloc[0])
+    return digits[-1][-2:] if digits else None
+
+
+def hedge_formula(legs: list, hedge_ratios, decimals: int = 3) -> str:
+    """
+    legs[0] 减去其余各腿乘以对冲比例，如 hedge_formula(["RB10", "HC10"], [0.85]) 返回 "RB10 - HC10*0.85"。
+    """
+    formula = legs[0]
+    for leg, ratio in zip(legs[1:], hedge_ratios):
+        ratio = round(float(ratio), decimals)
+        sign = "-" if ratio >= 0 else "+"
+        formula += f" {sign} {leg}*{abs(ratio):g}"
+    return formula
+
+
+class CointegrationScreener:
+    """
+    group_size 为每组的品种数量（2或3），每组第一个品种为被解释变量，其余品种按对冲比例做空。
+    hedge_method 为对冲比例的估计方法：
+        "ols" 全样本OLS；
+        "rolling" 最近window根K线的OLS，hedge_ratio_std 为各滚动窗口系数的标准差；
+        "kalman" 卡尔曼滤波最后一根K线的系数，hedge_ratio_std 为最近window根K线系数的标准差。
+    协整检验、半衰期始终使用全样本OLS的残差。
+    """
+
+    def __init__(
+        self,
+        catalog: InstrumentCatalog,
+        price_cache: PriceCache,
+        start_date,
+        end_date,
+        frequency: str = "1d",
+        group_size: int = 2,
+        industry_names: list = None,
+        hedge_method: str = "ols",
+        window: int = 250,
+        step: int = 20,
+        kalman_delta: float = 1e-4,
+        adf_lags: int = 1,
+        min_obs: int = 250,
+        max_half_life: float = None,
+        suffix: str = "88",
+        chunk_size: int = 512,
+    ) -> None:
+        if group_size not in ENGLE_GRANGER_CRITICAL_VALUES:
+            raise ValueError(f"group_size 只能是 {list(ENGLE_GRANGER_CRITICAL_VALUES)}")
+        if hedge_method not in ("ols", "rolling", "kalman"):
+            raise ValueError(f"不支持的对冲比例估计方法: {hedge_method}")
+        self.catalog = catalog
+        self.price_cache = price_cache
+        self.start_date = start_date
+        self.end_date = end_date
+        self.frequency = frequency
+        self.group_size = group_size
+        self.hedge_method = hedge_method
+        self.window = window
+        self.step = step
+        self.kalman_delta = kalman_delta
+        self.adf_lags = adf_lags
+        self.min_obs = min_obs
+        self.max_half_life = max_half_life
+        self.suffix = suffix
+        self.chunk_size = chunk_size
+
+        self.industries = dominant_symbols(catalog, suffix, industry_names)
+        self.prices = pd.DataFrame()
+        self.results = pd.DataFrame()
+
+    def download_prices(self, stale_days: int = 30) -> pd.DataFrame:
+        """
+        下载全部主力连续合约的收盘价，拼接成时间为行、合约为列的宽表。
+        最后一个价格比全表最后时间早 stale_days 天以上的品种（已停止交易）不参与筛选。
+        """
+        closes = {}
+        for order_book_id in itertools.chain.from_iterable(self.industries.values()):
+            price = self.price_cache.get_price(order_book_id, start_date = self.start_date, end_date = self.end_date, frequency = self.frequency)
+            if "close" in price and price["close"].notna().any():
+                closes[order_book_id] = price["close"]
+        prices = pd.DataFrame(closes).sort_index()
+        if not prices.empty:
+            last_valid = pd.Series({column: prices[column].last_valid_index() for column in prices})
+            prices = prices.loc[:, last_valid >= prices.index[-1] - pd.Timedelta(days = stale_days)]
+        self.prices = prices
+        return self.prices
+
+    def candidate_groups(self) -> list:
+        """
+        同一行业内有行情的品种的全部组合，每个组合为 (行业, (合约代码, ...))。
+        """
+        available = set(self.prices.columns)
+        groups = []
+        for industry_name, symbols in self.industries.items():
+            symbols = [symbol for symbol in symbols if symbol in available]
+            groups.extend((industry_name, group) for group in itertools.combinations(symbols, self.group_size))
+        return groups
+
+    def screen(self, groups: list) -> pd.DataFrame:
+        """
+        对一批组合做批量回归和检验，返回每组一行的结果表。
+        """
+        column_of = {symbol: i for i, symbol in enumerate(self.prices.columns)}
+        matrix = self.prices.to_numpy(dtype = np.float64)
+        positions = np.array([[column_of[symbol] for symbol in group] for _, group in groups], dtype = np.int64)
+
+        # y (组数, n)；X (组数, n, p)，最后一列为常数项
+        y = matrix[:, positions[:, 0]].T
+        X = np.concatenate([matrix[:, positions[:, 1:]].transpose(1, 0, 2), np.ones((len(groups), len(matrix), 1))], axis = 2)
+        mask = np.isfinite(y) & np.isfinite(X).all(axis = 2)
+        n_obs = mask.sum(axis = 1)
+
+        beta, residuals, sigma2, _ = batched_ols(y, X, mask)
+        adf, _ = adf_statistic(residuals, self.adf_lags)
+        half_lives = half_life(residuals)
+
+        ratios = beta[:, :-1]
+        ratio_std = np.full(ratios.shape, np.nan)
+        if self.hedge_method == "rolling":
+            _, rolling = rolling_hedge_ratios(y, X, self.window, self.step)
+            ratios = np.where(np.isnan(rolling[:, -1, :-1]), ratios, rolling[:, -1, :-1])
+            ratio_std = np.nanstd(rolling[:, :, :-1], axis = 1)
+        elif self.hedge_method == "kalman":
+            filtered = kalman_hedge_ratios(y, X, self.kalman_delta, beta, sigma2)
+            ratios = filtered[:, -1, :-1]
+            ratio_std = np.nanstd(filtered[:, -self.window:, :-1], axis = 1)
+
+        critical = ENGLE_GRANGER_CRITICAL_VALUES[self.group_size]
+        records = []
+        for i, (industry_name, group) in enumerate(groups):
+            legs = [symbol[:-len(self.suffix)] + (dominant_month(self.catalog, symbol) or self.suffix) for symbol in group]
+            records.append({
+                "industry_name": industry_name,
+                "symbols": group,
+                "formula": hedge_formula(legs, ratios[i]),
+                "dominant_formula": hedge_formula(list(group), ratios[i]),
+                "hedge_ratios": tuple(float(ratio) for ratio in ratios[i]),
+                "hedge_ratio_std": tuple(float(std) for std in ratio_std[i]),
+                "intercept": float(beta[i, -1]),
+                "n_obs": int(n_obs[i]),
+                "adf_stat": float(adf[i]),
+                "critical_5pct": critical["5%"],
+                "cointegrated": bool(adf[i] < critical["5%"]),
+                "half_life": float(half_lives[i]),
+                "residual_std": float(np.sqrt(sigma2[i])),
+            })
+        return pd.DataFrame(records)
+
+    def run(self) -> pd.DataFrame:
+        """
+        返回按ADF统计量从小到大（协整关系从强到弱）排序的候选组合，
+        样本少于min_obs、半衰期超过max_half_life的组合不输出。formula 列可以直接传给 SpreadCalculation。
+        """
+        if self.prices.empty:
+            self.download_prices()
+        groups = self.candidate_groups()
+        # 组合很多时分批计算，限制 (组数 × n × p) 数组占用的内存
+        frames = [self.screen(groups[i:i + self.chunk_size]) for i in range(0, len(groups), self.chunk_size)]
+        if not frames:
+            self.results = pd.DataFrame()
+            return self.results
+
+        results = pd.concat(frames, ignore_index = True)
+        results = results[results["n_obs"] >= self.min_obs]
+        if self.max_half_life is not None:
+            results = results[results["half_life"] <= self.max_half_life]
+        self.results = results.sort_values("adf_stat", kind = "stable").reset_index(drop = True)
+        return self.results
+
+    def top_formulas(self, count: int = 10, cointegrated_only: bool = True) -> list:
+        results = self.results if not self.results.empty else self.run()
+        if cointegrated_only and not results.empty:
+            results = results[results["cointegrated"]]
+        return results["formula"].head(count).to_list()
@@ -0,0 +1,198 @@
+"""
+按换月计划拼接连续合约序列。
+
+download_hist_data 返回的是同一合约代码（如MA09）历年合约的行情堆叠在一起的表格，
+同一时间戳有多行，直接相减会触发pandas多对多的索引对齐。这里先根据合约信息中的
+退市日期、交割日期计算换月计划，每个时间戳只保留当时主用的一个合约，
+得到时间戳唯一、按时间排序的连续数组；可选择对历史价格做后复权（价差或比例）。
+各条腿的时间戳取交集后，价差计算只是矩阵运算，不再需要索引对齐。
+"""
+
+import numpy as np
+import pandas as pd
+
+from .panel import PricePanel
+from .price_cache import parse_date
+from .trading_hours import SessionCalendar, align_to_calendar
+
+
+# 换月时间戳上限，最后一个合约一直使用到数据结束
+LAST_ROLL = np.iinfo(np.int64).max
+
+
+class ContinuousSeries:
+    """
+    times 为int64纳秒时间戳，values 为价格，contracts 为每个时间戳使用的合约在换月计划中的位置，
+    schedule 为换月计划。三个数组长度相同、按时间排序、时间戳唯一。
+    """
+
+    def __init__(self, times: np.ndarray, values: np.ndarray, contracts: np.ndarray, schedule: pd.DataFrame) -> None:
+        self.times = times
+        self.values = values
+        self.contracts = contracts
+        self.schedule = schedule
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def to_series(self, name: str = None) -> pd.Series:
+        return pd.Series(self.values, index = pd.DatetimeIndex(self.times.view("datetime64[ns]")), name = name)
+
+
+def roll_schedule(contract_info: pd.DataFrame, days_before: int = 0, reference: str = "de_listed_date") -> pd.DataFrame:
+    """
+    返回换月计划：order_book_id 及 roll_date，合约使用到 roll_date 当天（含），之后换到下一个合约。
+    contract_info 需按到期先后排序，reference 为换月参考日期的列名，如 "de_listed_date"、"start_delivery_date"，
+    换月日为参考日期之前 days_before 个工作日；参考日期缺失时使用退市日期。
+    """
+    roll_dates = []
+    for _, row in contract_info.iterrows():
+        date = parse_date(row[reference]) if reference in row else None
+        if date is None:
+            date = parse_date(row["de_listed_date"])
+        if date is None:
+            roll_dates.append(pd.NaT)
+            continue
+        roll_dates.append(pd.Timestamp(np.busday_offset(date.date(), -days_before, roll = "backward")))
+    return pd.DataFrame({
+        "order_book_id": contract_info["order_book_id"].to_list(),
+        "roll_date": pd.DatetimeIndex(roll_dates),
+    })
+
+
+def roll_boundaries(schedule: pd.DataFrame) -> np.ndarray:
+    """
+    每个合约最后可用时间的上界（int64纳秒，不含），即换月日的次日零点；最后一个合约没有上界。
+    """
+    roll_dates = pd.DatetimeIndex(schedule["roll_date"])
+    boundaries = (roll_dates + pd.Timedelta(days = 1)).as_unit("ns").asi8.copy()
+    boundaries[pd.isna(roll_dates)] = LAST_ROLL
+    if len(boundaries):
+        boundaries[-1] = LAST_ROLL
+    # 换月日必须递增，个别合约日期异常时沿用前一个合约的换月日
+    return np.maximum.accumulate(boundaries)
+
+
+def active_contracts(schedule: pd.DataFrame, times: np.ndarray) -> np.ndarray:
+    """
+    每个int64纳秒时间戳按换月计划当时主用的合约在换月计划中的位置。
+    """
+    return np.searchsorted(roll_boundaries(schedule), times, side = "right")
+
+
+def build_continuous(
+    contracts_price: pd.DataFrame,
+    schedule: pd.DataFrame,
+    field: str = "close",
+    adjust: str = None,
+) -> ContinuousSeries:
+    """
+    contracts_price 为 download_hist_data 返回的表格：index 为时间，order_book_id 列为合约代码；
+    也可以是 PricePanel，此时只复制换月计划中合约的数据。
+    adjust 为 None 时不复权，"difference" 时把换月价差加到之前的价格上，"ratio" 时按换月价格比例缩放，
+    复权后最新合约的价格保持不变。
+    """
+    schedule = schedule.reset_index(drop = True)
+    empty = ContinuousSeries(np.zeros(0, dtype = np.int64), np.zeros(0), np.zeros(0, dtype = np.int64), schedule)
+    if isinstance(contracts_price, PricePanel):
+        if field not in contracts_price.fields:
+            return empty
+        codes, times, values = contracts_price.contract_arrays(schedule["order_book_id"].to_list(), field)
+        values = values.astype(np.float64)
+        known = ~np.isnan(values)
+        codes, times, values = codes[known], times[known], values[known]
+    else:
+        if contracts_price.empty or field not in contracts_price:
+            return empty
+        code_of = {order_book_id: i for i, order_book_id in enumerate(schedule["order_book_id"])}
+        codes = contracts_price["order_book_id"].map(code_of).to_numpy(dtype = np.float64)
+        times = pd.DatetimeIndex(contracts_price.index).as_unit("ns").asi8
+        values = contracts_price[field].to_numpy(dtype = np.float64)
+        known = ~np.isnan(codes) & ~np.isnan(values)
+        codes, times, values = codes[known].astype(np.int64), times[known], values[known]
+
+    # 每个时间戳当时主用的合约：换月上界中第一个大于该时间戳的位置
+    keep = codes == active_contracts(schedule, times)
+    order = np.argsort(times[keep], kind = "stable")
+    result_times = times[keep][order]
+    result_values = values[keep][order]
+    result_codes = codes[keep][order]
+    # 同一合约同一时间戳重复的行只保留第一行
+    first = np.ones(len(result_times), dtype = bool)
+    first[1:] = result_times[1:] != result_times[:-1]
+    result_times, result_values, result_codes = result_times[first], result_values[first], result_codes[first]
+
+    if adjust is not None and len(result_times):
+        result_values = back_adjust(result_times, result_values, result_codes, codes, times, values, adjust)
+    return ContinuousSeries(result_times, result_values, result_codes, schedule)
+
+
+def back_adjust(
+    result_times: np.ndarray,
+    result_values: np.ndarray,
+    result_codes: np.ndarray,
+    codes: np.ndarray,
+    times: np.ndarray,
+    values: np.ndarray,
+    adjust: str,
+) -> np.ndarray:
+    """
+    在每次换月处，比较新合约与旧合约在旧合约最后一个时间戳上的价格，
+    把差额（或比例）累加到换月之前的全部价格上。新合约在该时间戳没有行情时
+    （如同月份的历年合约，上一年合约退市后下一年合约才上市），使用新合约之后的第一个价格。
+    """
+    if adjust not in ("difference", "ratio"):
+        raise ValueError(f"不支持的复权方式: {adjust}")
+
+    # 按 (合约, 时间) 排序，便于查找某个合约在某个时间戳的价格
+    order = np.lexsort((times, codes))
+    sorted_codes, sorted_times, sorted_values = codes[order], times[order], values[order]
+
+    rolls = np.flatnonzero(result_codes[1:] != result_codes[:-1])
+    gaps = np.zeros(len(rolls)) if adjust == "difference" else np.ones(len(rolls))
+    for k, position in enumerate(rolls):
+        old_time, old_value = result_times[position], result_values[position]
+        new_code = result_codes[position + 1]
+        start, end = np.searchsorted(sorted_codes, [new_code, new_code + 1])
+        slot = start + np.searchsorted(sorted_times[start:end], old_time)
+        if slot >= end:
+            continue
+        new_value = sorted_values[slot]
+        if adjust == "difference":
+            gaps[k] = new_value - old_value
+        elif old_value != 0:
+            gaps[k] = new_value / old_value
+
+    # 每个位置需要累计的调整量：该位置之后发生的所有换月
+    segment = np.zeros(len(result_times), dtype = np.int64)
+    segment[rolls + 1] = 1
+    segment = np.cumsum(segment)
+    if adjust == "difference":
+        later = np.concatenate([np.cumsum(gaps[::-1])[::-1], [0.0]])
+        return result_values + later[segment]
+    later = np.concatenate([np.cumprod(gaps[::-1])[::-1], [1.0]])
+    return result_values * later[segment]
+
+
+def align_continuous(series_list: list, calendar: SessionCalendar = None, max_staleness = None, cross_session: bool = False):
+    """
+    多条连续序列按时间戳取交集，返回 (时间戳数组, 价格矩阵)，矩阵的列与 series_list 的顺序相同。
+    calendar 或 max_staleness 不为空时，按交易时段对齐并在 max_staleness 内向前填充，见 trading_hours.align_to_calendar。
+    """
+    if not series_list:
+        return np.zeros(0, dtype = np.int64), np.zeros((0, 0))
+    if calendar is not None or max_staleness is not None:
+        return align_to_calendar(
+            [series.times for series in series_list],
+            [series.values for series in series_list],
+            calendar,
+            max_staleness,
+            cross_session,
+        )
+    common = series_list[0].times
+    for series in series_list[1:]:
+        common = np.intersect1d(common, series.times, assume_unique = True)
+    matrix = np.empty((len(common), len(series_list)))
+    for i, series in enumerate(series_list):
+        matrix[:, i] = series.values[np.searchsorted(series.times, common)]
+    return common, matrix
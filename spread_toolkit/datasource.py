@@ -0,0 +1,87 @@
+"""
+行情数据源接口。
+
+PriceCache 通过 DataSource 获取缺失的行情数据，
+默认使用 rqdatac，也可以换成本地文件或内存中的数据，方便离线计算和测试。
+"""
+
+import os
+
+import pandas as pd
+
+from .session import ensure_rqdata
+
+
+class DataSource:
+    """
+    行情数据源基类。
+
+    子类需要实现 get_price，返回单个合约在 [start_date, end_date] 之间的行情，
+    index 为时间戳，列为 open、close 等字段。没有数据时返回空的 DataFrame。
+    """
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1d") -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class RqdataSource(DataSource):
+    """
+    rqdatac 数据源，第一次下载时才初始化 rqdatac，也可以事先调用 session.init_rqdata 设置账号。
+    """
+
+    def __init__(self, fields = None) -> None:
+        self.fields = fields
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1d") -> pd.DataFrame:
+        rqdatac = ensure_rqdata()
+        price = rqdatac.get_price(
+            order_book_ids = order_book_id,
+            start_date = start_date,
+            end_date = end_date,
+            frequency = frequency,
+            fields = self.fields,
+        )
+        if price is None:
+            return pd.DataFrame()
+        # rqdatac返回的历史数据有两个index，需要删去一个多余的order_book_id
+        if isinstance(price.index, pd.MultiIndex):
+            price = price.droplevel("order_book_id")
+        return price.sort_index()
+
+
+class LocalDataSource(DataSource):
+    """
+    本地数据源，可以替代 rqdatac 填充缓存。
+
+    data 为 {order_book_id: DataFrame} 或 {(order_book_id, frequency): DataFrame}，
+    directory 下的文件按 "{order_book_id}_{frequency}.csv" 命名，第一列为时间戳。
+    """
+
+    def __init__(self, data: dict = None, directory: str = None) -> None:
+        self.data = data if data is not None else {}
+        self.directory = directory
+
+    def load_frame(self, order_book_id: str, frequency: str):
+        if (order_book_id, frequency) in self.data:
+            return self.data[(order_book_id, frequency)]
+        if order_book_id in self.data:
+            return self.data[order_book_id]
+        if self.directory is not None:
+            path = os.path.join(self.directory, f"{order_book_id}_{frequency}.csv")
+            if os.path.exists(path):
+                frame = pd.read_csv(path, index_col = 0, parse_dates = True)
+                # 读取一次后保存在内存中
+                self.data[(order_book_id, frequency)] = frame
+                return frame
+        return None
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1d") -> pd.DataFrame:
+        frame = self.load_frame(order_book_id, frequency)
+        if frame is None:
+            return pd.DataFrame()
+        frame = frame.sort_index()
+        start = pd.Timestamp(start_date)
+        # end_date 为日期时包含当天全部数据
+        end = pd.Timestamp(end_date) + pd.Timedelta(days = 1)
+        index = pd.DatetimeIndex(frame.index)
+        return frame[(index >= start) & (index < end)]
@@ -0,0 +1,149 @@
+"""
+并发下载行情。
+
+calculate_spread 原先逐条腿、逐个合约顺序下载，5条腿15年的公式大部分时间都在等待网络。
+ConcurrentFetcher 用线程池同时发出多个请求（rqdatac 是同步接口，用线程而不是asyncio）：
+    max_workers 限制同时进行的请求数量；
+    TokenBucket 限制每秒的请求数量，避免超过数据服务的频率限制；
+    请求失败时按指数退避重试；
+    相同的请求正在进行时直接返回同一个Future，同一合约同一频率同时只有一个请求，
+    配合 PriceCache 使用时后到的请求直接读取缓存，也不会同时写同一个缓存目录。
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class TokenBucket:
+    """
+    令牌桶：每秒补充 rate 个令牌，最多积累 capacity 个，每个请求消耗一个令牌，没有令牌时等待。
+    """
+
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        取得令牌，返回等待的秒数。
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class ConcurrentFetcher:
+    """
+    data_source 为 DataSource 或 PriceCache，请求的参数与其 get_price 相同。
+    rate 为每秒最多发出的请求数量，为None时不限制；burst 为令牌桶容量，即允许的突发请求数量。
+    retries 为失败后的重试次数，第n次重试前等待 backoff × 2^(n-1) 秒（不超过 max_backoff，并加入随机抖动）；
+    只有 retry_exceptions 中的异常才会重试。
+    """
+
+    def __init__(
+        self,
+        data_source,
+        max_workers: int = 8,
+        rate: float = None,
+        burst: float = None,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        retry_exceptions = (Exception,),
+    ) -> None:
+        self.data_source = data_source
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "fetcher")
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.contract_locks = {}
+        self.stats = {"requests": 0, "coalesced": 0, "fetched": 0, "retries": 0, "failures": 0, "throttled_seconds": 0.0}
+
+    def __enter__(self) -> "ConcurrentFetcher":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait = True)
+
+    def submit(self, order_book_id: str, start_date, end_date, frequency: str = "1d", **kwargs) -> Future:
+        """
+        提交一个请求，返回Future；相同的请求正在进行时返回同一个Future。
+        """
+        key = (order_book_id, str(start_date), str(end_date), frequency, tuple(sorted((k, str(v)) for k, v in kwargs.items())))
+        with self.lock:
+            self.stats["requests"] += 1
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future
+            future = self.executor.submit(self.fetch, order_book_id, start_date, end_date, frequency, **kwargs)
+            self.in_flight[key] = future
+        future.add_done_callback(lambda _: self.finish(key))
+        return future
+
+    def finish(self, key) -> None:
+        with self.lock:
+            self.in_flight.pop(key, None)
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1d", **kwargs):
+        """
+        与 DataSource.get_price 相同的阻塞接口，可以直接代替数据源使用。
+        """
+        return self.submit(order_book_id, start_date, end_date, frequency, **kwargs).result()
+
+    def map(self, requests: list) -> list:
+        """
+        requests 为 (order_book_id, start_date, end_date, frequency, 其他参数dict) 的列表，
+        全部提交后按顺序返回结果，任意一个请求最终失败时抛出该异常。
+        """
+        futures = [self.submit(*request[:4], **(request[4] if len(request) > 4 else {})) for request in requests]
+        return [future.result() for future in futures]
+
+    def fetch(self, order_book_id: str, start_date, end_date, frequency: str, **kwargs):
+        # 同一合约同一频率的请求依次进行，后到的请求可以直接使用缓存
+        with self.lock:
+            contract_lock = self.contract_locks.setdefault((order_book_id, frequency), threading.Lock())
+        with contract_lock:
+            for attempt in range(self.retries + 1):
+                if self.bucket is not None:
+                    waited = self.bucket.acquire()
+                    if waited:
+                        with self.lock:
+                            self.stats["throttled_seconds"] += waited
+                try:
+                    result = self.data_source.get_price(order_book_id, start_date, end_date, frequency, **kwargs)
+                except self.retry_exceptions:
+                    if attempt == self.retries:
+                        with self.lock:
+                            self.stats["failures"] += 1
+                        raise
+                    with self.lock:
+                        self.stats["retries"] += 1
+                    delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+                    time.sleep(delay * (0.5 + random.random() / 2))
+                    continue
+                with self.lock:
+                    self.stats["fetched"] += 1
+                return result
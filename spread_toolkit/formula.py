@@ -0,0 +1,161 @@
+"""
+价差公式解析。
+
+将 "RB10*1.6 - I09 - J09*0.5" 这样的价差公式解析成语法树并编译一次，
+之后可以对任意对齐好的价格数组（NumPy数组或pandas Series）反复求值，
+不需要再用exec执行字符串。只允许合约代码、数字和加减乘除，其他语法一律拒绝。
+"""
+
+import ast
+import operator
+import re
+from functools import lru_cache
+
+import numpy as np
+
+
+# 公式中的合约代码，如RB10、MA09
+CONTRACT_PATTERN = re.compile(r"^[A-Za-z]+\d+$")
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+class CompiledFormula:
+    """
+    编译好的价差公式。
+
+    dependencies 为公式中出现的合约代码，按首次出现的顺序排列；
+    linear_weights 为各合约的线性权重，如 {"RB10": 1.6, "I09": -1.0, "J09": -0.5}，
+    constant 为常数项，公式不是线性组合时两者均为None。
+    """
+
+    def __init__(self, formula: str) -> None:
+        self.formula = formula
+        try:
+            tree = ast.parse(formula.strip(), mode = "eval")
+        except SyntaxError:
+            raise ValueError(f"价差公式无法解析: {formula}")
+
+        self.dependencies = []
+        self.evaluator = self.compile_node(tree.body)
+        linear = self.linearize(tree.body)
+        if linear is None:
+            self.linear_weights = None
+            self.constant = None
+        else:
+            weights, self.constant = linear
+            self.linear_weights = {symbol: weights.get(symbol, 0.0) for symbol in self.dependencies}
+
+    def compile_node(self, node):
+        """
+        将语法树节点编译成函数，函数的参数为按dependencies顺序排列的价格列表。
+        """
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            func = BINARY_OPERATORS[type(node.op)]
+            left = self.compile_node(node.left)
+            right = self.compile_node(node.right)
+            return lambda values: func(left(values), right(values))
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            func = UNARY_OPERATORS[type(node.op)]
+            operand = self.compile_node(node.operand)
+            return lambda values: func(operand(values))
+
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = float(node.value)
+            return lambda values: value
+
+        if isinstance(node, ast.Name) and CONTRACT_PATTERN.match(node.id):
+            if node.id not in self.dependencies:
+                self.dependencies.append(node.id)
+            position = self.dependencies.index(node.id)
+            return lambda values: values[position]
+
+        raise ValueError(f"价差公式中包含不支持的内容: {ast.unparse(node)}")
+
+    def linearize(self, node):
+        """
+        返回 (权重字典, 常数项)，非线性的公式（如两个合约相乘）返回None。
+        """
+        if isinstance(node, ast.Constant):
+            return {}, float(node.value)
+
+        if isinstance(node, ast.Name):
+            return {node.id: 1.0}, 0.0
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self.linearize(node.operand)
+            if operand is None:
+                return None
+            sign = -1.0 if isinstance(node.op, ast.USub) else 1.0
+            return scale_linear(operand, sign)
+
+        left = self.linearize(node.left)
+        right = self.linearize(node.right)
+        if left is None or right is None:
+            return None
+
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            if isinstance(node.op, ast.Sub):
+                right = scale_linear(right, -1.0)
+            weights = dict(left[0])
+            for symbol, weight in right[0].items():
+                weights[symbol] = weights.get(symbol, 0.0) + weight
+            return weights, left[1] + right[1]
+
+        if isinstance(node.op, ast.Mult):
+            # 只有一边是常数时才是线性的
+            if not left[0]:
+                return scale_linear(right, left[1])
+            if not right[0]:
+                return scale_linear(left, right[1])
+            return None
+
+        if isinstance(node.op, ast.Div) and not right[0] and right[1] != 0:
+            return scale_linear(left, 1.0 / right[1])
+        return None
+
+    def evaluate(self, prices):
+        """
+        prices 为 {合约代码: 价格} 的字典，或按dependencies顺序排列的价格列表。
+        价格可以是NumPy数组，也可以是pandas Series（此时按index自动对齐）。
+        """
+        if isinstance(prices, dict):
+            prices = [prices[symbol] for symbol in self.dependencies]
+        return self.evaluator(prices)
+
+    def evaluate_matrix(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        matrix 为对齐好的价格矩阵，行为时间，列按dependencies顺序排列。
+        线性公式直接用矩阵乘法计算。
+        """
+        if self.linear_weights is not None:
+            weights = np.array([self.linear_weights[symbol] for symbol in self.dependencies])
+            return matrix @ weights + self.constant
+        return self.evaluator([matrix[:, i] for i in range(matrix.shape[1])])
+
+    def __repr__(self) -> str:
+        return f"CompiledFormula({self.formula!r})"
+
+
+def scale_linear(linear, factor: float):
+    weights, constant = linear
+    return {symbol: weight * factor for symbol, weight in weights.items()}, constant * factor
+
+
+@lru_cache(maxsize = 4096)
+def compile_formula(formula: str) -> CompiledFormula:
+    """
+    编译价差公式，同一个公式只解析一次。
+    """
+    return CompiledFormula(formula)
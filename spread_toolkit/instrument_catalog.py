@@ -0,0 +1,124 @@
+"""
+期货合约信息目录。
+
+all_instruments 表只在加载时解析一次合约的到期年份、月份，
+并建立 (underlying_symbol, 月份) -> 合约行号数组 的索引，
+查询某个品种过去N年的同月合约时只需要一次字典查找。
+解析好的目录可以保存为二进制快照，下次启动时不需要重新读取、解析CSV文件。
+"""
+
+import os
+import pickle
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# 快照格式版本，目录结构改变时需要加1，旧快照会被自动忽略
+SNAPSHOT_VERSION = 1
+
+
+class InstrumentCatalog:
+    """
+    all_instruments 为 rqdatac.all_instruments(type = "Future") 返回的表格，
+    或者由该表格保存的CSV文件读取而来。
+    """
+
+    # 同一进程内按CSV路径共享已经加载的目录
+    loaded_catalogs = {}
+
+    def __init__(self, all_instruments: pd.DataFrame) -> None:
+        self.all_instruments = all_instruments
+        # 上市日期为"0000-00-00"的是指数、主力连续等合约，不参与按月份查询
+        contracts = all_instruments[all_instruments["listed_date"] != "0000-00-00"]
+        maturity_date = pd.to_datetime(contracts["maturity_date"])
+        # 按到期日排序，同一到期日保持原表顺序
+        order = np.argsort(maturity_date.to_numpy(), kind = "stable")
+        contracts = contracts.iloc[order].copy()
+        maturity_date = maturity_date.iloc[order]
+        # 合约的年份、月份，与原先一样存成4位、2位的字符串
+        contracts["maturity_date_year"] = maturity_date.dt.year.astype(str).str.zfill(4).to_numpy()
+        contracts["maturity_date_month"] = maturity_date.dt.month.astype(str).str.zfill(2).to_numpy()
+        self.contracts = contracts
+        self.maturity_year = maturity_date.dt.year.to_numpy()
+        self.maturity_month = maturity_date.dt.month.to_numpy()
+
+        # (underlying_symbol, "09") -> 按到期日排序的合约行号
+        groups = contracts.groupby(["underlying_symbol", "maturity_date_month"], sort = False).indices
+        self.index = {key: np.asarray(positions, dtype = np.int64) for key, positions in groups.items()}
+
+    @classmethod
+    def from_csv(cls, csv_path: str, snapshot_path: str = None) -> "InstrumentCatalog":
+        """
+        读取all_instruments CSV文件。
+        snapshot_path 不为空时优先读取快照，快照不存在或CSV文件有改动时重新解析并保存快照。
+        """
+        key = os.path.abspath(csv_path)
+        if key in cls.loaded_catalogs:
+            return cls.loaded_catalogs[key]
+
+        csv_stat = os.stat(csv_path)
+        source = (csv_stat.st_size, csv_stat.st_mtime_ns)
+        catalog = None
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            catalog = cls.load_snapshot(snapshot_path, source)
+        if catalog is None:
+            catalog = cls(pd.read_csv(csv_path, index_col = 0))
+            if snapshot_path is not None:
+                catalog.save_snapshot(snapshot_path, source)
+
+        cls.loaded_catalogs[key] = catalog
+        return catalog
+
+    def save_snapshot(self, snapshot_path: str, source = None):
+        with open(snapshot_path, "wb") as f:
+            pickle.dump((SNAPSHOT_VERSION, source, self), f, protocol = pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load_snapshot(cls, snapshot_path: str, source = None):
+        """
+        读取快照，版本或CSV文件信息不一致时返回None。
+        """
+        with open(snapshot_path, "rb") as f:
+            try:
+                version, snapshot_source, catalog = pickle.load(f)
+            except Exception:
+                return None
+        if version != SNAPSHOT_VERSION:
+            return None
+        if source is not None and tuple(snapshot_source) != tuple(source):
+            return None
+        return catalog
+
+    def get_positions(self, underlying_symbol: str, month: str):
+        """
+        返回某品种某月份全部合约的行号，按到期日排序。
+        """
+        return self.index.get((underlying_symbol, month), np.empty(0, dtype = np.int64))
+
+    def lookup(self, contract_from_formula: str, years_trace_back: int) -> pd.DataFrame:
+        """
+        根据公式中的合约代码如MA09，返回过去最新N年的09合约信息。
+        """
+        underlying_symbol, month = parse_contract_symbol(contract_from_formula)
+        positions = self.get_positions(underlying_symbol, month)
+        # 筛选出过去最新N年的期货合约， N由years_trace_back决定。
+        if years_trace_back > 0:
+            positions = positions[-years_trace_back:]
+        return self.contracts.iloc[positions]
+
+    def get_contract_months(self, underlying_symbol: str):
+        """
+        返回某品种出现过的全部合约月份，如["01", "05", "09"]。
+        """
+        return sorted(month for symbol, month in self.index if symbol == underlying_symbol)
+
+
+def parse_contract_symbol(contract_from_formula: str):
+    """
+    将公式中的合约代码如'MA09'拆分为品种代码'MA'和月份'09'
+    """
+    contract_from_formula = contract_from_formula.strip()
+    underlying_symbol = re.findall(pattern = r"[A-Za-z]+", string = contract_from_formula)[0]
+    return underlying_symbol, contract_from_formula[-2:]
@@ -0,0 +1,228 @@
+"""
+策略热路径的耗时统计和计数。
+
+on_spread_tick -> BarGenerator -> on_spread_bar 是价差策略最频繁执行的路径，
+这里用固定分桶的直方图记录各回调的耗时，用计数器记录价差算法的启动、撤销次数，
+结果可以写入本地文件，或通过Prometheus文本格式的HTTP接口读取。
+
+记录一次耗时只做一次二分查找和几次整数加法，不分配对象，可以在每个tick上调用。
+"""
+
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 直方图的分桶上限，单位纳秒，从1微秒到1秒
+DEFAULT_BUCKETS_NS = [
+    int(base * scale)
+    for scale in (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+    for base in (1, 2, 5)
+] + [int(1e9)]
+
+
+def render_prometheus(families) -> str:
+    """
+    把 (指标名称, 指标类型, 样本行列表) 拼接成Prometheus文本格式，同名指标合并在一起。
+    """
+    merged = {}
+    for full_name, metric_type, lines in families:
+        merged.setdefault((full_name, metric_type), []).extend(lines)
+    text = []
+    for (full_name, metric_type), lines in merged.items():
+        text.append(f"# TYPE {full_name} {metric_type}")
+        text.extend(lines)
+    return "\n".join(text) + "\n"
+
+
+class LatencyHistogram:
+    """
+    耗时直方图，counts[i] 为耗时不超过 buckets_ns[i] 且超过上一个分桶的次数，最后一格为超过所有分桶的次数。
+    """
+
+    def __init__(self, buckets_ns: list = None) -> None:
+        self.buckets_ns = list(buckets_ns or DEFAULT_BUCKETS_NS)
+        self.counts = [0] * (len(self.buckets_ns) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def observe(self, elapsed_ns: int) -> None:
+        self.counts[bisect.bisect_left(self.buckets_ns, elapsed_ns)] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    def quantile(self, q: float) -> int:
+        """
+        返回分位数所在分桶的上限（纳秒），没有记录时返回0。
+        """
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets_ns, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.max_ns
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_us": self.total_ns / self.count / 1e3 if self.count else 0.0,
+            "p50_us": self.quantile(0.5) / 1e3,
+            "p99_us": self.quantile(0.99) / 1e3,
+            "max_us": self.max_ns / 1e3,
+        }
+
+
+class HotPathMetrics:
+    """
+    一个策略实例的耗时直方图和计数器，name 一般为策略名称。
+
+    策略线程记录指标，HTTP线程读取指标：新增指标名称时加锁，读取时在锁内复制字典，
+    已有指标的记录不加锁。metrics、counters 为预先登记的指标名称。
+    """
+
+    def __init__(self, name: str, buckets_ns: list = None, metrics: list = (), counters: list = ()) -> None:
+        self.name = name
+        self.buckets_ns = buckets_ns
+        self.lock = threading.Lock()
+        self.histograms = {metric: LatencyHistogram(buckets_ns) for metric in metrics}
+        self.counters = {metric: 0 for metric in counters}
+
+    def observe(self, metric: str, elapsed_ns: int) -> None:
+        histogram = self.histograms.get(metric)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(metric, LatencyHistogram(self.buckets_ns))
+        histogram.observe(elapsed_ns)
+
+    def observe_since(self, metric: str, start_ns: int) -> None:
+        """
+        记录从 start_ns（time.perf_counter_ns()的返回值）到现在的耗时。
+        """
+        self.observe(metric, time.perf_counter_ns() - start_ns)
+
+    def increment(self, metric: str, value: int = 1) -> None:
+        if metric not in self.counters:
+            with self.lock:
+                self.counters.setdefault(metric, 0)
+        self.counters[metric] += value
+
+    def snapshot(self) -> tuple:
+        """
+        在锁内复制直方图和计数器的 (名称, 对象/数值) 列表，供其他线程遍历。
+        """
+        with self.lock:
+            return list(self.histograms.items()), list(self.counters.items())
+
+    def summary(self) -> dict:
+        histograms, counters = self.snapshot()
+        return {
+            "name": self.name,
+            "latency": {metric: histogram.summary() for metric, histogram in histograms},
+            "counters": dict(counters),
+        }
+
+    def prometheus_families(self, prefix: str = "spread_strategy") -> list:
+        """
+        返回 [(指标名称, 指标类型, 样本行列表)]，耗时单位为秒。
+        """
+        families = []
+        label = f'strategy="{self.name}"'
+        histograms, counters = self.snapshot()
+        for metric, histogram in histograms:
+            full_name = f"{prefix}_{metric}_seconds"
+            # 复制分桶计数，使 +Inf 分桶与 _count 一致
+            counts = list(histogram.counts)
+            lines = []
+            cumulative = 0
+            for bound, count in zip(histogram.buckets_ns, counts):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{{{label},le="{bound / 1e9:g}"}} {cumulative}')
+            total = cumulative + counts[-1]
+            lines.append(f'{full_name}_bucket{{{label},le="+Inf"}} {total}')
+            lines.append(f"{full_name}_sum{{{label}}} {histogram.total_ns / 1e9:.9f}")
+            lines.append(f"{full_name}_count{{{label}}} {total}")
+            families.append((full_name, "histogram", lines))
+        for metric, value in counters:
+            full_name = f"{prefix}_{metric}_total"
+            families.append((full_name, "counter", [f"{full_name}{{{label}}} {value}"]))
+        return families
+
+    def to_prometheus(self, prefix: str = "spread_strategy") -> str:
+        return render_prometheus(self.prometheus_families(prefix))
+
+    def write(self, path: str) -> None:
+        """
+        写入本地文件，文件名以 .json 结尾时写入汇总的JSON，否则写入Prometheus文本格式。
+        """
+        with open(path, "w", encoding = "utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.summary(), f, ensure_ascii = False, indent = 2)
+            else:
+                f.write(self.to_prometheus())
+
+
+class MetricsExporter:
+    """
+    汇总多个策略的 HotPathMetrics，通过HTTP接口 /metrics 以Prometheus文本格式输出。
+    """
+
+    def __init__(self) -> None:
+        self.metrics = []
+        self.server = None
+        self.thread = None
+
+    def register(self, metrics: HotPathMetrics) -> None:
+        if metrics not in self.metrics:
+            self.metrics.append(metrics)
+
+    def unregister(self, metrics: HotPathMetrics) -> None:
+        if metrics in self.metrics:
+            self.metrics.remove(metrics)
+
+    def render(self) -> str:
+        # 同一指标的多个策略样本需要放在同一个 TYPE 声明之下
+        return render_prometheus(family for metrics in list(self.metrics) for family in metrics.prometheus_families())
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding = "utf-8") as f:
+            f.write(self.render())
+
+    def start(self, port: int = 9108, host: str = "127.0.0.1") -> None:
+        """
+        在后台线程启动HTTP服务。
+        """
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            self.thread = None
@@ -0,0 +1,458 @@
+"""
+全市场价差的实时z_score监控。
+
+ZscoreGridStrategy 每个价差需要一个策略实例，SpreadCalculation 只能批量计算历史价差。
+UniverseMonitor 直接订阅各条腿的tick，同时维护几百个价差公式的当前值和滚动统计量：
+    线性公式按 腿 → 公式 的稀疏关联表增量更新，一批tick只更新价格变化的腿涉及的公式，
+    非线性公式只重新计算受影响的那几个；
+    每个公式的价差按 bar_interval 合成K线，收盘价用一次向量化运算更新所有公式的滚动均值、标准差；
+    z_score 为当前价差相对已完成K线的均值、标准差的偏离，每次发布时给出绝对值最大的 top_n 个价差的排名表。
+每批tick的计算量只与这批tick涉及的公式数量有关，累计误差的修正每次只处理 recompute_chunk 个公式，
+单次更新的耗时有上限，记录在 latency 中。
+simulated_leg_ticks 生成本地模拟的腿行情，run_monitor 回放并报告吞吐量和耗时分布。
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from .formula import compile_formula
+from .instrumentation import LatencyHistogram
+from .price_cache import parse_date
+
+
+class ColumnStats:
+    """
+    多列的滚动均值、总体标准差，每列一个价差，与 rolling.create_stats 的两种方式一致：
+    mode 为 "sma" 时为固定窗口（环形缓存中保存减去该列第一个值后的值，减少误差），为 "ewma" 时为指数加权。
+    update 只更新传入的列，每次更新后用缓存重新计算 recompute_chunk 列的滚动和，轮流消除累计误差。
+    """
+
+    def __init__(self, columns: int, window: int, mode: str = "sma", recompute_chunk: int = 64) -> None:
+        if mode not in ("sma", "ewma"):
+            raise ValueError(f"不支持的z_score计算方式: {mode}")
+        self.columns = columns
+        self.window = window
+        self.mode = mode
+        self.recompute_chunk = recompute_chunk
+        self.count = np.zeros(columns, dtype = np.int64)
+        if mode == "sma":
+            self.ring = np.zeros((window, columns))
+            self.position = np.zeros(columns, dtype = np.int64)
+            self.filled = np.zeros(columns, dtype = np.int64)
+            self.base = np.full(columns, np.nan)
+            self.sums = np.zeros(columns)
+            self.sumsq = np.zeros(columns)
+            self.cursor = 0
+        else:
+            self.alpha = 2.0 / (window + 1.0)
+            self.ewma_mean = np.zeros(columns)
+            self.variance = np.zeros(columns)
+
+    def update(self, columns: np.ndarray, values: np.ndarray) -> None:
+        self.count[columns] += 1
+        if self.mode == "ewma":
+            first = self.count[columns] == 1
+            delta = values - self.ewma_mean[columns]
+            self.ewma_mean[columns] = np.where(first, values, self.ewma_mean[columns] + self.alpha * delta)
+            self.variance[columns] = np.where(first, 0.0, (1.0 - self.alpha) * (self.variance[columns] + self.alpha * delta * delta))
+            return
+
+        new = np.isnan(self.base[columns])
+        self.base[columns[new]] = values[new]
+        values = values - self.base[columns]
+        position = self.position[columns]
+        oldest = np.where(self.filled[columns] >= self.window, self.ring[position, columns], 0.0)
+        self.sums[columns] += values - oldest
+        self.sumsq[columns] += values * values - oldest * oldest
+        self.ring[position, columns] = values
+        self.position[columns] = (position + 1) % self.window
+        self.filled[columns] = np.minimum(self.filled[columns] + 1, self.window)
+        self.recompute()
+
+    def recompute(self) -> None:
+        """
+        用环形缓存重新计算接下来 recompute_chunk 列的滚动和。
+        """
+        if self.columns == 0 or not self.recompute_chunk:
+            return
+        chunk = np.arange(self.cursor, self.cursor + self.recompute_chunk) % self.columns
+        chunk = np.unique(chunk)
+        self.cursor = (self.cursor + self.recompute_chunk) % self.columns
+        # 窗口未满时环形缓存只有前 filled 行有效
+        valid = np.arange(self.window)[:, None] < self.filled[chunk]
+        values = np.where(valid, self.ring[:, chunk], 0.0)
+        self.sums[chunk] = values.sum(axis = 0)
+        self.sumsq[chunk] = (values * values).sum(axis = 0)
+
+    @property
+    def mean(self) -> np.ndarray:
+        if self.mode == "ewma":
+            return self.ewma_mean
+        filled = np.maximum(self.filled, 1)
+        return self.sums / filled + self.base
+
+    @property
+    def std(self) -> np.ndarray:
+        if self.mode == "ewma":
+            return np.sqrt(self.variance)
+        filled = np.maximum(self.filled, 1)
+        mean = self.sums / filled
+        return np.sqrt(np.maximum(self.sumsq / filled - mean * mean, 0.0))
+
+
+def csr_rows(indptr: np.ndarray, keys: np.ndarray):
+    """
+    稀疏关联表中 keys 对应的全部行位置，返回 (位置, 每个key的行数)。
+    """
+    starts = indptr[keys]
+    counts = indptr[keys + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype = np.int64), counts
+    # 把每段 [start, start + count) 拼接起来，不逐个key循环
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    return offsets + np.arange(total), counts
+
+
+class UniverseMonitor:
+    """
+    formulas 为价差公式列表，公式中的合约代码即为tick的代码（或由 symbol_map 映射，如 {"RB10": "RB2310"}）。
+    window、mode 与 ZscoreGridStrategy 的 ma_window、zscore_mode 含义相同，K线数量达到 min_periods 之后才给出z_score。
+    bar_interval 为K线周期（秒），publish_interval 为发布排名表的最小间隔（秒，按行情时间），为None时每批tick都发布，
+    生成排名表的耗时比更新一批tick还长，行情密集时不宜每批都发布。
+    recompute_chunk 为每次更新时重新计算的公式数量，用于消除增量更新的累计误差。
+    """
+
+    def __init__(
+        self,
+        formulas: list,
+        window: int = 20,
+        mode: str = "sma",
+        min_periods: int = None,
+        bar_interval: float = 60.0,
+        top_n: int = 20,
+        publish_interval: float = 1.0,
+        symbol_map: dict = None,
+        recompute_chunk: int = 64,
+    ) -> None:
+        self.formulas = list(formulas)
+        self.compiled = [compile_formula(formula) for formula in self.formulas]
+        self.window = window
+        self.min_periods = min_periods if min_periods is not None else window
+        self.bar_interval_ns = int(bar_interval * 1e9)
+        self.top_n = top_n
+        self.publish_interval_ns = int(publish_interval * 1e9) if publish_interval is not None else None
+        self.recompute_chunk = recompute_chunk
+
+        legs = []
+        for compiled in self.compiled:
+            legs.extend(symbol for symbol in compiled.dependencies if symbol not in legs)
+        symbol_map = symbol_map or {}
+        self.legs = legs
+        self.symbols = [symbol_map.get(leg, leg) for leg in legs]
+        self.leg_of = {symbol.upper(): i for i, symbol in enumerate(self.symbols)}
+        leg_position = {leg: i for i, leg in enumerate(legs)}
+
+        n_formulas, n_legs = len(self.formulas), len(legs)
+        self.constants = np.zeros(n_formulas)
+        self.linear = np.array([compiled.linear_weights is not None for compiled in self.compiled], dtype = bool)
+        self.leg_columns = []
+        term_rows, term_legs, term_weights = [], [], []
+        for row, compiled in enumerate(self.compiled):
+            columns = np.array([leg_position[symbol] for symbol in compiled.dependencies], dtype = np.int64)
+            self.leg_columns.append(columns)
+            if compiled.linear_weights is not None:
+                self.constants[row] = compiled.constant
+                for symbol, column in zip(compiled.dependencies, columns.tolist()):
+                    if compiled.linear_weights[symbol] != 0:
+                        term_rows.append(row)
+                        term_legs.append(column)
+                        term_weights.append(compiled.linear_weights[symbol])
+        term_rows = np.array(term_rows, dtype = np.int64)
+        term_legs = np.array(term_legs, dtype = np.int64)
+        term_weights = np.array(term_weights, dtype = np.float64)
+
+        # 线性公式的各项按公式存放，用于完整计算；按腿存放，用于增量更新
+        self.term_indptr = self.build_indptr(term_rows, n_formulas)
+        self.term_legs, self.term_weights = term_legs, term_weights
+        order = np.argsort(term_legs, kind = "stable")
+        self.linear_indptr = self.build_indptr(term_legs, n_legs)
+        self.linear_rows, self.linear_weights = term_rows[order], term_weights[order]
+
+        # 腿 → 依赖它的公式
+        dependency_rows = np.repeat(np.arange(n_formulas, dtype = np.int64), [len(columns) for columns in self.leg_columns])
+        dependency_legs = np.concatenate(self.leg_columns) if self.leg_columns else np.zeros(0, dtype = np.int64)
+        self.dependency_indptr = self.build_indptr(dependency_legs, n_legs)
+        self.dependency_rows = dependency_rows[np.argsort(dependency_legs, kind = "stable")]
+        self.linear_formulas = np.flatnonzero(self.linear)
+
+        self.prices = np.full(n_legs, np.nan)
+        self.spread = np.full(n_formulas, np.nan)
+        self.missing = np.array([len(columns) for columns in self.leg_columns], dtype = np.int64)
+        self.stats = ColumnStats(n_formulas, window, mode, recompute_chunk)
+
+        self.bar = None
+        self.bars = 0
+        self.updates = 0
+        self.ticks = 0
+        self.cursor = 0
+        self.last_timestamp = None
+        self.last_publish = None
+        self.table = None
+        self.subscribers = []
+        self.latency = LatencyHistogram()
+
+    @staticmethod
+    def build_indptr(keys: np.ndarray, size: int) -> np.ndarray:
+        """
+        按key排序存放的稀疏表中，第i个key的元素位于 indptr[i]:indptr[i + 1]。
+        """
+        return np.concatenate([[0], np.cumsum(np.bincount(keys, minlength = size))]).astype(np.int64)
+
+    def subscribe(self, callback) -> None:
+        """
+        每次发布排名表时调用 callback(table, timestamp)。
+        """
+        self.subscribers.append(callback)
+
+    def leg_codes(self, symbols) -> np.ndarray:
+        """
+        把tick的代码转换为腿的位置，整数直接视为位置，不在监控范围内的代码为-1。
+        """
+        symbols = np.asarray(symbols)
+        if symbols.dtype.kind in "iu":
+            return symbols.astype(np.int64, copy = False)
+        return np.array([self.leg_of.get(str(symbol).upper(), -1) for symbol in symbols], dtype = np.int64)
+
+    def update(self, timestamp, symbols, prices) -> None:
+        """
+        处理同一时刻的一批tick：symbols 为代码或腿的位置，prices 为对应的最新价。
+        """
+        start = time.perf_counter_ns()
+        timestamp = pd.Timestamp(timestamp).value
+        bar = timestamp // self.bar_interval_ns
+        if self.bar is not None and bar > self.bar:
+            self.close_bar()
+        self.bar = bar
+
+        legs = self.leg_codes(symbols)
+        prices = np.asarray(prices, dtype = np.float64)
+        valid = (legs >= 0) & ~np.isnan(prices)
+        legs, prices = legs[valid], prices[valid]
+        self.ticks += len(legs)
+        if len(legs):
+            # 同一条腿在一批中出现多次时只保留最后一个价格
+            _, last = np.unique(legs[::-1], return_index = True)
+            keep = len(legs) - 1 - last
+            self.apply_prices(legs[keep], prices[keep])
+
+        self.recompute_spreads()
+        self.updates += 1
+        self.last_timestamp = timestamp
+        if self.publish_interval_ns is None or self.last_publish is None or timestamp - self.last_publish >= self.publish_interval_ns:
+            self.publish(timestamp)
+        self.latency.observe(time.perf_counter_ns() - start)
+
+    def apply_prices(self, legs: np.ndarray, prices: np.ndarray) -> None:
+        old = self.prices[legs]
+        self.prices[legs] = prices
+        first = np.isnan(old)
+
+        # 线性公式：价差加上 权重 × 价格变化
+        changed = ~first & (prices != old)
+        if changed.any():
+            positions, counts = csr_rows(self.linear_indptr, legs[changed])
+            np.add.at(self.spread, self.linear_rows[positions], self.linear_weights[positions] * np.repeat((prices - old)[changed], counts))
+
+        # 第一次收到价格的腿：所有腿都有价格的公式完整计算一次
+        complete = np.zeros(0, dtype = np.int64)
+        if first.any():
+            positions, _ = csr_rows(self.dependency_indptr, legs[first])
+            rows = self.dependency_rows[positions]
+            np.subtract.at(self.missing, rows, 1)
+            complete = np.unique(rows[self.missing[rows] == 0])
+            self.evaluate_rows(complete[self.linear[complete]])
+
+        # 非线性公式：只重新计算受影响的公式
+        if not self.linear.all():
+            positions, _ = csr_rows(self.dependency_indptr, legs)
+            rows = np.unique(self.dependency_rows[positions])
+            self.evaluate_rows(rows[~self.linear[rows] & (self.missing[rows] == 0)])
+
+    def evaluate_rows(self, rows: np.ndarray) -> None:
+        if len(rows) == 0:
+            return
+        linear = self.linear[rows]
+        if linear.any():
+            linear_rows = rows[linear]
+            positions, counts = csr_rows(self.term_indptr, linear_rows)
+            terms = self.term_weights[positions] * self.prices[self.term_legs[positions]]
+            owners = np.repeat(np.arange(len(linear_rows)), counts)
+            self.spread[linear_rows] = np.bincount(owners, weights = terms, minlength = len(linear_rows)) + self.constants[linear_rows]
+        for row in rows[~linear].tolist():
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                self.spread[row] = self.compiled[row].evaluate(self.prices[self.leg_columns[row]].tolist())
+
+    def recompute_spreads(self) -> None:
+        """
+        完整重新计算接下来 recompute_chunk 个线性公式，消除增量更新的累计误差。
+        """
+        if len(self.linear_formulas) == 0 or not self.recompute_chunk:
+            return
+        chunk = self.linear_formulas[np.arange(self.cursor, self.cursor + self.recompute_chunk) % len(self.linear_formulas)]
+        self.cursor = (self.cursor + self.recompute_chunk) % len(self.linear_formulas)
+        chunk = np.unique(chunk)
+        self.evaluate_rows(chunk[self.missing[chunk] == 0])
+
+    def close_bar(self) -> None:
+        """
+        当前K线结束，用各公式的最新价差更新滚动统计量。
+        """
+        columns = np.flatnonzero(~np.isnan(self.spread))
+        if len(columns):
+            self.stats.update(columns, self.spread[columns])
+        self.bars += 1
+
+    def load_history(self, spreads: pd.DataFrame) -> None:
+        """
+        用历史K线的价差（列为公式，行为时间，如 SpreadCalculation 计算的分钟价差）预先填充滚动统计量，
+        启动后即可给出z_score。不在监控范围内的列忽略。
+        """
+        position = {formula: i for i, formula in enumerate(self.formulas)}
+        spreads = spreads[[column for column in spreads.columns if column in position]]
+        columns = np.array([position[column] for column in spreads.columns], dtype = np.int64)
+        for values in spreads.to_numpy(dtype = np.float64):
+            valid = ~np.isnan(values)
+            if valid.any():
+                self.stats.update(columns[valid], values[valid])
+
+    def zscores(self, mean: np.ndarray = None, std: np.ndarray = None) -> np.ndarray:
+        """
+        各公式当前价差的z_score，价差未知、K线数量不足或标准差为0时为空值。
+        """
+        mean = self.stats.mean if mean is None else mean
+        std = self.stats.std if std is None else std
+        usable = (self.stats.count >= self.min_periods) & (std > 0) & ~np.isnan(self.spread)
+        result = np.full(len(self.formulas), np.nan)
+        result[usable] = (self.spread[usable] - mean[usable]) / std[usable]
+        return result
+
+    def ranking(self, top_n: int = None) -> pd.DataFrame:
+        """
+        z_score 绝对值最大的 top_n 个价差，按绝对值从大到小排列；top_n 为空时使用初始化时的设置，为0时返回全部。
+        """
+        top_n = self.top_n if top_n is None else top_n
+        mean, std = self.stats.mean, self.stats.std
+        zscores = self.zscores(mean, std)
+        rows = np.flatnonzero(~np.isnan(zscores))
+        magnitude = np.abs(zscores[rows])
+        if top_n and top_n < len(rows):
+            selected = np.argpartition(-magnitude, top_n - 1)[:top_n]
+            rows, magnitude = rows[selected], magnitude[selected]
+        rows = rows[np.argsort(-magnitude, kind = "stable")]
+        return pd.DataFrame({
+            "formula": [self.formulas[row] for row in rows.tolist()],
+            "spread": self.spread[rows],
+            "mean": mean[rows],
+            "std": std[rows],
+            "zscore": zscores[rows],
+            "bars": self.stats.count[rows],
+        })
+
+    def publish(self, timestamp: int) -> None:
+        self.last_publish = timestamp
+        self.table = self.ranking()
+        for callback in self.subscribers:
+            callback(self.table, pd.Timestamp(timestamp))
+
+    def update_ticks(self, ticks: list) -> None:
+        """
+        处理一批vnpy的TickData，使用最新价，时间取这批tick中最晚的时间。
+        """
+        if not ticks:
+            return
+        self.update(
+            max(tick.datetime for tick in ticks),
+            [tick.symbol for tick in ticks],
+            [tick.last_price for tick in ticks],
+        )
+
+
+def resolve_live_contracts(catalog, legs: list, date = None) -> dict:
+    """
+    把公式中的合约代码（如RB10）映射为 date 当天正在交易的对应月份合约（如RB2310），
+    可以直接作为 UniverseMonitor 的 symbol_map；找不到正在交易的合约时不映射。
+    """
+    date = pd.Timestamp(date).normalize() if date is not None else pd.Timestamp.today().normalize()
+    mapping = {}
+    for leg in legs:
+        contracts = catalog.lookup(leg, 0)
+        for _, row in contracts.iterrows():
+            listed = parse_date(row["listed_date"])
+            de_listed = parse_date(row["de_listed_date"])
+            if (listed is None or listed <= date) and (de_listed is None or de_listed >= date):
+                mapping[leg] = row["order_book_id"]
+                break
+    return mapping
+
+
+def simulated_leg_ticks(
+    symbols: list,
+    batches: int,
+    start = "2023-01-03 09:00:00",
+    freq: str = "500ms",
+    tick_probability: float = 0.2,
+    prices = None,
+    volatility: float = 0.0005,
+    seed: int = 0,
+):
+    """
+    本地模拟的腿行情：每 freq 一批，每条腿以 tick_probability 的概率出现新价格，价格为对数随机游走。
+    返回生成器，每次得到 (时间, 腿在symbols中的位置, 价格)，可以直接传给 UniverseMonitor.update。
+    """
+    rng = np.random.default_rng(seed)
+    n = len(symbols)
+    current = np.asarray(prices, dtype = np.float64).copy() if prices is not None else rng.uniform(1000.0, 5000.0, n)
+    step = pd.Timedelta(freq).value
+    timestamp = pd.Timestamp(start).value
+    # 第一批包含所有腿的价格
+    yield pd.Timestamp(timestamp), np.arange(n), current.copy()
+    for _ in range(batches - 1):
+        timestamp += step
+        legs = np.flatnonzero(rng.random(n) < tick_probability)
+        current[legs] *= np.exp(rng.normal(0.0, volatility, len(legs)))
+        yield pd.Timestamp(timestamp), legs, current[legs]
+
+
+def run_monitor(monitor: UniverseMonitor, feed, speed: float = None) -> dict:
+    """
+    把行情逐批推送给监控器，返回处理的批数、tick数量、吞吐量和每批更新耗时的分布。
+    speed 为空时全速回放，否则按行情时间的speed倍回放。
+    """
+    start = time.perf_counter()
+    first_timestamp = None
+    batches = 0
+    for timestamp, symbols, prices in feed:
+        if speed:
+            timestamp_ns = pd.Timestamp(timestamp).value
+            if first_timestamp is None:
+                first_timestamp = timestamp_ns
+            wait = (timestamp_ns - first_timestamp) / 1e9 / speed - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+        monitor.update(timestamp, symbols, prices)
+        batches += 1
+    elapsed = time.perf_counter() - start
+    record = {
+        "formulas": len(monitor.formulas),
+        "legs": len(monitor.legs),
+        "batches": batches,
+        "ticks": monitor.ticks,
+        "bars": monitor.bars,
+        "elapsed": elapsed,
+        "ticks_per_second": monitor.ticks / elapsed if elapsed > 0 else 0.0,
+    }
+    record.update({f"update_{key}": value for key, value in monitor.latency.summary().items()})
+    return record
@@ -0,0 +1,225 @@
+"""
+ZscoreGridStrategy 参数优化。
+
+对 ma_window、volume_multiplier、max_pos、payup、interval 的参数网格做批量回测：
+同一个 ma_window 的滚动均值、标准差只计算一次，与回测相同按窗口两遍计算；
+多个 ma_window 分成几批，每批作为一个任务分配到多个进程中执行，价差序列放在共享内存中。
+
+payup、interval 只影响价差算法的下单方式，在按收盘价成交的回测中结果相同，
+因此只回测一次，结果复制到这两个参数的所有组合上。
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .backtest import rolling_mean_std, zscore_grid_positions
+from .parallel import SharedArray
+
+
+# 影响回测结果的参数，其余参数只影响下单方式
+SIGNAL_PARAMETERS = ["ma_window", "volume_multiplier", "max_pos"]
+
+DEFAULT_PARAMETERS = {
+    "ma_window": 20,
+    "volume_multiplier": 5,
+    "max_pos": 25,
+    "payup": 10,
+    "interval": 5,
+}
+
+
+def batch_rolling_mean_std(close: np.ndarray, windows) -> dict:
+    """
+    计算多个窗口的滚动均值和总体标准差，返回 {窗口: (均值, 标准差)}。
+    与回测使用同一个 rolling_mean_std，z_score 在整数边界上的取整与 backtest_zscore_grid 相同。
+    """
+    close = np.asarray(close, dtype = np.float64)
+    return {window: rolling_mean_std(close, window) for window in sorted(set(windows))}
+
+
+def performance(pnl: np.ndarray, traded: np.ndarray, annualization: float) -> dict:
+    """
+    根据每根K线的盈亏计算夏普比率、最大回撤和换手。
+    """
+    if len(pnl) == 0:
+        return {"total_pnl": 0.0, "sharpe": np.nan, "max_drawdown": 0.0, "turnover": 0.0, "trade_count": 0}
+    equity = np.cumsum(pnl)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity
+    pnl_std = pnl.std()
+    return {
+        "total_pnl": float(equity[-1]),
+        "sharpe": float(pnl.mean() / pnl_std * np.sqrt(annualization)) if pnl_std > 0 else np.nan,
+        "max_drawdown": float(drawdown.max()),
+        "turnover": float(np.abs(traded).sum()),
+        "trade_count": int(np.count_nonzero(traded)),
+    }
+
+
+def evaluate_windows(close_spec, end: int, window_combinations: list, segments: list, annualization: float, cost: float):
+    """
+    子进程任务：回测多个ma_window下的多组参数，返回每组参数在每个区间上的绩效。
+    close_spec 为共享内存中价差序列的描述，只使用前end根K线；
+    window_combinations 为 [(ma_window, [(volume_multiplier, max_pos), ...]), ...]。
+    """
+    shared = SharedArray.attach(close_spec)
+    try:
+        close = np.array(shared.array[:end])
+    finally:
+        shared.close()
+
+    stats = batch_rolling_mean_std(close, [window for window, _ in window_combinations])
+    price_change = np.concatenate([[0.0], np.diff(close)])
+    records = []
+    for window, combinations in window_combinations:
+        mean, std = stats[window]
+        for volume_multiplier, max_pos in combinations:
+            positions = zscore_grid_positions(close, window, volume_multiplier, max_pos, mean = mean, std = std)[0]
+            previous = np.concatenate([[0.0], positions[:-1]])
+            traded = positions - previous
+            pnl = previous * price_change - np.abs(traded) * cost
+            for segment, (start, stop) in enumerate(segments):
+                record = performance(pnl[start:stop], traded[start:stop], annualization)
+                record.update(ma_window = window, volume_multiplier = volume_multiplier, max_pos = max_pos, segment = segment)
+                records.append(record)
+    return records
+
+
+def pareto_front(metrics: pd.DataFrame) -> np.ndarray:
+    """
+    返回不被其他参数支配的参数组合：不存在夏普更高且回撤更小（至少一项严格更好）的组合。
+    """
+    sharpe = metrics["sharpe"].fillna(-np.inf).to_numpy()
+    drawdown = metrics["max_drawdown"].to_numpy()
+    better_or_equal = (sharpe[None, :] >= sharpe[:, None]) & (drawdown[None, :] <= drawdown[:, None])
+    strictly_better = (sharpe[None, :] > sharpe[:, None]) | (drawdown[None, :] < drawdown[:, None])
+    return ~(better_or_equal & strictly_better).any(axis = 1)
+
+
+class ZscoreGridOptimizer:
+    """
+    spread 为价差收盘价序列；parameter_ranges 为 {参数名: 取值列表}，未给出的参数使用策略默认值。
+    annualization 为年化系数，日线为252；commission、slippage 为每手的成本，以价差价格单位计。
+    """
+
+    def __init__(
+        self,
+        spread: pd.Series,
+        parameter_ranges: dict,
+        annualization: float = 252,
+        commission: float = 0.0,
+        slippage: float = 0.0,
+        max_workers: int = None,
+    ) -> None:
+        if isinstance(spread, pd.DataFrame):
+            spread = spread["spread"]
+        self.spread = spread
+        self.parameter_ranges = {name: list(parameter_ranges.get(name, [value])) for name, value in DEFAULT_PARAMETERS.items()}
+        self.annualization = annualization
+        self.cost = commission + slippage
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+        self.walk_forward = pd.DataFrame()
+
+    def signal_grid(self) -> pd.DataFrame:
+        """
+        影响回测结果的参数组合。
+        """
+        names = SIGNAL_PARAMETERS
+        return pd.DataFrame(list(itertools.product(*(self.parameter_ranges[name] for name in names))), columns = names)
+
+    def evaluate(self, grid: pd.DataFrame, end: int, segments: list) -> pd.DataFrame:
+        """
+        回测grid中的参数组合，只使用前end根K线，返回每组参数在每个区间上的绩效。
+        """
+        close = SharedArray.from_array(self.spread.to_numpy(dtype = np.float64))
+        try:
+            window_combinations = [
+                (int(window), list(zip(group["volume_multiplier"], group["max_pos"])))
+                for window, group in grid.groupby("ma_window", sort = True)
+            ]
+            # 每个任务批量处理若干个ma_window，任务数量不超过进程数量
+            n_tasks = max(1, min(self.max_workers, len(window_combinations)))
+            tasks = [
+                (close.spec, end, window_combinations[i::n_tasks], segments, self.annualization, self.cost)
+                for i in range(n_tasks)
+            ]
+
+            if n_tasks <= 1:
+                results = [evaluate_windows(*task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers = n_tasks) as executor:
+                    results = list(executor.map(evaluate_windows, *zip(*tasks)))
+        finally:
+            close.close()
+        return pd.DataFrame(list(itertools.chain.from_iterable(results)))
+
+    def run(self, walk_forward_splits: int = 0, prune: bool = False, keep_ratio: float = 0.2) -> pd.DataFrame:
+        """
+        返回按夏普比率排序的结果表。
+
+        walk_forward_splits 大于0时，把价差序列等分成 walk_forward_splits + 1 段，
+        第i次向前滚动以前i段为样本内、第i+1段为样本外，
+        self.walk_forward 记录每次样本内最优参数及其样本外绩效，结果表中的绩效为样本外各段的平均。
+        prune 为True时，先只用第一段数据回测全部参数，剔除被支配的组合（只保留帕累托前沿
+        和夏普比率排名前 keep_ratio 的组合），剩余组合再回测全部数据。
+        """
+        n = len(self.spread)
+        bounds = np.linspace(0, n, max(walk_forward_splits, 0) + 2).astype(int)
+        segments = [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+        grid = self.signal_grid()
+
+        if prune and len(grid) > 1:
+            prune_end = segments[0][1] if walk_forward_splits > 0 else n // 3
+            first = self.evaluate(grid, prune_end, [(0, prune_end)])
+            ranked = first["sharpe"].rank(ascending = False, method = "min")
+            keep = pareto_front(first) | (ranked <= max(1, int(np.ceil(len(first) * keep_ratio)))).to_numpy()
+            grid = first.loc[keep, SIGNAL_PARAMETERS].reset_index(drop = True)
+
+        metrics = self.evaluate(grid, n, segments if walk_forward_splits > 0 else [(0, n)])
+        if walk_forward_splits > 0:
+            results = self.summarize_walk_forward(metrics, len(segments))
+        else:
+            results = metrics.drop(columns = "segment")
+
+        results = self.expand_execution_parameters(results)
+        results = results.sort_values(["sharpe", "max_drawdown"], ascending = [False, True], na_position = "last")
+        return results.reset_index(drop = True)
+
+    def summarize_walk_forward(self, metrics: pd.DataFrame, n_segments: int) -> pd.DataFrame:
+        """
+        记录每次向前滚动的样本内最优参数和样本外绩效，并返回各参数样本外绩效的平均值。
+        """
+        records = []
+        for test_segment in range(1, n_segments):
+            train = metrics[metrics["segment"] < test_segment]
+            train_sharpe = train.groupby(SIGNAL_PARAMETERS)["sharpe"].mean()
+            if train_sharpe.dropna().empty:
+                continue
+            best = train_sharpe.idxmax()
+            test = metrics[metrics["segment"] == test_segment].set_index(SIGNAL_PARAMETERS).loc[best]
+            record = dict(zip(SIGNAL_PARAMETERS, best))
+            record.update(segment = test_segment, train_sharpe = train_sharpe[best], test_sharpe = test["sharpe"], test_pnl = test["total_pnl"])
+            records.append(record)
+        self.walk_forward = pd.DataFrame(records)
+
+        out_of_sample = metrics[metrics["segment"] > 0]
+        return out_of_sample.groupby(SIGNAL_PARAMETERS, as_index = False).agg(
+            total_pnl = ("total_pnl", "sum"),
+            sharpe = ("sharpe", "mean"),
+            max_drawdown = ("max_drawdown", "max"),
+            turnover = ("turnover", "sum"),
+            trade_count = ("trade_count", "sum"),
+        )
+
+    def expand_execution_parameters(self, results: pd.DataFrame) -> pd.DataFrame:
+        """
+        payup、interval 不影响回测结果，把每组结果复制到这两个参数的全部取值上。
+        """
+        execution = pd.DataFrame(
+            list(itertools.product(self.parameter_ranges["payup"], self.parameter_ranges["interval"])),
+            columns = ["payup", "interval"],
+        )
+        return results.merge(execution, how = "cross")
@@ -0,0 +1,195 @@
+"""
+紧凑的多合约行情面板。
+
+download_hist_data 返回的DataFrame包含全部OHLCV字段（float64）和每行重复的 order_book_id 字符串，
+实际只用到收盘价。PricePanel 只保存需要的字段，可以用float32保存：
+    times 为int64纳秒时间戳；
+    合约编号为整数，同一合约的行连续存放、按时间排序，offsets[i]:offsets[i+1] 为第i个合约的行；
+    每个字段一个一维数组。
+取单个合约的行情只是数组切片（视图），不复制数据；面板可以保存为 .npy 文件，读取时使用内存映射。
+全部品种的分钟行情只需要 (8 + 4) 字节 × 行数，可以一次载入内存。
+float32只有约7位有效数字，价格在万元以上时误差可达0.01，需要精确价差时使用float64。
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .price_cache import PriceCache, parse_date, time_range_slice
+
+
+class PricePanel:
+    """
+    contracts 为合约代码列表，times、各字段数组按合约、时间排序，offsets 长度为合约数量加1。
+    """
+
+    def __init__(self, contracts: list, times: np.ndarray, offsets: np.ndarray, fields: dict) -> None:
+        self.contracts = list(contracts)
+        self.times = times
+        self.offsets = np.asarray(offsets, dtype = np.int64)
+        self.fields = fields
+        self.code_of = {order_book_id: i for i, order_book_id in enumerate(self.contracts)}
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.offsets.nbytes + sum(values.nbytes for values in self.fields.values())
+
+    @property
+    def codes(self) -> np.ndarray:
+        """
+        每行的合约编号（int32），需要时才生成。
+        """
+        return np.repeat(np.arange(len(self.contracts), dtype = np.int32), np.diff(self.offsets))
+
+    def contract(self, order_book_id: str, field: str = "close"):
+        """
+        返回单个合约的 (时间戳, 价格)，均为面板数组的视图；面板中没有该合约时返回空数组。
+        """
+        code = self.code_of.get(order_book_id)
+        if code is None:
+            return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = self.fields[field].dtype)
+        start, end = self.offsets[code], self.offsets[code + 1]
+        return self.times[start:end], self.fields[field][start:end]
+
+    def contract_arrays(self, order_book_ids: list, field: str = "close"):
+        """
+        多个合约的行拼接成 (合约在order_book_ids中的位置, 时间戳, 价格)，只复制这几个合约的数据。
+        """
+        codes, times, values = [], [], []
+        for i, order_book_id in enumerate(order_book_ids):
+            contract_times, contract_values = self.contract(order_book_id, field)
+            codes.append(np.full(len(contract_times), i, dtype = np.int64))
+            times.append(contract_times)
+            values.append(contract_values)
+        if not codes:
+            return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64), np.zeros(0)
+        return np.concatenate(codes), np.concatenate(times), np.concatenate(values)
+
+    def select(self, order_book_ids: list) -> "PricePanel":
+        """
+        只包含指定合约的新面板，合约顺序与order_book_ids相同，面板中没有的合约为空。
+        """
+        slices = []
+        for order_book_id in order_book_ids:
+            code = self.code_of.get(order_book_id)
+            slices.append((0, 0) if code is None else (self.offsets[code], self.offsets[code + 1]))
+        offsets = np.concatenate([[0], np.cumsum([end - start for start, end in slices])])
+        times = np.concatenate([self.times[start:end] for start, end in slices]) if slices else self.times[:0]
+        fields = {
+            field: np.concatenate([values[start:end] for start, end in slices]) if slices else values[:0]
+            for field, values in self.fields.items()
+        }
+        return PricePanel(order_book_ids, times, offsets, fields)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        转换成与 download_hist_data 相同格式的表格：index 为时间，order_book_id 列为分类类型，按时间排序。
+        """
+        order = np.argsort(self.times, kind = "stable")
+        frame = pd.DataFrame(
+            {field: values[order] for field, values in self.fields.items()},
+            index = pd.DatetimeIndex(np.asarray(self.times)[order].view("datetime64[ns]")),
+        )
+        frame.insert(0, "order_book_id", pd.Categorical.from_codes(self.codes[order], categories = self.contracts))
+        return frame
+
+    @classmethod
+    def from_frame(cls, contracts_price: pd.DataFrame, fields = ("close",), dtype = np.float32) -> "PricePanel":
+        """
+        由 download_hist_data 返回的表格生成面板，只保留fields中的字段。
+        """
+        contracts, codes = np.unique(contracts_price["order_book_id"].to_numpy(), return_inverse = True)
+        times = pd.DatetimeIndex(contracts_price.index).as_unit("ns").asi8
+        order = np.lexsort((times, codes))
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength = len(contracts)))])
+        values = {field: contracts_price[field].to_numpy(dtype = dtype)[order] for field in fields}
+        return cls(list(contracts), times[order], offsets, values)
+
+    @classmethod
+    def from_price_cache(
+        cls,
+        price_cache: PriceCache,
+        contract_info: pd.DataFrame,
+        frequency: str = "1d",
+        fields = ("close",),
+        dtype = np.float32,
+        start_date = None,
+        end_date = None,
+    ) -> "PricePanel":
+        """
+        读取合约信息表中全部合约的行情，缺失的数据先下载到缓存。
+        直接从缓存的内存映射中截取需要的字段和时间区间，不创建DataFrame，内存中只有压缩后的数组。
+        start_date、end_date 为空时使用各合约的上市、退市日期。
+        """
+        contracts, times, values = [], [], {field: [] for field in fields}
+        for _, row in contract_info.iterrows():
+            start = start_date if start_date is not None else row["listed_date"]
+            end = end_date if end_date is not None else row["de_listed_date"]
+            if parse_date(end) is None:
+                end = pd.Timestamp.today().normalize()
+            timestamps, matrix, meta = price_cache.get_arrays(row["order_book_id"], start, end, frequency, row["de_listed_date"], row["listed_date"])
+            left, right = time_range_slice(timestamps, start, end)
+            columns = {field: i for i, field in enumerate(meta["fields"])}
+            contracts.append(row["order_book_id"])
+            times.append(np.array(timestamps[left:right], dtype = np.int64))
+            for field in fields:
+                if field in columns:
+                    values[field].append(np.array(matrix[left:right, columns[field]], dtype = dtype))
+                else:
+                    values[field].append(np.full(right - left, np.nan, dtype = dtype))
+        offsets = np.concatenate([[0], np.cumsum([len(contract_times) for contract_times in times])])
+        if not contracts:
+            return cls([], np.zeros(0, dtype = np.int64), offsets, {field: np.zeros(0, dtype = dtype) for field in fields})
+        return cls(contracts, np.concatenate(times), offsets, {field: np.concatenate(arrays) for field, arrays in values.items()})
+
+    def save(self, directory: str) -> None:
+        """
+        保存为 directory 下的 times.npy、offsets.npy、各字段的 .npy 文件和 meta.json。
+        """
+        os.makedirs(directory, exist_ok = True)
+        np.save(os.path.join(directory, "times.npy"), np.ascontiguousarray(self.times, dtype = np.int64))
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        for field, values in self.fields.items():
+            np.save(os.path.join(directory, f"{field}.npy"), np.ascontiguousarray(values))
+        # 先写入数组再写 meta.json，中途失败时不会留下不完整的面板
+        with open(os.path.join(directory, "meta.json"), "w", encoding = "utf-8") as f:
+            json.dump({"contracts": self.contracts, "fields": list(self.fields)}, f, ensure_ascii = False)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = "r") -> "PricePanel":
+        """
+        读取保存的面板，mmap_mode 为 "r" 时使用内存映射，只有用到的部分才从磁盘读入。
+        """
+        with open(os.path.join(directory, "meta.json"), "r", encoding = "utf-8") as f:
+            meta = json.load(f)
+        times = np.load(os.path.join(directory, "times.npy"), mmap_mode = mmap_mode)
+        offsets = np.load(os.path.join(directory, "offsets.npy"))
+        fields = {field: np.load(os.path.join(directory, f"{field}.npy"), mmap_mode = mmap_mode) for field in meta["fields"]}
+        return cls(meta["contracts"], times, offsets, fields)
+
+
+def universe_panel(
+    catalog,
+    price_cache: PriceCache,
+    frequency: str = "1m",
+    underlying_symbols: list = None,
+    min_de_listed_date = None,
+    fields = ("close",),
+    dtype = np.float32,
+) -> PricePanel:
+    """
+    合约信息目录中全部（或指定品种的）合约的行情面板。
+    min_de_listed_date 不为空时，只包含在该日期之后退市或仍在交易的合约。
+    """
+    contracts = catalog.contracts
+    if underlying_symbols is not None:
+        contracts = contracts[contracts["underlying_symbol"].isin(underlying_symbols)]
+    if min_de_listed_date is not None:
+        de_listed = pd.to_datetime(contracts["de_listed_date"].replace("0000-00-00", None))
+        contracts = contracts[de_listed.isna().to_numpy() | (de_listed >= pd.Timestamp(min_de_listed_date)).to_numpy()]
+    return PricePanel.from_price_cache(price_cache, contracts, frequency, fields, dtype)
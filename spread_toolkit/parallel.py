@@ -0,0 +1,167 @@
+"""
+多进程价差计算。
+
+价格矩阵、价差矩阵放在共享内存中，子进程直接读取，不需要序列化DataFrame；
+每个任务把结果写入输出矩阵中固定的位置，因此合并结果与进程数量、完成顺序无关。
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .formula import compile_formula
+from .seasonal import MONTHDAY_INDEX, last_in_group, monthday_slot
+
+
+class SharedArray:
+    """
+    共享内存中的NumPy数组。主进程用create创建，子进程用attach按名字读取。
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, shape, dtype, owner: bool) -> None:
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = owner
+        self.array = np.ndarray(self.shape, dtype = self.dtype, buffer = shm.buf)
+
+    @classmethod
+    def create(cls, shape, dtype, fill = None) -> "SharedArray":
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        shared = cls(shared_memory.SharedMemory(create = True, size = size), shape, dtype, owner = True)
+        if fill is not None:
+            shared.array[...] = fill
+        return shared
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "SharedArray":
+        shared = cls.create(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, spec) -> "SharedArray":
+        name, shape, dtype = spec
+        return cls(shared_memory.SharedMemory(name = name), shape, dtype, owner = False)
+
+    @property
+    def spec(self):
+        return self.shm.name, self.shape, self.dtype.str
+
+    def close(self):
+        # 释放共享内存前必须先去掉对缓冲区的引用
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class ParallelSpreadRunner:
+    """
+    max_workers 为进程数量，默认使用全部CPU核心；为1时在当前进程中直接计算，方便调试。
+    """
+
+    def __init__(self, max_workers: int = None) -> None:
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+
+    def map(self, func, tasks: list):
+        if self.max_workers <= 1 or len(tasks) <= 1:
+            return [func(*task) for task in tasks]
+        with ProcessPoolExecutor(max_workers = self.max_workers) as executor:
+            return list(executor.map(func, *zip(*tasks)))
+
+    def evaluate_formulas(self, leg_prices: pd.DataFrame, formulas: list) -> pd.DataFrame:
+        """
+        leg_prices 为按时间对齐的合约价格宽表，列名为合约代码（如RB10）。
+        返回时间为行、公式为列的价差宽表。
+        """
+        legs = list(leg_prices.columns)
+        prices = SharedArray.from_array(leg_prices.to_numpy(dtype = np.float64))
+        output = SharedArray.create((len(leg_prices), len(formulas)), np.float64, fill = np.nan)
+        try:
+            batches = split_batches(list(enumerate(formulas)), self.max_workers)
+            tasks = [(prices.spec, output.spec, legs, batch) for batch in batches]
+            self.map(evaluate_formula_batch, tasks)
+            spreads = pd.DataFrame(output.array.copy(), index = leg_prices.index, columns = formulas)
+        finally:
+            prices.close()
+            output.close()
+        return spreads
+
+    def split_by_year(self, spreads: pd.DataFrame) -> dict:
+        """
+        将每个价差按年份拆分成季节图数据，与SpreadCalculation.split_by_year的格式相同：
+        行为"01-01"到"12-31"共366天，列为年份。返回 {公式: DataFrame}。
+        """
+        spreads = spreads.sort_index()
+        index = pd.DatetimeIndex(spreads.index)
+        timestamps = index.as_unit("ns").asi8
+        years = index.year.unique().to_numpy()
+        # 每一年在时间序列中的起止位置
+        bounds = np.searchsorted(index.year.to_numpy(), np.append(years, years[-1] + 1 if len(years) else 0))
+
+        values = SharedArray.from_array(spreads.to_numpy(dtype = np.float64))
+        stamps = SharedArray.from_array(timestamps)
+        output = SharedArray.create((len(MONTHDAY_INDEX), len(years), spreads.shape[1]), np.float64, fill = np.nan)
+        try:
+            tasks = [
+                (values.spec, stamps.spec, output.spec, i, bounds[i], bounds[i + 1])
+                for i in range(len(years))
+            ]
+            self.map(split_year, tasks)
+            seasonal = {
+                column: pd.DataFrame(output.array[:, :, k].copy(), index = MONTHDAY_INDEX, columns = years)
+                for k, column in enumerate(spreads.columns)
+            }
+        finally:
+            values.close()
+            stamps.close()
+            output.close()
+        return seasonal
+
+
+def split_batches(items: list, n: int) -> list:
+    """
+    将任务平均分成n份，保持原有顺序。
+    """
+    n = max(1, min(n, len(items)))
+    return [batch for batch in (items[i::n] for i in range(n)) if batch]
+
+
+def evaluate_formula_batch(prices_spec, output_spec, legs: list, batch: list):
+    """
+    子进程任务：计算一批公式，结果写入输出矩阵对应的列。
+    """
+    prices = SharedArray.attach(prices_spec)
+    output = SharedArray.attach(output_spec)
+    try:
+        leg_position = {leg: i for i, leg in enumerate(legs)}
+        for column, formula in batch:
+            compiled_formula = compile_formula(formula)
+            columns = [leg_position[leg] for leg in compiled_formula.dependencies]
+            output.array[:, column] = compiled_formula.evaluate_matrix(prices.array[:, columns])
+    finally:
+        prices.close()
+        output.close()
+
+
+def split_year(values_spec, stamps_spec, output_spec, year_position: int, start: int, end: int):
+    """
+    子进程任务：把某一年的价差按月日写入季节矩阵的对应位置。
+    """
+    values = SharedArray.attach(values_spec)
+    stamps = SharedArray.attach(stamps_spec)
+    output = SharedArray.attach(output_spec)
+    try:
+        slots = monthday_slot(stamps.array[start:end])
+        # 日内数据同一天有多行，只保留当天最后一个价格
+        keep = last_in_group(slots)
+        output.array[slots[keep], year_position, :] = values.array[start:end][keep]
+    finally:
+        values.close()
+        stamps.close()
+        output.close()
+
@@ -0,0 +1,275 @@
+"""
+价差图的绘制和导出。
+
+分钟数据或很多年的日线数据画成 go.Scatter 时，每个点都写进HTML，浏览器渲染很慢。这里提供：
+    1. 降采样：LTTB（Largest-Triangle-Three-Buckets）保留曲线形状，min/max 每个区间保留最高、最低点；
+    2. WebGL 模式：用 go.Scattergl 代替 go.Scatter，横轴用位置编号代替类别轴；
+    3. 静态导出：plotly 图通过 kaleido 导出，批量报告用 matplotlib 直接画成PNG/SVG，不需要浏览器。
+plotly、kaleido、matplotlib 都只在用到时才导入。
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+# 降采样后每条曲线默认保留的点数，约为屏幕宽度的像素数
+DEFAULT_MAX_POINTS = 2000
+
+
+def lttb_indices(values: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    LTTB降采样，返回保留的点的位置，横坐标为等间距的位置编号。
+    首尾两点固定保留，中间的点分成 threshold - 2 个区间，
+    每个区间保留与上一个保留点、下一个区间平均点构成三角形面积最大的点。
+    """
+    values = np.asarray(values, dtype = np.float64)
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    result = np.empty(threshold, dtype = np.int64)
+    result[0] = 0
+    result[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个区间的平均点，最后一个区间用最后一个点
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = (next_start + next_end - 1) / 2.0
+            avg_y = values[next_start:next_end].mean()
+        else:
+            avg_x = n - 1.0
+            avg_y = values[-1]
+
+        x = np.arange(start, end, dtype = np.float64)
+        area = np.abs((a - avg_x) * (values[start:end] - values[a]) - (a - x) * (avg_y - values[a]))
+        a = start + int(np.argmax(area))
+        result[i + 1] = a
+    return result
+
+
+def minmax_indices(values: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    把数据等分成 threshold // 2 个区间，每个区间保留最高点和最低点，返回按顺序排列的位置。
+    """
+    values = np.asarray(values, dtype = np.float64)
+    n = len(values)
+    buckets = max(threshold // 2, 1)
+    if threshold >= n or n == 0:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    padded_min = np.full(buckets * size, np.inf)
+    padded_max = np.full(buckets * size, -np.inf)
+    padded_min[:n] = values
+    padded_max[:n] = values
+    offsets = np.arange(buckets) * size
+    lows = offsets + padded_min.reshape(buckets, size).argmin(axis = 1)
+    highs = offsets + padded_max.reshape(buckets, size).argmax(axis = 1)
+    indices = np.unique(np.concatenate([[0, n - 1], lows, highs]))
+    return indices[indices < n]
+
+
+def downsample_indices(values: np.ndarray, max_points: int, method: str = "lttb") -> np.ndarray:
+    """
+    返回降采样后保留的非空值的位置，method 为 "lttb" 或 "minmax"。
+    """
+    values = np.asarray(values, dtype = np.float64)
+    valid = np.flatnonzero(~np.isnan(values))
+    if max_points is None or len(valid) <= max_points:
+        return valid
+    if method == "lttb":
+        selected = lttb_indices(values[valid], max_points)
+    elif method == "minmax":
+        selected = minmax_indices(values[valid], max_points)
+    else:
+        raise ValueError(f"不支持的降采样方法: {method}")
+    return valid[selected]
+
+
+def downsample(series: pd.Series, max_points: int = DEFAULT_MAX_POINTS, method: str = "lttb") -> pd.Series:
+    """
+    去掉空值后降采样，返回原序列的子集。
+    """
+    return series.iloc[downsample_indices(series.to_numpy(dtype = np.float64), max_points, method)]
+
+
+def tick_labels(index, count: int = 10):
+    """
+    横轴只显示count个标签，返回 (标签位置, 标签文字)。
+    """
+    step = max(int(len(index) / count), 1)
+    tickvals = list(range(0, len(index), step))
+    return tickvals, [index[i] for i in tickvals]
+
+
+def figure_layout(xaxis: dict) -> dict:
+    return dict(
+        xaxis_title = "X轴",
+        yaxis_title = "Y轴",
+        yaxis = dict(
+            showgrid = True,
+            zeroline = True,
+            showline = True,
+            gridcolor = "#eee",
+            linecolor = "#444"
+        ),
+        xaxis = xaxis,
+        legend = dict(
+            orientation = "h",
+            x = 0.25,
+            y = 1.15,
+            xanchor = "left",
+            yanchor = "top",
+            traceorder = "normal",
+            font = dict(
+                family = "Arial",
+                size = 12,
+                color = "black"
+            ),
+            bgcolor = "rgba(0,0,0,0)",
+            bordercolor = "rgba(0,0,0,0)"
+        ),
+        plot_bgcolor = "white"
+    )
+
+
+def create_figure(data: pd.DataFrame, webgl: bool = False, max_points: int = None, method: str = "lttb"):
+    """
+    每列画一条曲线。webgl 为False且不降采样时与原来的画法相同（类别横轴、go.Scatter）；
+    否则横轴为位置编号，只把标签显示成索引的值，每列降采样到max_points个点，webgl 为True时使用 go.Scattergl。
+    """
+    # 只有画图时才导入plotly
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    x = data.index
+    tickvals, ticktext = tick_labels(x)
+
+    if not webgl and max_points is None:
+        # 根据 列名 遍历传入的数据表
+        for label, content in data.items():
+            fig.add_trace(
+                go.Scatter(
+                    x = x,
+                    y = content,
+                    mode = "lines",
+                    name = label,
+                    connectgaps = True,
+                    showlegend = True
+                )
+            )
+        xaxis = dict(
+            type = "category",
+            categoryarray = x,
+            showgrid = True,
+            zeroline = True,
+            gridcolor = "#eee",
+            linecolor = "#444",
+            tickvals = tickvals,
+            ticktext = ticktext,
+        )
+        fig.update_layout(**figure_layout(xaxis))
+        return fig
+
+    trace_class = go.Scattergl if webgl else go.Scatter
+    for label, content in data.items():
+        # 降采样时已经去掉空值，曲线自然连接空白处
+        positions = downsample_indices(content.to_numpy(dtype = np.float64), max_points, method)
+        fig.add_trace(
+            trace_class(
+                x = positions,
+                y = content.to_numpy(dtype = np.float64)[positions],
+                mode = "lines",
+                name = str(label),
+                showlegend = True
+            )
+        )
+    xaxis = dict(
+        type = "linear",
+        range = [0, max(len(x) - 1, 1)],
+        showgrid = True,
+        zeroline = False,
+        gridcolor = "#eee",
+        linecolor = "#444",
+        tickvals = tickvals,
+        ticktext = [str(text) for text in ticktext],
+    )
+    fig.update_layout(**figure_layout(xaxis))
+    return fig
+
+
+def export_figure(fig, path: str, width: int = 1200, height: int = 600, scale: float = 1.0) -> str:
+    """
+    把plotly图导出为静态图片，格式由扩展名决定（.png、.svg、.pdf），需要安装kaleido。
+    """
+    try:
+        import kaleido  # noqa: F401
+    except ImportError:
+        raise ImportError("导出plotly静态图片需要安装kaleido，或使用 save_static_plot 通过matplotlib导出") from None
+    fig.write_image(path, width = width, height = height, scale = scale)
+    return path
+
+
+def save_static_plot(
+    data: pd.DataFrame,
+    path: str,
+    title: str = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+    method: str = "minmax",
+    width: int = 1200,
+    height: int = 600,
+    dpi: int = 100,
+) -> str:
+    """
+    用matplotlib把数据表画成静态图片，格式由扩展名决定（.png、.svg），不需要浏览器和plotly。
+    横轴为位置编号，与交互图一样不显示非交易日的空白；每列先降采样到max_points个点。
+    """
+    # 直接使用Figure对象，不经过pyplot，不改变全局后端，也不需要图形界面
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize = (width / dpi, height / dpi), dpi = dpi)
+    ax = fig.subplots()
+    for label, content in data.items():
+        values = content.to_numpy(dtype = np.float64)
+        positions = downsample_indices(values, max_points, method)
+        ax.plot(positions, values[positions], linewidth = 1, label = str(label))
+
+    tickvals, ticktext = tick_labels(data.index)
+    ax.set_xticks(tickvals)
+    ax.set_xticklabels([str(text) for text in ticktext], rotation = 30, ha = "right")
+    ax.set_xlim(0, max(len(data.index) - 1, 1))
+    ax.grid(True, color = "#eee")
+    if title:
+        ax.set_title(title)
+    if len(data.columns):
+        ax.legend(loc = "upper center", bbox_to_anchor = (0.5, 1.12), ncol = min(len(data.columns), 10), frameon = False, fontsize = 8)
+    # 固定边距，tight_layout 需要多画一遍
+    fig.subplots_adjust(left = 0.06, right = 0.98, top = 0.88, bottom = 0.15)
+    fig.savefig(path)
+    return path
+
+
+def save_static_plots(frames: dict, directory: str, image_format: str = "png", max_workers: int = 1, **kwargs) -> list:
+    """
+    批量导出，frames 为 {名称: 数据表}，图片保存为 directory/名称.image_format，返回文件路径列表。
+    max_workers 大于1时用多个进程同时导出。
+    """
+    os.makedirs(directory, exist_ok = True)
+    tasks = []
+    for name, data in frames.items():
+        # 价差公式中的空格、运算符不适合作为文件名
+        filename = "".join(char if char.isalnum() or char in "-_" else "_" for char in str(name))
+        path = os.path.join(directory, f"{filename}.{image_format}")
+        tasks.append((data, path, str(name)))
+
+    if max_workers <= 1 or len(tasks) <= 1:
+        return [save_static_plot(data, path, title = title, **kwargs) for data, path, title in tasks]
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(save_static_plot, data, path, title = title, **kwargs) for data, path, title in tasks]
+        return [future.result() for future in futures]
@@ -0,0 +1,249 @@
+"""
+本地行情缓存。
+
+按 (order_book_id, frequency) 将合约行情以 NumPy 数组形式保存在磁盘上，
+读取时使用内存映射 (mmap)，不需要把整个文件读进内存。
+已经退市的合约行情不会再变化，缓存完整后直接从磁盘读取；
+仍在交易的合约只下载缓存中最后一个时间戳之后的数据。
+"""
+
+import datetime as dt
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .datasource import DataSource, RqdataSource
+
+
+class PriceCache:
+    """
+    缓存目录结构为 cache_dir/frequency/order_book_id/ ，每个目录下有三个文件：
+    datetime.npy 时间戳(int64, 纳秒)，values.npy 行情(float64, 行为时间，列为字段)，
+    meta.json 字段名称、已下载的日期范围以及缓存是否完整。
+    """
+
+    def __init__(self, cache_dir: str, data_source: DataSource = None) -> None:
+        self.cache_dir = cache_dir
+        self.data_source = data_source if data_source is not None else RqdataSource()
+
+    def get_contract_dir(self, order_book_id: str, frequency: str):
+        return os.path.join(self.cache_dir, frequency, order_book_id)
+
+    def load(self, order_book_id: str, frequency: str = "1d"):
+        """
+        读取缓存，返回 (时间戳数组, 行情数组, meta)，没有缓存时返回 None。
+        """
+        contract_dir = self.get_contract_dir(order_book_id, frequency)
+        meta_path = os.path.join(contract_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding = "utf-8") as f:
+            meta = json.load(f)
+        timestamps = np.load(os.path.join(contract_dir, "datetime.npy"), mmap_mode = "r")
+        values = np.load(os.path.join(contract_dir, "values.npy"), mmap_mode = "r")
+        return timestamps, values, meta
+
+    def save(self, order_book_id: str, frequency: str, timestamps, values, meta: dict):
+        contract_dir = self.get_contract_dir(order_book_id, frequency)
+        os.makedirs(contract_dir, exist_ok = True)
+        # 先写入数组再写 meta.json，中途失败时不会留下不完整的缓存
+        np.save(os.path.join(contract_dir, "datetime.npy"), np.ascontiguousarray(timestamps, dtype = np.int64))
+        np.save(os.path.join(contract_dir, "values.npy"), np.ascontiguousarray(values, dtype = np.float64))
+        with open(os.path.join(contract_dir, "meta.json"), "w", encoding = "utf-8") as f:
+            json.dump(meta, f, ensure_ascii = False)
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1d", de_listed_date = None, listed_date = None) -> pd.DataFrame:
+        """
+        返回单个合约 [start_date, end_date] 之间的行情。
+        de_listed_date、listed_date 为合约退市、上市日期，退市合约从上市日到退市日的缓存完整后不再访问数据源。
+        """
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+        timestamps, values, meta = self.get_arrays(order_book_id, start, end, frequency, de_listed_date, listed_date)
+        return self.to_frame(timestamps, values, meta["fields"], start, end, frequency)
+
+    def get_arrays(self, order_book_id: str, start_date, end_date, frequency: str = "1d", de_listed_date = None, listed_date = None):
+        """
+        与 get_price 相同，缺失的数据先下载到缓存，但返回缓存的 (时间戳数组, 行情数组, meta)，
+        数组为内存映射，不截取时间区间，也不创建DataFrame。
+        """
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date)
+        today = pd.Timestamp(dt.date.today())
+        de_listed = parse_date(de_listed_date)
+        listed = parse_date(listed_date)
+
+        cached = self.load(order_book_id, frequency)
+        if cached is None:
+            timestamps = np.empty(0, dtype = np.int64)
+            values = np.empty((0, 0), dtype = np.float64)
+            meta = {"fields": [], "complete": False, "fetched_from": None, "fetched_until": None}
+        else:
+            timestamps, values, meta = cached
+
+        fetched_from = parse_date(meta.get("fetched_from"))
+        fetched_until = parse_date(meta["fetched_until"])
+        if fetched_from is None and fetched_until is not None:
+            # 旧版本的缓存没有记录起始日期，以第一个时间戳所在的日期为准
+            fetched_from = pd.Timestamp(int(timestamps[0])).normalize() if len(timestamps) else fetched_until
+        # 未来的数据无法下载，最多只下载到今天
+        fetch_end = min(end, today)
+        if de_listed is not None:
+            fetch_end = min(fetch_end, de_listed)
+
+        changed = False
+        if not meta["complete"] and fetched_from is not None and start < fetched_from:
+            # 缓存的起始日期晚于请求的起始日期，补充下载前面缺失的部分
+            head = self.data_source.get_price(order_book_id, start.date(), (fetched_from - pd.Timedelta(days = 1)).date(), frequency)
+            timestamps, values, meta = self.prepend(timestamps, values, meta, head)
+            fetched_from = start
+            changed = True
+
+        if not meta["complete"] and (fetched_until is None or fetched_until < fetch_end):
+            if fetched_until is None:
+                fetch_start = start
+                fetched_from = start
+            else:
+                # 缓存最后一天可能只有部分日内数据，从当天重新下载
+                fetch_start = fetched_until
+            new_price = self.data_source.get_price(order_book_id, fetch_start.date(), fetch_end.date(), frequency)
+            timestamps, values, meta = self.append(timestamps, values, meta, new_price)
+            fetched_until = fetch_end
+            changed = True
+
+        if changed:
+            meta["fetched_from"] = str(fetched_from.date())
+            meta["fetched_until"] = str(fetched_until.date())
+            # 退市合约从上市日下载到退市日后，行情不会再改变
+            meta["complete"] = (
+                de_listed is not None and de_listed < today and fetched_until >= de_listed
+                and listed is not None and fetched_from <= listed
+            )
+            self.save(order_book_id, frequency, timestamps, values, meta)
+            timestamps, values, meta = self.load(order_book_id, frequency)
+
+        return timestamps, values, meta
+
+    def prepend(self, timestamps, values, meta: dict, new_price: pd.DataFrame):
+        """
+        将补充下载的、早于缓存起始日期的行情拼接到缓存数组的前面。
+        """
+        if new_price is None or new_price.empty:
+            return timestamps, values, meta
+        if not len(timestamps):
+            return self.append(timestamps, values, meta, new_price)
+
+        new_price = new_price.select_dtypes(include = [np.number])
+        new_timestamps = pd.DatetimeIndex(new_price.index).as_unit("ns").asi8
+        new_values = new_price.reindex(columns = meta["fields"]).to_numpy(dtype = np.float64)
+        # 重叠的时间戳以缓存中的数据为准
+        keep = new_timestamps < np.asarray(timestamps)[0]
+        timestamps = np.concatenate([new_timestamps[keep], np.asarray(timestamps)])
+        values = np.concatenate([new_values[keep], np.asarray(values)])
+        return timestamps, values, meta
+
+    def append(self, timestamps, values, meta: dict, new_price: pd.DataFrame):
+        """
+        将新下载的行情拼接到缓存数组的末尾。
+        """
+        if new_price is None or new_price.empty:
+            return timestamps, values, meta
+
+        new_price = new_price.select_dtypes(include = [np.number])
+        fields = meta["fields"] if meta["fields"] else list(new_price.columns)
+        new_timestamps = pd.DatetimeIndex(new_price.index).as_unit("ns").asi8
+        new_values = new_price.reindex(columns = fields).to_numpy(dtype = np.float64)
+
+        if len(timestamps):
+            # 缓存中已有的时间戳以新下载的数据为准
+            keep = np.asarray(timestamps) < new_timestamps[0]
+            timestamps = np.concatenate([np.asarray(timestamps)[keep], new_timestamps])
+            values = np.concatenate([np.asarray(values)[keep], new_values])
+        else:
+            timestamps = new_timestamps
+            values = new_values
+        meta = dict(meta, fields = fields)
+        return timestamps, values, meta
+
+    def to_frame(self, timestamps, values, fields, start, end, frequency):
+        left, right = time_range_slice(timestamps, start, end)
+        index = pd.DatetimeIndex(np.asarray(timestamps[left:right]).view("datetime64[ns]"))
+        index.name = "date" if frequency == "1d" else "datetime"
+        return pd.DataFrame(np.array(values[left:right]), index = index, columns = fields)
+
+    def get_contracts_price(self, contract_info: pd.DataFrame, frequency: str = "1d", start_date = None, end_date = None) -> pd.DataFrame:
+        """
+        与 SpreadCalculation.download_hist_data 返回格式相同：
+        index 为时间，第一列为 order_book_id，按时间顺序排序。
+        start_date、end_date 为空时使用各合约的上市、退市日期，不为空时也不超出上市、退市日期。
+        """
+        prices = []
+        for _, row in contract_info.iterrows():
+            start, end = contract_date_range(row, start_date, end_date)
+            prices.append(self.get_price(
+                row["order_book_id"],
+                start_date = start,
+                end_date = end,
+                frequency = frequency,
+                de_listed_date = row["de_listed_date"],
+                listed_date = row["listed_date"],
+            ))
+        return stack_contract_prices(contract_info["order_book_id"].to_list(), prices)
+
+
+def stack_contract_prices(order_book_ids: list, prices: list) -> pd.DataFrame:
+    """
+    把各合约的行情拼接成一张表，第一列为 order_book_id，按时间顺序排序，同一时间保持合约的先后顺序。
+    """
+    frames = []
+    for order_book_id, price in zip(order_book_ids, prices):
+        if price is None or price.empty:
+            continue
+        # 浅复制后再加列，并发下载时同一结果可能被多个请求共用
+        price = price.copy(deep = False)
+        price.insert(0, "order_book_id", order_book_id)
+        frames.append(price)
+    if not frames:
+        return pd.DataFrame()
+    contracts_price = pd.concat(frames)
+    contracts_price.sort_index(inplace = True, kind = "stable")
+    return contracts_price
+
+
+def contract_date_range(row, start_date = None, end_date = None):
+    """
+    单个合约需要下载的日期范围：start_date、end_date 截取到合约的上市、退市日期之内，为空时即为上市、退市日期。
+    """
+    listed = parse_date(row["listed_date"])
+    de_listed = parse_date(row["de_listed_date"])
+    start = pd.Timestamp(start_date) if start_date is not None else listed
+    end = pd.Timestamp(end_date) if end_date is not None else de_listed
+    if listed is not None and start is not None:
+        start = max(start, listed)
+    if de_listed is not None and end is not None:
+        end = min(end, de_listed)
+    return start, end
+
+
+def time_range_slice(timestamps, start, end):
+    """
+    返回按时间排序的int64时间戳数组中 [start, end] 的位置范围 (left, right)，end 为日期时包含当天全部日内数据。
+    """
+    start = pd.Timestamp(start)
+    end = pd.Timestamp(end)
+    if end == end.normalize():
+        end = end + pd.Timedelta(days = 1) - pd.Timedelta(1, unit = "ns")
+    left = np.searchsorted(timestamps, start.value, side = "left")
+    right = np.searchsorted(timestamps, end.value, side = "right")
+    return left, right
+
+
+def parse_date(date):
+    """
+    将 "2023-07-03" 这样的日期转换成 Timestamp，"0000-00-00" 和空值返回 None。
+    """
+    if date is None or date == "0000-00-00" or pd.isna(date):
+        return None
+    return pd.Timestamp(date)
@@ -0,0 +1,348 @@
+"""
+不连接vnpy交易接口，在本地回放价差行情驱动 ZscoreGridStrategy。
+
+ReplayStrategyEngine 代替vnpy的策略引擎：记录策略启动、停止的价差算法，
+并在之后的行情上模拟成交（买价差在卖一价不高于委托价时成交，卖价差在买一价不低于委托价时成交），
+也可以用 fill_all 按指定价格全部成交，backtest.replay_strategy_positions 用它逐根K线回放策略。
+行情可以是录制的价差tick，也可以由 synthetic_ticks 生成；回放可以全速进行，也可以按实际时间的倍数进行。
+回放结束后报告每秒处理的tick数量、各策略回调的耗时分布和内存占用，
+capacity_sweep 逐步增加同一进程中的策略数量，找到耗时开始明显上升的位置。
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import LatencyHistogram
+
+
+def max_rss() -> int:
+    """
+    进程的峰值常驻内存（字节），不支持的平台返回0。
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的单位为字节，Linux 为KB
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+class ReplaySpreadData:
+    """
+    只包含策略用到属性的价差对象，每个策略一个，持仓互不影响。
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.datetime = None
+        self.bid_price = 0.0
+        self.ask_price = 0.0
+        self.bid_volume = 0.0
+        self.ask_volume = 0.0
+        self.net_pos = 0.0
+
+    def to_tick(self):
+        from vnpy.trader.constant import Exchange
+        from vnpy.trader.object import TickData
+
+        return TickData(
+            symbol = self.name,
+            exchange = Exchange.LOCAL,
+            datetime = self.datetime,
+            name = self.name,
+            last_price = (self.bid_price + self.ask_price) / 2,
+            bid_price_1 = self.bid_price,
+            ask_price_1 = self.ask_price,
+            bid_volume_1 = self.bid_volume,
+            ask_volume_1 = self.ask_volume,
+            gateway_name = "REPLAY",
+        )
+
+
+class SimulatedAlgo:
+    """
+    模拟的价差算法，属性与vnpy的SpreadAlgoTemplate中策略用到的部分相同。
+    """
+
+    def __init__(self, algoid: str, strategy, direction, price: float, volume: float) -> None:
+        self.algoid = algoid
+        self.strategy = strategy
+        self.direction = direction
+        self.price = price
+        self.volume = volume
+        self.traded = 0.0
+        self.traded_price = 0.0
+        self.active = True
+
+    def is_active(self) -> bool:
+        return self.active
+
+
+class ReplayStrategyEngine:
+    """
+    模拟vnpy策略引擎，calls 按顺序记录策略的 (操作, 策略名称, 方向, 价格, 数量)，trades 记录模拟成交。
+    record_calls 为False时不记录调用明细，只计数，用于测试容量时减少内存占用。
+    """
+
+    def __init__(self, record_calls: bool = True) -> None:
+        self.record_calls = record_calls
+        self.strategies = []
+        self.spreads = []
+        self.algos = {}
+        self.active_algos = []
+        self.algo_count = 0
+        self.calls = []
+        self.trades = []
+        self.counters = {"start_algo": 0, "stop_algo": 0, "fill": 0}
+        self.logs = []
+
+    def add_strategy(self, strategy_class, strategy_name: str, setting: dict = None):
+        spread = ReplaySpreadData(strategy_name)
+        strategy = strategy_class(self, strategy_name, spread, setting or {})
+        self.strategies.append(strategy)
+        self.spreads.append(spread)
+        return strategy
+
+    def init_strategies(self) -> None:
+        for strategy in self.strategies:
+            strategy.on_init()
+            strategy.inited = True
+            strategy.on_start()
+            strategy.trading = True
+
+    # 以下为策略模板调用的引擎接口
+    def start_algo(self, strategy, spread_name, direction, price, volume, payup, interval, lock, extra):
+        self.algo_count += 1
+        algoid = f"REPLAY{self.algo_count}"
+        algo = SimulatedAlgo(algoid, strategy, direction, price, volume)
+        self.algos[algoid] = algo
+        self.active_algos.append(algo)
+        self.counters["start_algo"] += 1
+        if self.record_calls:
+            self.calls.append(("start_algo", strategy.strategy_name, direction.value, price, volume))
+        return algoid
+
+    def stop_algo(self, strategy, algoid):
+        algo = self.algos.get(algoid)
+        if algo is None or not algo.active:
+            return
+        algo.active = False
+        self.active_algos.remove(algo)
+        self.counters["stop_algo"] += 1
+        if self.record_calls:
+            self.calls.append(("stop_algo", strategy.strategy_name, algo.direction.value, algo.price, algo.volume))
+        strategy.update_spread_algo(algo)
+
+    def put_strategy_event(self, strategy):
+        pass
+
+    def write_strategy_log(self, strategy, msg):
+        if self.record_calls:
+            self.logs.append((strategy.strategy_name, msg))
+
+    def load_bar(self, spread, days, interval, callback):
+        pass
+
+    def load_tick(self, spread, days, callback):
+        pass
+
+    def get_engine_type(self):
+        from vnpy.trader.constant import EngineType
+
+        return EngineType.BACKTESTING
+
+    def send_notification(self, msg, strategy):
+        pass
+
+    def match(self, timestamp, bid_price: float, ask_price: float) -> None:
+        """
+        用最新的买一、卖一价撮合仍在运行的价差算法，成交价为对手价，一次全部成交。
+        """
+        from vnpy.trader.constant import Direction
+
+        if not self.active_algos:
+            return
+        for algo in list(self.active_algos):
+            if algo.direction == Direction.LONG:
+                if ask_price <= algo.price:
+                    self.fill(algo, timestamp, ask_price)
+            elif bid_price >= algo.price:
+                self.fill(algo, timestamp, bid_price)
+
+    def fill_all(self, timestamp, price: float) -> None:
+        """
+        不比较委托价，以 price 成交全部仍在运行的价差算法，用于假设在K线收盘价成交的回测。
+        """
+        for algo in list(self.active_algos):
+            self.fill(algo, timestamp, price)
+
+    def fill(self, algo: SimulatedAlgo, timestamp, price: float) -> None:
+        """
+        价差算法以 price 全部成交，更新策略的价差持仓并通知策略。
+        """
+        from vnpy.trader.constant import Direction
+
+        sign = 1 if algo.direction == Direction.LONG else -1
+        algo.traded = algo.volume
+        algo.traded_price = price
+        algo.active = False
+        self.active_algos.remove(algo)
+        self.counters["fill"] += 1
+        self.trades.append((timestamp, algo.strategy.strategy_name, sign * algo.volume, price))
+
+        strategy = algo.strategy
+        strategy.spread.net_pos += sign * algo.volume
+        strategy.update_spread_algo(algo)
+        strategy.on_spread_pos()
+
+
+class ReplayReport:
+    """
+    回放结果：tick数量、策略数量、耗时、每秒处理的tick数量、on_spread_data耗时分布（微秒）和内存占用。
+    peak_memory 为回放期间Python新分配内存的峰值（未开启tracemalloc时为0），max_rss 为进程的峰值常驻内存。
+    """
+
+    def __init__(
+        self,
+        ticks: int,
+        strategies: int,
+        elapsed: float,
+        latency: LatencyHistogram,
+        peak_memory: int,
+        max_rss: int,
+        counters: dict,
+    ) -> None:
+        self.ticks = ticks
+        self.strategies = strategies
+        self.elapsed = elapsed
+        self.latency = latency
+        self.peak_memory = peak_memory
+        self.max_rss = max_rss
+        self.counters = counters
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.elapsed if self.elapsed > 0 else float("inf")
+
+    @property
+    def callbacks_per_second(self) -> float:
+        return self.ticks * self.strategies / self.elapsed if self.elapsed > 0 else float("inf")
+
+    def to_dict(self) -> dict:
+        record = {
+            "ticks": self.ticks,
+            "strategies": self.strategies,
+            "elapsed": self.elapsed,
+            "ticks_per_second": self.ticks_per_second,
+            "callbacks_per_second": self.callbacks_per_second,
+            "peak_memory_mb": self.peak_memory / 1024 / 1024,
+            "max_rss_mb": self.max_rss / 1024 / 1024,
+        }
+        record.update({f"callback_{key}": value for key, value in self.latency.summary().items()})
+        record.update(self.counters)
+        return record
+
+
+def synthetic_ticks(
+    n: int,
+    start = "2023-01-03 09:00:00",
+    freq: str = "500ms",
+    price: float = 100.0,
+    volatility: float = 1.0,
+    tick_size: float = 1.0,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    生成随机游走的价差tick，买卖价差为一个最小变动价位。
+    """
+    rng = np.random.default_rng(seed)
+    mid = price + np.cumsum(rng.normal(0, volatility, n))
+    bid = np.floor(mid / tick_size) * tick_size
+    return pd.DataFrame(
+        {"bid_price": bid, "ask_price": bid + tick_size, "bid_volume": 10.0, "ask_volume": 10.0},
+        index = pd.date_range(start, periods = n, freq = freq),
+    )
+
+
+def replay(engine: ReplayStrategyEngine, ticks: pd.DataFrame, speed: float = None, trace_memory: bool = False) -> ReplayReport:
+    """
+    把tick逐个推送给引擎中的所有策略：先用新价格撮合之前的价差算法，再调用策略的 on_spread_data。
+
+    ticks 的索引为时间，包含 bid_price、ask_price 两列，或只有 price 一列（买卖价相同）。
+    speed 为空时全速回放，否则按实际时间的speed倍回放（如 speed = 10 表示10倍速）。
+    trace_memory 为True时用tracemalloc统计回放期间的峰值内存，回放会慢数倍。
+    """
+    if "price" in ticks and "bid_price" not in ticks:
+        bid = ask = ticks["price"].to_numpy(dtype = np.float64)
+    else:
+        bid = ticks["bid_price"].to_numpy(dtype = np.float64)
+        ask = ticks["ask_price"].to_numpy(dtype = np.float64)
+    bid_volume = ticks["bid_volume"].to_numpy(dtype = np.float64) if "bid_volume" in ticks else np.zeros(len(ticks))
+    ask_volume = ticks["ask_volume"].to_numpy(dtype = np.float64) if "ask_volume" in ticks else np.zeros(len(ticks))
+    # 转换为Python的float和datetime，避免策略中用NumPy标量计算
+    bid, ask, bid_volume, ask_volume = bid.tolist(), ask.tolist(), bid_volume.tolist(), ask_volume.tolist()
+    datetimes = ticks.index.to_pydatetime()
+    offsets = (ticks.index - ticks.index[0]).total_seconds().to_numpy() if len(ticks) else np.zeros(0)
+
+    latency = LatencyHistogram()
+    strategies = list(zip(engine.strategies, engine.spreads))
+    if trace_memory:
+        tracemalloc.start()
+    perf_counter_ns = time.perf_counter_ns
+    start = time.perf_counter()
+
+    for i in range(len(datetimes)):
+        if speed:
+            wait = offsets[i] / speed - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+
+        timestamp = datetimes[i]
+        engine.match(timestamp, bid[i], ask[i])
+        for strategy, spread in strategies:
+            spread.datetime = timestamp
+            spread.bid_price = bid[i]
+            spread.ask_price = ask[i]
+            spread.bid_volume = bid_volume[i]
+            spread.ask_volume = ask_volume[i]
+            callback_start = perf_counter_ns()
+            strategy.on_spread_data()
+            latency.observe(perf_counter_ns() - callback_start)
+
+    elapsed = time.perf_counter() - start
+    peak_memory = 0
+    if trace_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return ReplayReport(len(datetimes), len(strategies), elapsed, latency, peak_memory, max_rss(), dict(engine.counters))
+
+
+def capacity_sweep(
+    strategy_class,
+    ticks: pd.DataFrame,
+    strategy_counts: list = (1, 2, 4, 8, 16, 32, 64),
+    setting_factory = None,
+    latency_budget_us: float = None,
+    trace_memory: bool = False,
+) -> pd.DataFrame:
+    """
+    依次在一个引擎中运行不同数量的策略，返回每个数量下的吞吐量和耗时分布。
+    setting_factory(i) 返回第i个策略的参数，默认所有策略使用默认参数。
+    latency_budget_us 不为空时，回调耗时的p99超过该值后停止增加策略数量。
+    """
+    records = []
+    for count in strategy_counts:
+        engine = ReplayStrategyEngine(record_calls = False)
+        for i in range(count):
+            setting = setting_factory(i) if setting_factory is not None else {}
+            engine.add_strategy(strategy_class, f"replay{i}", setting)
+        engine.init_strategies()
+        records.append(replay(engine, ticks, trace_memory = trace_memory).to_dict())
+        if latency_budget_us is not None and records[-1]["callback_p99_us"] > latency_budget_us:
+            break
+    return pd.DataFrame(records)
@@ -0,0 +1,182 @@
+"""
+滚动统计量。
+
+每来一根K线只更新一次均值和方差，计算量与窗口长度无关：
+    RollingWindowStats 固定窗口的均值、总体标准差，使用Welford算法加入新值、移除最旧的值；
+    EwmaStats 指数加权的均值、标准差。
+两者接口相同，可以在策略中互相替换。
+
+固定窗口在窗口刚填满时以及之后每 recompute_interval 次更新时，用 exact_mean_m2 精确重新计算一次，
+两次重算之间按相同的顺序做相同的浮点运算。rolling_mean_std 用 np.add.accumulate 分段复现这一过程，
+所以策略、信号中心与向量化回测得到的均值、标准差逐位相同，z_score 在整数边界上的取整一致。
+"""
+
+import math
+
+import numpy as np
+
+
+def default_recompute_interval(window: int) -> int:
+    return max(window * 50, 1000)
+
+
+def exact_mean_m2(values) -> tuple:
+    """
+    窗口数据的均值和离差平方和，用 math.fsum 求和，结果与数据的排列顺序无关。
+    """
+    values = np.asarray(values, dtype = np.float64)
+    mean = math.fsum(values.tolist()) / len(values)
+    return mean, math.fsum(((values - mean) ** 2).tolist())
+
+
+class RollingWindowStats:
+    """
+    固定窗口长度的滚动均值和总体标准差，与ArrayManager.sma、std的结果一致。
+    窗口填满时以及之后每更新 recompute_interval 次，用窗口内的数据重新计算一次，消除累计误差。
+    """
+
+    def __init__(self, window: int, recompute_interval: int = None) -> None:
+        self.window = window
+        self.buffer = np.zeros(window)
+        self.position = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.recompute_interval = recompute_interval or default_recompute_interval(window)
+
+    @property
+    def inited(self) -> bool:
+        return self.count >= self.window
+
+    @property
+    def var(self) -> float:
+        n = min(self.count, self.window)
+        return max(self.m2, 0.0) / n if n else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.var)
+
+    def update(self, value: float) -> None:
+        value = float(value)
+        oldest = float(self.buffer[self.position])
+        self.buffer[self.position] = value
+        self.position = (self.position + 1) % self.window
+        self.count += 1
+
+        if self.count < self.window:
+            # 窗口未满时只加入新值
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        elif (self.count - self.window) % self.recompute_interval == 0:
+            self.recompute()
+        else:
+            # 窗口已满时用新值替换最旧的值，运算顺序与 rolling_mean_std 相同
+            old_mean = self.mean
+            self.mean = old_mean + (value - oldest) / self.window
+            self.m2 += (value - oldest) * (value - self.mean + oldest - old_mean)
+
+    def recompute(self) -> None:
+        self.mean, self.m2 = exact_mean_m2(self.buffer)
+
+    def zscore(self, value: float) -> float:
+        std = self.std
+        return (value - self.mean) / std if std > 0 else 0.0
+
+
+def segmented_accumulate(values: np.ndarray, segment: int) -> np.ndarray:
+    """
+    每 segment 个元素为一段分别累加，每段从该段第一个元素开始（与逐个相加的浮点结果相同）。
+    """
+    n = len(values)
+    rows = -(-n // segment)
+    padded = np.zeros(rows * segment)
+    padded[:n] = values
+    return np.add.accumulate(padded.reshape(rows, segment), axis = 1).ravel()[:n]
+
+
+def rolling_mean_std(close: np.ndarray, window: int, recompute_interval: int = None):
+    """
+    计算滚动均值和总体标准差（与ArrayManager.sma、std一致），前window-1个位置为空值。
+    结果与逐个 RollingWindowStats.update 后的 mean、std 逐位相同。
+    """
+    close = np.asarray(close, dtype = np.float64)
+    n = len(close)
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    if n < window:
+        return mean, std
+
+    interval = recompute_interval or default_recompute_interval(window)
+    # 第k行对应第 window - 1 + k 根K线，每段第一行为精确重算的结果
+    value = close[window:]
+    oldest = close[:n - window]
+    starts = np.arange(0, n - window + 1, interval)
+    windows = np.lib.stride_tricks.sliding_window_view(close, window)
+    exact = np.array([exact_mean_m2(windows[k]) for k in starts])
+
+    steps = np.empty(n - window + 1)
+    steps[1:] = (value - oldest) / window
+    steps[starts] = exact[:, 0]
+    means = segmented_accumulate(steps, interval)
+
+    steps[1:] = (value - oldest) * (value - means[1:] + oldest - means[:-1])
+    steps[starts] = exact[:, 1]
+    m2 = segmented_accumulate(steps, interval)
+
+    mean[window - 1:] = means
+    std[window - 1:] = np.sqrt(np.maximum(m2, 0.0) / window)
+    return mean, std
+
+
+class EwmaStats:
+    """
+    指数加权均值和标准差，alpha = 2 / (span + 1)，与 pandas ewm(span = ..., adjust = False) 的递推相同，
+    方差为对应的指数加权总体方差，更新次数达到span之后视为初始化完成。
+    """
+
+    def __init__(self, span: int) -> None:
+        self.window = span
+        self.alpha = 2.0 / (span + 1.0)
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    @property
+    def inited(self) -> bool:
+        return self.count >= self.window
+
+    @property
+    def var(self) -> float:
+        return self.variance
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def update(self, value: float) -> None:
+        value = float(value)
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            self.variance = 0.0
+            return
+        delta = value - self.mean
+        self.mean += self.alpha * delta
+        self.variance = (1.0 - self.alpha) * (self.variance + self.alpha * delta * delta)
+
+    def zscore(self, value: float) -> float:
+        std = self.std
+        return (value - self.mean) / std if std > 0 else 0.0
+
+
+def create_stats(mode: str, window: int):
+    """
+    mode 为 "sma" 时使用固定窗口，为 "ewma" 时使用指数加权。
+    """
+    if mode == "ewma":
+        return EwmaStats(window)
+    if mode == "sma":
+        return RollingWindowStats(window)
+    raise ValueError(f"不支持的z_score计算方式: {mode}")
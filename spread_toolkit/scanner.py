@@ -0,0 +1,178 @@
+"""
+批量价差扫描。
+
+一次传入大量价差公式（例如所有品种的全部跨期组合），
+合并各公式用到的合约，每个合约只下载一次，
+再把所有价差放在同一张按时间对齐的宽表中计算，最后输出每个价差的统计汇总表。
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from .continuous import build_continuous, roll_schedule
+from .formula import compile_formula
+from .instrument_catalog import InstrumentCatalog
+from .price_cache import PriceCache, stack_contract_prices
+from .streaming import price_field_for
+
+
+class SpreadScanner:
+    """
+    formulas 为价差公式列表，如 ["MA09 - MA01", "RB10*1.6 - I09 - J09*0.5"]。
+    seasonal_window 为计算季节性均值时，往年同一日期前后各取的天数。
+    roll_reference、roll_days_before、back_adjust 为各条腿的换月和复权方式，与 SpreadCalculation 的参数相同。
+    """
+
+    def __init__(
+        self,
+        formulas: list,
+        catalog: InstrumentCatalog,
+        price_cache: PriceCache,
+        years_trace_back: int,
+        frequency: str = "1d",
+        seasonal_window: int = 5,
+        roll_reference: str = "de_listed_date",
+        roll_days_before: int = 0,
+        back_adjust: str = None,
+    ) -> None:
+        self.formulas = list(dict.fromkeys(formulas))
+        self.compiled_formulas = [compile_formula(formula) for formula in self.formulas]
+        self.catalog = catalog
+        self.price_cache = price_cache
+        self.years_trace_back = years_trace_back
+        self.frequency = frequency
+        self.seasonal_window = seasonal_window
+        self.roll_reference = roll_reference
+        self.roll_days_before = roll_days_before
+        self.back_adjust = back_adjust
+
+        # 所有公式用到的合约代码（如MA09），去重后按首次出现的顺序排列
+        self.legs = list(dict.fromkeys(itertools.chain.from_iterable(f.dependencies for f in self.compiled_formulas)))
+        self.contract_prices = {}
+        self.leg_prices = pd.DataFrame()
+        self.spreads = pd.DataFrame()
+
+    def download_legs(self):
+        """
+        下载所有合约的行情，每个合约只下载一次，各条腿按换月计划拼接成连续序列（continuous 模块），
+        再合并成每个合约代码一列的宽表。
+        """
+        field = price_field_for(self.frequency)
+        leg_series = {}
+        for leg in self.legs:
+            contract_info = self.catalog.lookup(leg, self.years_trace_back)
+            for _, row in contract_info.iterrows():
+                order_book_id = row["order_book_id"]
+                if order_book_id not in self.contract_prices:
+                    self.contract_prices[order_book_id] = self.price_cache.get_price(
+                        order_book_id,
+                        start_date = row["listed_date"],
+                        end_date = row["de_listed_date"],
+                        frequency = self.frequency,
+                        de_listed_date = row["de_listed_date"],
+                        listed_date = row["listed_date"],
+                    )
+            order_book_ids = contract_info["order_book_id"].to_list()
+            contracts_price = stack_contract_prices(order_book_ids, [self.contract_prices[i] for i in order_book_ids])
+            schedule = roll_schedule(contract_info, self.roll_days_before, self.roll_reference)
+            leg_series[leg] = build_continuous(contracts_price, schedule, field, self.back_adjust).to_series()
+
+        self.leg_prices = pd.DataFrame(leg_series).sort_index()
+        return self.leg_prices
+
+    def calculate_spreads(self):
+        """
+        在对齐好的价格矩阵上计算所有价差，返回时间为行、公式为列的宽表。
+        线性公式合并成一个权重矩阵，一次矩阵乘法算出全部结果。
+        """
+        if self.leg_prices.empty:
+            self.download_legs()
+
+        matrix = self.leg_prices.to_numpy(dtype = np.float64)
+        missing = np.isnan(matrix)
+        filled = np.where(missing, 0.0, matrix)
+        leg_position = {leg: i for i, leg in enumerate(self.legs)}
+
+        spreads = np.full((len(matrix), len(self.formulas)), np.nan)
+        linear_columns = [i for i, f in enumerate(self.compiled_formulas) if f.linear_weights is not None]
+        if linear_columns:
+            weights = np.zeros((len(self.legs), len(linear_columns)))
+            constants = np.zeros(len(linear_columns))
+            used = np.zeros_like(weights)
+            for column, i in enumerate(linear_columns):
+                compiled_formula = self.compiled_formulas[i]
+                for leg in compiled_formula.dependencies:
+                    weights[leg_position[leg], column] = compiled_formula.linear_weights[leg]
+                    used[leg_position[leg], column] = 1.0
+                constants[column] = compiled_formula.constant
+            values = filled @ weights + constants
+            # 公式用到的任意一条腿缺失时，价差为空值
+            values[(missing.astype(np.float64) @ used) > 0] = np.nan
+            spreads[:, linear_columns] = values
+
+        for i, compiled_formula in enumerate(self.compiled_formulas):
+            if compiled_formula.linear_weights is None:
+                columns = [leg_position[leg] for leg in compiled_formula.dependencies]
+                spreads[:, i] = compiled_formula.evaluate_matrix(matrix[:, columns])
+
+        self.spreads = pd.DataFrame(spreads, index = self.leg_prices.index, columns = self.formulas)
+        return self.spreads
+
+    def run(self) -> pd.DataFrame:
+        """
+        返回每个价差的统计汇总表：
+        current 最新价差，percentile 最新价差在历史中的百分位，
+        zscore 最新价差相对历史均值的标准分，seasonal_mean 往年同期的平均价差。
+        """
+        self.calculate_spreads()
+        records = [self.summarize(formula, self.spreads[formula]) for formula in self.formulas]
+        return pd.DataFrame(records)
+
+    def summarize(self, formula: str, spread: pd.Series) -> dict:
+        spread = spread.dropna()
+        record = {"formula": formula, "n_obs": len(spread)}
+        if spread.empty:
+            return record
+
+        values = spread.to_numpy()
+        current = values[-1]
+        last_date = spread.index[-1]
+        std = values.std()
+        record.update(
+            last_date = last_date,
+            current = current,
+            percentile = 100.0 * np.count_nonzero(values <= current) / len(values),
+            mean = values.mean(),
+            std = std,
+            zscore = (current - values.mean()) / std if std > 0 else np.nan,
+        )
+
+        # 往年同一日期前后seasonal_window天内的价差均值，跨年时按一年366天回绕
+        index = pd.DatetimeIndex(spread.index)
+        distance = np.abs(index.dayofyear.to_numpy() - last_date.dayofyear)
+        distance = np.minimum(distance, 366 - distance)
+        mask = (index.year.to_numpy() < last_date.year) & (distance <= self.seasonal_window)
+        record["seasonal_mean"] = values[mask].mean() if mask.any() else np.nan
+        return record
+
+
+def calendar_formulas(catalog: InstrumentCatalog, underlying_symbols: list = None, min_maturity_date: str = None) -> list:
+    """
+    生成每个品种所有合约月份两两组合的跨期价差公式，如"MA01 - MA05"。
+    min_maturity_date 不为空时，只使用在该日期之后仍有合约到期的月份。
+    """
+    contracts = catalog.contracts
+    if min_maturity_date is not None:
+        contracts = contracts[pd.to_datetime(contracts["maturity_date"]) >= pd.Timestamp(min_maturity_date)]
+    if underlying_symbols is None:
+        underlying_symbols = list(dict.fromkeys(contracts["underlying_symbol"]))
+
+    formulas = []
+    for underlying_symbol in underlying_symbols:
+        months = sorted(contracts.loc[contracts["underlying_symbol"] == underlying_symbol, "maturity_date_month"].unique())
+        for month1, month2 in itertools.combinations(months, 2):
+            formulas.append(f"{underlying_symbol}{month1} - {underlying_symbol}{month2}")
+    return formulas
+
@@ -0,0 +1,116 @@
+"""
+季节图数据。
+
+把价差序列整理成 (日期位置 × 年份) 的矩阵，用于绘制季节图、比较历年同期价差。
+日期与矩阵行号的对应关系用整数运算完成，一次性填入预先分配好的数组。
+
+按月日对齐时，行号为闰年日历中的位置："01-01"为0，"02-29"固定为59，"12-31"为365，
+非闰年没有2月29日，该行为空值。
+按到期日对齐时，行号为距离合约到期的交易日天数。
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# 闰年每个月1日之前的天数
+LEAP_YEAR_MONTH_OFFSET = np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])
+
+MONTHDAY_INDEX = pd.date_range(start = "2000-01-01", end = "2000-12-31", freq = "D").strftime("%m-%d")
+
+
+def monthday_slot(timestamps: np.ndarray) -> np.ndarray:
+    """
+    将int64纳秒时间戳转换成闰年日历中的位置。
+    """
+    dates = np.asarray(timestamps).view("datetime64[ns]")
+    month_start = dates.astype("datetime64[M]")
+    months = month_start.astype(np.int64) % 12
+    days = (dates.astype("datetime64[D]") - month_start.astype("datetime64[D]")).astype(np.int64)
+    return LEAP_YEAR_MONTH_OFFSET[months] + days
+
+
+def last_in_group(*keys) -> np.ndarray:
+    """
+    数据按时间排序时，返回每组 (keys相同的连续行) 最后一行的筛选器。
+    日内数据同一天有多行，季节图中只保留当天最后一个价格。
+    """
+    n = len(keys[0])
+    last = np.ones(n, dtype = bool)
+    if n > 1:
+        changed = np.zeros(n - 1, dtype = bool)
+        for key in keys:
+            changed |= key[1:] != key[:-1]
+        last[:-1] = changed
+    return last
+
+
+def seasonal_matrix(spread: pd.Series):
+    """
+    返回 (366 × 年份数) 的季节矩阵和对应的年份数组。
+    """
+    spread = spread.sort_index()
+    index = pd.DatetimeIndex(spread.index)
+    values = spread.to_numpy(dtype = np.float64)
+    year = index.year.to_numpy()
+    slot = monthday_slot(index.as_unit("ns").asi8)
+
+    years, column = np.unique(year, return_inverse = True)
+    matrix = np.full((len(MONTHDAY_INDEX), len(years)), np.nan)
+    keep = last_in_group(year, slot)
+    matrix[slot[keep], column[keep]] = values[keep]
+    return matrix, years
+
+
+def seasonal_frame(spread: pd.Series) -> pd.DataFrame:
+    """
+    与原先 split_by_year 的结果格式相同：行为"01-01"到"12-31"，列为年份。
+    """
+    matrix, years = seasonal_matrix(spread)
+    return pd.DataFrame(matrix, index = MONTHDAY_INDEX, columns = years)
+
+
+def trading_days_to_expiry(index: pd.DatetimeIndex, expiry) -> np.ndarray:
+    """
+    计算每个时间戳距离到期日的交易日天数。
+    交易日历取序列本身出现过的日期；同一到期日的最后一个时间戳之后到到期日之间没有数据时
+    （提前换月，或合约仍在交易），这段时间按工作日补足。
+    """
+    dates = pd.DatetimeIndex(index).normalize().as_unit("ns").asi8
+    expiry = pd.DatetimeIndex(expiry).normalize().as_unit("ns").asi8
+    expiries, group = np.unique(expiry, return_inverse = True)
+    last = np.full(len(expiries), np.iinfo(np.int64).min)
+    np.maximum.at(last, group, dates)
+
+    calendar = [dates]
+    for last_day, expiry_day in zip(last.view("datetime64[ns]").astype("datetime64[D]"), expiries.view("datetime64[ns]").astype("datetime64[D]")):
+        if expiry_day > last_day:
+            days = np.arange(last_day + 1, expiry_day + 1)
+            calendar.append(days[np.is_busday(days)].astype("datetime64[ns]").astype(np.int64))
+    calendar = np.unique(np.concatenate(calendar))
+    return np.searchsorted(calendar, expiry, side = "left") - np.searchsorted(calendar, dates, side = "left")
+
+
+def expiry_seasonal_frame(spread: pd.Series, expiry, max_days: int = 250) -> pd.DataFrame:
+    """
+    按距离到期日的交易日天数对齐的季节图数据。
+    expiry 为每个时间戳所对应合约的到期日，与spread等长；
+    行为距离到期日的天数（从max_days到0），列为到期日。
+    """
+    order = np.argsort(pd.DatetimeIndex(spread.index).as_unit("ns").asi8, kind = "stable")
+    spread = spread.iloc[order]
+    expiry = pd.DatetimeIndex(expiry)[order]
+    values = spread.to_numpy(dtype = np.float64)
+
+    days = trading_days_to_expiry(spread.index, expiry)
+    expiries, column = np.unique(expiry.as_unit("ns").asi8, return_inverse = True)
+    keep = last_in_group(column, days) & (days >= 0) & (days <= max_days)
+
+    matrix = np.full((max_days + 1, len(expiries)), np.nan)
+    # 第0行对应max_days，最后一行对应到期当天
+    matrix[max_days - days[keep], column[keep]] = values[keep]
+    return pd.DataFrame(
+        matrix,
+        index = pd.Index(np.arange(max_days, -1, -1), name = "days_to_expiry"),
+        columns = pd.DatetimeIndex(expiries.view("datetime64[ns]")).date,
+    )
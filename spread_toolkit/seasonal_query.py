@@ -0,0 +1,185 @@
+"""
+季节矩阵上的查询。
+
+plot_spread_with_monthday 只画出历年同期的价差曲线，需要逐张图比较。这里把季节矩阵按时间顺序展开，
+预先计算每个 (年份, 日期位置) 前后 window 天内价差的有序数组，查询时只需几次数组比较：
+    percentile：当前价差在过去N年同期（前后window天）价差中的百分位；
+    quantiles：过去N年同期价差的分位数，按 (年份, N, 分位点) 缓存整张 366 × 分位点 的表；
+    drawdown：过去N年从同一日期开始持有到窗口结束（如交割前）期间的最大回撤。
+跨年的窗口（如12月底到1月初）按实际日期连续计算。rank_seasonal 对大量价差一次排序。
+"""
+
+import numpy as np
+import pandas as pd
+
+from .seasonal import MONTHDAY_INDEX, monthday_slot, seasonal_matrix
+
+
+DAYS_PER_YEAR = len(MONTHDAY_INDEX)
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def slot_of(date) -> int:
+    """
+    日期在闰年日历中的位置，如 "03-01" 为60；也可以直接传入 "MM-DD" 字符串。
+    """
+    if isinstance(date, str) and len(date) == 5:
+        date = f"2000-{date}"
+    return int(monthday_slot(np.array([pd.Timestamp(date).value]))[0])
+
+
+class SeasonalIndex:
+    """
+    matrix 为 seasonal_matrix 返回的 (366 × 年份数) 季节矩阵，years 为对应的年份，window 为前后各取的天数。
+    年份不连续时中间缺失的年份补为空列，保证展开后的序列按时间连续。
+    """
+
+    def __init__(self, matrix: np.ndarray, years, window: int = 5) -> None:
+        years = np.asarray(years, dtype = np.int64)
+        self.window = window
+        self.first_year = int(years.min()) if len(years) else 0
+        self.year_count = int(years.max()) - self.first_year + 1 if len(years) else 0
+        full = np.full((DAYS_PER_YEAR, self.year_count), np.nan)
+        if len(years):
+            full[:, years - self.first_year] = np.asarray(matrix, dtype = np.float64)
+        self.matrix = full
+        # 按时间顺序展开：第y年第s天位于 y * 366 + s
+        self.flat = full.T.ravel()
+
+        padded = np.concatenate([np.full(window, np.nan), self.flat, np.full(window, np.nan)])
+        windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * window + 1)
+        # 空值排在每个窗口的最后，counts 为窗口内有效价差的数量
+        self.sorted_windows = np.sort(windows, axis = 1).reshape(self.year_count, DAYS_PER_YEAR, 2 * window + 1)
+        self.counts = (~np.isnan(self.sorted_windows)).sum(axis = 2)
+        self.quantile_tables = {}
+
+    @classmethod
+    def from_spread(cls, spread: pd.Series, window: int = 5) -> "SeasonalIndex":
+        matrix, years = seasonal_matrix(spread)
+        return cls(matrix, years, window)
+
+    def prior_columns(self, year: int, years: int) -> slice:
+        """
+        year 之前 years 年（不含 year）在矩阵中的列范围。
+        """
+        end = min(max(year - self.first_year, 0), self.year_count)
+        return slice(max(end - years, 0), end)
+
+    def percentile(self, value: float, date, years: int = 5) -> float:
+        """
+        value 在 date 之前 years 年、同一日期前后 window 天内价差中的百分位（0到100），即不大于value的比例。
+        """
+        slot = slot_of(date)
+        columns = self.prior_columns(pd.Timestamp(date).year, years)
+        total = self.counts[columns, slot].sum()
+        if total == 0 or np.isnan(value):
+            return np.nan
+        # 每年的窗口已排序（空值在最后），二分查找不大于value的数量
+        below = sum(int(np.searchsorted(window, value, side = "right")) for window in self.sorted_windows[columns, slot])
+        return 100.0 * float(below) / float(total)
+
+    def sample(self, date, years: int = 5) -> np.ndarray:
+        """
+        date 之前 years 年同期（前后 window 天）的全部价差。
+        """
+        values = self.sorted_windows[self.prior_columns(pd.Timestamp(date).year, years), slot_of(date)].ravel()
+        return values[~np.isnan(values)]
+
+    def quantile_table(self, year: int, years: int = 5, quantiles = DEFAULT_QUANTILES) -> np.ndarray:
+        """
+        year 之前 years 年每个日期位置同期价差的分位数，(366 × 分位点数量)，计算一次后缓存。
+        """
+        key = (year, years, tuple(quantiles))
+        if key not in self.quantile_tables:
+            samples = self.sorted_windows[self.prior_columns(year, years)].transpose(1, 0, 2).reshape(DAYS_PER_YEAR, -1)
+            table = np.full((DAYS_PER_YEAR, len(quantiles)), np.nan)
+            valid = ~np.isnan(samples).all(axis = 1)
+            if valid.any():
+                table[valid] = np.nanquantile(samples[valid], quantiles, axis = 1).T
+            self.quantile_tables[key] = table
+        return self.quantile_tables[key]
+
+    def quantiles(self, date, years: int = 5, quantiles = DEFAULT_QUANTILES) -> dict:
+        table = self.quantile_table(pd.Timestamp(date).year, years, quantiles)
+        return dict(zip(quantiles, table[slot_of(date)].tolist()))
+
+    def drawdown(self, date, end, years: int = 5, direction: str = "long") -> np.ndarray:
+        """
+        过去 years 年中，每年从 date 的同一日期开始持有价差到 end 的同一日期（不早于date，跨年时到下一年），
+        期间的最大回撤：做多为之前最高点减去当前价差的最大值，做空为当前价差减去之前最低点的最大值。
+        返回每年一个值，没有数据的年份为空值。
+        """
+        start_slot = slot_of(date)
+        end_slot = slot_of(end)
+        length = (end_slot - start_slot) % DAYS_PER_YEAR + 1
+        columns = self.prior_columns(pd.Timestamp(date).year, years)
+        column_index = np.arange(columns.start, columns.stop)
+        if len(column_index) == 0:
+            return np.zeros(0)
+
+        positions = column_index[:, None] * DAYS_PER_YEAR + start_slot + np.arange(length)
+        paths = np.full(positions.shape, np.nan)
+        inside = positions < len(self.flat)
+        paths[inside] = self.flat[positions[inside]]
+        if direction == "short":
+            paths = -paths
+        elif direction != "long":
+            raise ValueError(f"不支持的方向: {direction}")
+
+        # 空值（周末、节假日）不影响之前的最高点
+        peak = np.fmax.accumulate(paths, axis = 1)
+        losses = peak - paths
+        result = np.full(len(column_index), np.nan)
+        has_data = ~np.isnan(losses).all(axis = 1)
+        result[has_data] = np.nanmax(losses[has_data], axis = 1)
+        return result
+
+    def query(self, value: float, date, years: int = 5, end = None, direction: str = "long", quantiles = DEFAULT_QUANTILES) -> dict:
+        """
+        一次返回百分位、分位数以及（end 不为空时）持有到 end 期间历年最大回撤的最大值和中位数。
+        """
+        record = {
+            "value": value,
+            "percentile": self.percentile(value, date, years),
+            "n_obs": int(self.counts[self.prior_columns(pd.Timestamp(date).year, years), slot_of(date)].sum()),
+        }
+        record.update({f"q{int(round(q * 100))}": v for q, v in self.quantiles(date, years, quantiles).items()})
+        if end is not None:
+            drawdowns = self.drawdown(date, end, years, direction)
+            valid = drawdowns[~np.isnan(drawdowns)]
+            record.update(
+                max_drawdown = float(valid.max()) if len(valid) else np.nan,
+                median_drawdown = float(np.median(valid)) if len(valid) else np.nan,
+            )
+        return record
+
+
+def rank_seasonal(
+    spreads: dict,
+    years: int = 5,
+    window: int = 5,
+    date = None,
+    end = None,
+    direction: str = "long",
+) -> pd.DataFrame:
+    """
+    spreads 为 {名称: 价差序列}，对每个价差查询最新价差（或 date 当天之前最后一个价差）在过去N年同期的百分位，
+    返回按百分位从低到高排序的表格；最新价差越接近0或100，与往年同期相比越极端。
+    end 不为空时同时给出持有到 end 的历年最大回撤。
+    """
+    records = []
+    for name, spread in spreads.items():
+        spread = spread.dropna().sort_index()
+        if date is not None:
+            spread = spread.loc[:pd.Timestamp(date)]
+        if spread.empty:
+            continue
+        index = SeasonalIndex.from_spread(spread, window)
+        last_date = spread.index[-1]
+        record = {"name": name, "date": last_date}
+        record.update(index.query(float(spread.iloc[-1]), last_date, years, end, direction))
+        records.append(record)
+    if not records:
+        return pd.DataFrame()
+    return pd.DataFrame(records).sort_values("percentile", kind = "stable").reset_index(drop = True)
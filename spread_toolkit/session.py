@@ -0,0 +1,30 @@
+"""
+rqdatac 会话管理。
+
+导入代码库时不连接数据服务，只有真正需要下载数据时才导入、初始化 rqdatac，
+离线计算（本地缓存、本地数据源）不需要网络和账号。
+"""
+
+rqdata_initialized = False
+
+
+def init_rqdata(*args, **kwargs) -> None:
+    """
+    显式初始化 rqdatac，参数与 rqdatac.init 相同，如 init_rqdata(username, password)。
+    """
+    global rqdata_initialized
+    import rqdatac
+
+    rqdatac.init(*args, **kwargs)
+    rqdata_initialized = True
+
+
+def ensure_rqdata():
+    """
+    返回 rqdatac 模块，尚未初始化时使用默认配置（环境变量或本地license）初始化。
+    """
+    import rqdatac
+
+    if not rqdata_initialized:
+        init_rqdata()
+    return rqdatac
@@ -0,0 +1,184 @@
+"""
+多个策略共用的价差信号中心。
+
+同一个价差上运行多个 ZscoreGridStrategy（例如不同的 ma_window）时，
+每个价差只合成一次K线、只保存一个环形缓存，所有订阅窗口的均值和离差平方和
+在每根K线上用一次向量化运算同时更新，再分发给各个策略。
+内存和计算量只与价差数量、不同窗口的数量有关，与策略实例数量无关。
+
+每个窗口的更新与 rolling.RollingWindowStats 做相同的浮点运算、在相同的位置精确重算，
+均值、标准差与策略不使用信号中心时逐位相同。
+"""
+
+import numpy as np
+
+from .rolling import default_recompute_interval, exact_mean_m2
+
+
+class SpreadSignalState:
+    """
+    单个价差的环形缓存和各订阅窗口的均值、离差平方和。
+    counts 为每个窗口已计入的数据数量，窗口填满时及之后每 intervals 次更新精确重算一次。
+    """
+
+    def __init__(self) -> None:
+        self.capacity = 0
+        self.ring = np.zeros(0)
+        self.position = 0
+        self.count = 0
+        # 环形缓存中有效数据的数量
+        self.stored = 0
+
+        self.windows = np.zeros(0, dtype = np.int64)
+        self.intervals = np.zeros(0, dtype = np.int64)
+        self.counts = np.zeros(0, dtype = np.int64)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.std = np.zeros(0)
+        self.subscribers = []
+
+        self.bar_generator = None
+        self.last_tick = None
+        # 当前这次价差更新中已经转发过tick的来源
+        self.round_sources = set()
+        # 正在处理的tick到达的时间（time.perf_counter_ns()），处理历史K线时为None
+        self.tick_ns = None
+        self.last_bar_datetime = None
+
+    def recent_values(self, n: int) -> np.ndarray:
+        """
+        返回缓存中最近n个值，按时间顺序排列。
+        """
+        n = min(n, self.stored)
+        if n == 0:
+            return np.zeros(0)
+        index = (self.position - n + np.arange(n)) % self.capacity
+        return self.ring[index]
+
+    def add_window(self, window: int) -> int:
+        """
+        加入新的订阅窗口，返回该窗口在数组中的位置。
+        """
+        existing = np.flatnonzero(self.windows == window)
+        if len(existing):
+            return int(existing[0])
+
+        if window > self.capacity:
+            # 扩大环形缓存，保留已有的数据
+            values = self.recent_values(self.capacity)
+            self.ring = np.zeros(window)
+            self.ring[:len(values)] = values
+            self.capacity = window
+            self.position = len(values) % self.capacity
+            self.stored = len(values)
+
+        # 用缓存中已有的数据初始化新窗口
+        values = self.recent_values(window)
+        mean, m2 = exact_mean_m2(values) if len(values) else (0.0, 0.0)
+        self.windows = np.append(self.windows, window)
+        self.intervals = np.append(self.intervals, default_recompute_interval(window))
+        self.counts = np.append(self.counts, len(values))
+        self.mean = np.append(self.mean, mean)
+        self.m2 = np.append(self.m2, m2)
+        self.std = np.append(self.std, np.sqrt(max(m2, 0.0) / len(values)) if len(values) else 0.0)
+        return len(self.windows) - 1
+
+    def update(self, value: float) -> None:
+        value = float(value)
+        # 每个窗口最旧的值，窗口未满时不使用
+        oldest = self.ring[(self.position - self.windows) % self.capacity]
+        self.ring[self.position] = value
+        self.position = (self.position + 1) % self.capacity
+        self.count += 1
+        self.stored = min(self.stored + 1, self.capacity)
+
+        counts = self.counts + 1
+        filling = counts < self.windows
+        old_mean = self.mean
+        delta = value - old_mean
+        change = value - oldest
+        mean = np.where(filling, old_mean + delta / counts, old_mean + change / self.windows)
+        self.m2 = self.m2 + np.where(filling, delta * (value - mean), change * (value - mean + oldest - old_mean))
+        self.mean = mean
+        self.counts = counts
+
+        for i in np.flatnonzero(~filling & ((counts - self.windows) % self.intervals == 0)):
+            self.mean[i], self.m2[i] = exact_mean_m2(self.recent_values(int(self.windows[i])))
+        self.std = np.sqrt(np.maximum(self.m2, 0.0) / np.minimum(counts, self.windows))
+
+
+class SpreadSignalHub:
+    """
+    bar_generator_factory 为生成K线合成器的函数，参数为收到K线时的回调函数，
+    默认使用vnpy的BarGenerator。
+    """
+
+    def __init__(self, bar_generator_factory = None) -> None:
+        self.bar_generator_factory = bar_generator_factory
+        self.states = {}
+
+    def get_state(self, spread_name: str) -> SpreadSignalState:
+        if spread_name not in self.states:
+            self.states[spread_name] = SpreadSignalState()
+        return self.states[spread_name]
+
+    def subscribe(self, spread_name: str, window: int, callback) -> None:
+        """
+        订阅某个价差、某个窗口的信号，每根K线调用 callback(bar, ma_value, std, tick_ns)，
+        tick_ns 为合成出这根K线的tick到达的时间，历史K线为None。
+        """
+        state = self.get_state(spread_name)
+        index = state.add_window(window)
+        state.subscribers.append((index, callback))
+
+    def unsubscribe(self, spread_name: str, callback, source = None) -> None:
+        state = self.get_state(spread_name)
+        state.subscribers = [(index, func) for index, func in state.subscribers if func != callback]
+        state.round_sources.discard(source)
+
+    def update_tick(self, spread_name: str, tick, source = None, tick_ns: int = None) -> None:
+        """
+        同一价差的多个策略会各自转发同一次价差更新，同一个tick对象只处理一次。
+        source 为转发tick的策略：同一次更新中只处理第一个来源的tick，
+        某个来源再次转发说明价差已经更新，开始新的一轮，不比较tick的时间和价格。
+        tick_ns 为策略收到tick的时间（time.perf_counter_ns()），随K线传给订阅的策略。
+        """
+        state = self.get_state(spread_name)
+        if tick is state.last_tick:
+            return
+        if source is not None:
+            if state.round_sources and source not in state.round_sources:
+                state.round_sources.add(source)
+                return
+            state.round_sources = {source}
+        state.last_tick = tick
+
+        if state.bar_generator is None:
+            state.bar_generator = self.create_bar_generator(lambda bar: self.update_bar(spread_name, bar))
+        state.tick_ns = tick_ns
+        try:
+            state.bar_generator.update_tick(tick)
+        finally:
+            state.tick_ns = None
+
+    def create_bar_generator(self, on_bar):
+        if self.bar_generator_factory is not None:
+            return self.bar_generator_factory(on_bar)
+        from vnpy.trader.utility import BarGenerator
+
+        return BarGenerator(on_bar)
+
+    def update_bar(self, spread_name: str, bar) -> None:
+        """
+        更新价差的滚动统计量并分发给订阅的策略，重复的K线（如多个策略加载同一段历史数据）只处理一次。
+        """
+        state = self.get_state(spread_name)
+        if state.last_bar_datetime is not None and bar.datetime <= state.last_bar_datetime:
+            return
+        state.last_bar_datetime = bar.datetime
+        if state.capacity == 0:
+            return
+
+        state.update(bar.close_price)
+        for index, callback in state.subscribers:
+            callback(bar, float(state.mean[index]), float(state.std[index]), state.tick_ns)
@@ -0,0 +1,224 @@
+"""
+价差结果的本地存储和增量更新。
+
+每个价差公式（连同影响结果的参数）保存一份计算结果：价差序列、季节矩阵和汇总统计量，
+记录最后一个时间戳作为水位线。下次运行时只需计算水位线之后的新数据并追加：
+    价差序列直接拼接到末尾；
+    季节矩阵只重新计算新数据所在年份的列；
+    均值、标准差用累计和更新，分位数用有序数组二分插入更新。
+目录结构与 PriceCache 相同，每个价差一个目录，数组保存为 .npy，其余信息保存在 meta.json。
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .seasonal import MONTHDAY_INDEX, seasonal_matrix
+
+
+class SpreadStats:
+    """
+    全部历史价差的汇总统计量。sorted_values 为排好序的全部价差，用于计算分位数；
+    均值、方差用减去第一个价差后的累计和计算，减少大数相减带来的误差。
+    """
+
+    def __init__(self, sorted_values: np.ndarray = None, total: float = 0.0, total_sq: float = 0.0, base: float = None) -> None:
+        self.sorted_values = sorted_values if sorted_values is not None else np.zeros(0)
+        self.total = total
+        self.total_sq = total_sq
+        self.base = base
+
+    @property
+    def count(self) -> int:
+        return len(self.sorted_values)
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return np.nan
+        return self.base + self.total / self.count
+
+    @property
+    def std(self) -> float:
+        if self.count == 0:
+            return np.nan
+        shifted_mean = self.total / self.count
+        return float(np.sqrt(max(self.total_sq / self.count - shifted_mean * shifted_mean, 0.0)))
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype = np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        if self.base is None:
+            self.base = float(values[0])
+        shifted = values - self.base
+        self.total += float(shifted.sum())
+        self.total_sq += float((shifted * shifted).sum())
+        new_values = np.sort(values)
+        self.sorted_values = np.insert(self.sorted_values, np.searchsorted(self.sorted_values, new_values), new_values)
+
+    def zscore(self, value: float) -> float:
+        std = self.std
+        return (value - self.mean) / std if std > 0 else 0.0
+
+    def percentile_of(self, value: float) -> float:
+        """
+        value 在全部历史价差中的百分位（0到100），即不大于value的价差所占的比例。
+        """
+        if self.count == 0:
+            return np.nan
+        return 100.0 * float(np.searchsorted(self.sorted_values, value, side = "right")) / self.count
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return np.nan
+        return float(np.quantile(self.sorted_values, q, method = "linear"))
+
+    def summary(self, latest: float = None) -> dict:
+        record = {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": float(self.sorted_values[0]) if self.count else np.nan,
+            "max": float(self.sorted_values[-1]) if self.count else np.nan,
+        }
+        if latest is not None:
+            record.update(latest = latest, zscore = self.zscore(latest), percentile = self.percentile_of(latest))
+        return record
+
+
+class SpreadRecord:
+    """
+    一个价差的存储内容：times 为int64纳秒时间戳，values 为价差，seasonal 为 (366 × 年份数) 季节矩阵。
+    """
+
+    def __init__(self, times: np.ndarray, values: np.ndarray, seasonal: np.ndarray, years: np.ndarray, stats: SpreadStats, meta: dict) -> None:
+        self.times = times
+        self.values = values
+        self.seasonal = seasonal
+        self.years = years
+        self.stats = stats
+        self.meta = meta
+
+    @property
+    def watermark(self):
+        return pd.Timestamp(int(self.times[-1])) if len(self.times) else None
+
+    @property
+    def spread(self) -> pd.Series:
+        return pd.Series(np.asarray(self.values), index = pd.DatetimeIndex(np.asarray(self.times).view("datetime64[ns]")), name = "spread")
+
+    def seasonal_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(np.asarray(self.seasonal), index = MONTHDAY_INDEX, columns = self.years)
+
+    def summary(self) -> dict:
+        latest = float(self.values[-1]) if len(self.values) else None
+        return self.stats.summary(latest)
+
+
+class SpreadStore:
+    """
+    存储目录结构为 store_dir/键/ ，键由价差公式和参数生成。每个目录下有：
+    datetime.npy、values.npy 价差序列，seasonal.npy 季节矩阵，sorted.npy 排好序的价差，
+    meta.json 公式、参数、季节矩阵的年份、累计和以及水位线。
+    """
+
+    def __init__(self, store_dir: str) -> None:
+        self.store_dir = store_dir
+
+    @staticmethod
+    def key(formula: str, settings: dict) -> str:
+        # 公式中的空格、运算符不适合作为目录名，另加参数的哈希值区分不同参数
+        name = "".join(char if char.isalnum() else "_" for char in formula.replace(" ", ""))
+        digest = hashlib.sha1(json.dumps([formula, settings], sort_keys = True, default = str).encode("utf-8")).hexdigest()[:10]
+        return f"{name}_{digest}"
+
+    def get_spread_dir(self, formula: str, settings: dict) -> str:
+        return os.path.join(self.store_dir, self.key(formula, settings))
+
+    def load(self, formula: str, settings: dict):
+        """
+        读取存储的结果，没有时返回 None。
+        """
+        spread_dir = self.get_spread_dir(formula, settings)
+        meta_path = os.path.join(spread_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding = "utf-8") as f:
+            meta = json.load(f)
+        times = np.load(os.path.join(spread_dir, "datetime.npy"), mmap_mode = "r")
+        values = np.load(os.path.join(spread_dir, "values.npy"), mmap_mode = "r")
+        seasonal = np.load(os.path.join(spread_dir, "seasonal.npy"))
+        sorted_values = np.load(os.path.join(spread_dir, "sorted.npy"))
+        stats = SpreadStats(sorted_values, meta["total"], meta["total_sq"], meta["base"])
+        return SpreadRecord(times, values, seasonal, np.array(meta["years"], dtype = np.int64), stats, meta)
+
+    def write(self, formula: str, settings: dict, record: SpreadRecord) -> SpreadRecord:
+        spread_dir = self.get_spread_dir(formula, settings)
+        os.makedirs(spread_dir, exist_ok = True)
+        meta = {
+            "formula": formula,
+            "settings": settings,
+            "years": [int(year) for year in record.years],
+            "total": record.stats.total,
+            "total_sq": record.stats.total_sq,
+            "base": record.stats.base,
+            "watermark": str(record.watermark) if record.watermark is not None else None,
+        }
+        # 先写入数组再写 meta.json，中途失败时不会留下不完整的结果
+        np.save(os.path.join(spread_dir, "datetime.npy"), np.ascontiguousarray(record.times, dtype = np.int64))
+        np.save(os.path.join(spread_dir, "values.npy"), np.ascontiguousarray(record.values, dtype = np.float64))
+        np.save(os.path.join(spread_dir, "seasonal.npy"), np.ascontiguousarray(record.seasonal, dtype = np.float64))
+        np.save(os.path.join(spread_dir, "sorted.npy"), record.stats.sorted_values)
+        with open(os.path.join(spread_dir, "meta.json"), "w", encoding = "utf-8") as f:
+            json.dump(meta, f, ensure_ascii = False)
+        record.meta = meta
+        return record
+
+    def save(self, formula: str, settings: dict, spread: pd.Series) -> SpreadRecord:
+        """
+        保存完整计算的价差序列，覆盖原有结果。
+        """
+        spread = spread.dropna().sort_index()
+        times = pd.DatetimeIndex(spread.index).as_unit("ns").asi8
+        values = spread.to_numpy(dtype = np.float64)
+        seasonal, years = seasonal_matrix(spread)
+        stats = SpreadStats()
+        stats.update(values)
+        return self.write(formula, settings, SpreadRecord(times, values, seasonal, np.asarray(years, dtype = np.int64), stats, {}))
+
+    def append(self, formula: str, settings: dict, new_spread: pd.Series) -> SpreadRecord:
+        """
+        把水位线之后的新价差追加到存储的结果中，只重新计算新数据所在年份的季节矩阵列。
+        没有存储结果时等同于 save。
+        """
+        record = self.load(formula, settings)
+        if record is None:
+            return self.save(formula, settings, new_spread)
+
+        new_spread = new_spread.dropna().sort_index()
+        new_times = pd.DatetimeIndex(new_spread.index).as_unit("ns").asi8
+        newer = new_times > record.times[-1] if len(record.times) else np.ones(len(new_times), dtype = bool)
+        new_times = new_times[newer]
+        new_values = new_spread.to_numpy(dtype = np.float64)[newer]
+        if len(new_times) == 0:
+            return record
+
+        times = np.concatenate([np.asarray(record.times), new_times])
+        values = np.concatenate([np.asarray(record.values), new_values])
+        record.stats.update(new_values)
+
+        # 新数据所在的年份从年初开始重新计算季节矩阵的列
+        first_year = pd.Timestamp(int(new_times[0])).year
+        start = np.searchsorted(times, pd.Timestamp(year = first_year, month = 1, day = 1).value, side = "left")
+        tail = pd.Series(values[start:], index = pd.DatetimeIndex(times[start:].view("datetime64[ns]")))
+        tail_matrix, tail_years = seasonal_matrix(tail)
+        keep = np.asarray(record.years) < first_year
+        seasonal = np.concatenate([np.asarray(record.seasonal)[:, keep], tail_matrix], axis = 1)
+        years = np.concatenate([np.asarray(record.years)[keep], np.asarray(tail_years, dtype = np.int64)])
+
+        return self.write(formula, settings, SpreadRecord(times, values, seasonal, years, record.stats, record.meta))
@@ -0,0 +1,275 @@
+"""
+按时间分段下载、计算价差。
+
+分钟、tick数据的历史行情很大，一次下载整个上市到退市区间会耗尽内存。
+这里把时间区间切成若干段，逐段下载各条腿当时主用的合约、按换月计划拼接、对齐、计算价差，
+用生成器一段一段地输出，内存占用只与每段的长度有关，与历史长度无关。
+
+换月、复权和对齐与 SpreadCalculation.calculate_spread 相同（continuous 模块），
+每条腿上一段的最后一个价格带入下一段对齐，向前填充不受分段影响，
+各段拼接起来与一次计算的结果相同。
+"""
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from .continuous import ContinuousSeries, align_continuous, build_continuous, roll_boundaries, roll_schedule
+from .formula import compile_formula
+from .panel import PricePanel
+from .price_cache import contract_date_range, parse_date, stack_contract_prices
+from .trading_hours import SessionCalendar
+
+
+# 各频率默认每段的天数
+DEFAULT_CHUNK_DAYS = {
+    "1d": 3650,
+    "1m": 30,
+    "tick": 1,
+}
+
+
+def price_field_for(frequency: str) -> str:
+    """
+    tick数据的价格字段为last，K线数据为close。
+    """
+    return "last" if frequency == "tick" else "close"
+
+
+def default_chunk_days(frequency: str) -> int:
+    if frequency in DEFAULT_CHUNK_DAYS:
+        return DEFAULT_CHUNK_DAYS[frequency]
+    # 其他分钟频率如"5m"、"15m"，每段的天数按分钟数放大
+    if frequency.endswith("m") and frequency[:-1].isdigit():
+        return DEFAULT_CHUNK_DAYS["1m"] * int(frequency[:-1])
+    return DEFAULT_CHUNK_DAYS["1d"]
+
+
+def date_chunks(start_date, end_date, chunk_days: int):
+    """
+    将 [start_date, end_date] 切分成每段chunk_days天，依次返回 (段开始日期, 段结束日期)。
+    """
+    start = pd.Timestamp(start_date).date()
+    end = pd.Timestamp(end_date).date()
+    while start <= end:
+        chunk_end = min(start + dt.timedelta(days = chunk_days - 1), end)
+        yield start, chunk_end
+        start = chunk_end + dt.timedelta(days = 1)
+
+
+def source_download(data_source, frequency: str):
+    """
+    把 DataSource 或 PriceCache 包装成 download(合约信息表, 开始日期, 结束日期)，
+    返回与 SpreadCalculation.download_hist_data 格式相同的表格。
+    """
+    if hasattr(data_source, "get_contracts_price"):
+        return lambda contract_info, start_date, end_date: data_source.get_contracts_price(contract_info, frequency, start_date, end_date)
+
+    def download(contract_info, start_date, end_date):
+        prices = []
+        for _, row in contract_info.iterrows():
+            start, end = contract_date_range(row, start_date, end_date)
+            prices.append(data_source.get_price(row["order_book_id"], start.date(), end.date(), frequency))
+        return stack_contract_prices(contract_info["order_book_id"].to_list(), prices)
+
+    return download
+
+
+def contract_prices(contracts_price, order_book_id: str, field: str):
+    """
+    download 返回结果中单个合约的 (时间戳, 价格)，按时间排序、不含空值。
+    """
+    if isinstance(contracts_price, PricePanel):
+        times, values = contracts_price.contract(order_book_id, field)
+    elif contracts_price.empty or field not in contracts_price:
+        return np.zeros(0, dtype = np.int64), np.zeros(0)
+    else:
+        rows = (contracts_price["order_book_id"] == order_book_id).to_numpy()
+        times = pd.DatetimeIndex(contracts_price.index[rows]).as_unit("ns").asi8
+        values = contracts_price[field].to_numpy(dtype = np.float64)[rows]
+    values = np.asarray(values, dtype = np.float64)
+    known = ~np.isnan(values)
+    times, values = np.asarray(times, dtype = np.int64)[known], values[known]
+    order = np.argsort(times, kind = "stable")
+    return times[order], values[order]
+
+
+def chunk_time_range(chunk_start, chunk_end):
+    return pd.Timestamp(chunk_start).value, (pd.Timestamp(chunk_end) + pd.Timedelta(days = 1)).value
+
+
+def stream_unadjusted(download, contract_info: pd.DataFrame, schedule: pd.DataFrame, chunks: list, field: str):
+    """
+    逐段返回不复权的 ContinuousSeries。每段只下载换月计划中当时主用、且在上市期间的合约，
+    只保留该段结束之前、上一段最后一个时间戳之后的数据（面板不按日期截取，日内数据的夜盘也不会重复）。
+    """
+    schedule = schedule.reset_index(drop = True)
+    upper = roll_boundaries(schedule)
+    lower = np.concatenate([[np.iinfo(np.int64).min], upper[:-1]])
+    one_day = pd.Timedelta(days = 1).value
+    listed = np.array([parse_date(date).value if parse_date(date) is not None else np.iinfo(np.int64).min for date in contract_info["listed_date"]])
+    de_listed = np.array([parse_date(date).value if parse_date(date) is not None else np.iinfo(np.int64).max for date in contract_info["de_listed_date"]])
+
+    last_time = None
+    for chunk_start, chunk_end in chunks:
+        start, end = chunk_time_range(chunk_start, chunk_end)
+        # 留出一天余量，夜盘的时间戳在交易日的前一天
+        needed = (lower < end + one_day) & (upper > start - one_day) & (listed < end) & (de_listed >= start - one_day)
+        if not needed.any():
+            yield build_continuous(pd.DataFrame(), schedule, field)
+            continue
+        series = build_continuous(download(contract_info[needed], chunk_start, chunk_end), schedule, field)
+        keep = series.times < end
+        if last_time is not None:
+            keep &= series.times > last_time
+        series = ContinuousSeries(series.times[keep], series.values[keep], series.contracts[keep], schedule)
+        if len(series):
+            last_time = series.times[-1]
+        yield series
+
+
+def roll_adjustment(download, contract_info: pd.DataFrame, schedule: pd.DataFrame, chunks: list, field: str, adjust: str) -> np.ndarray:
+    """
+    先逐段扫描一遍不复权的序列，记录每个合约在序列中的最后一个价格，
+    再查找下一个合约在该时间戳或之后的第一个价格，算出每次换月的价差（或比例），
+    返回每个合约需要加上（或乘以）的调整量，与 continuous.back_adjust 的计算相同。
+    """
+    if adjust not in ("difference", "ratio"):
+        raise ValueError(f"不支持的复权方式: {adjust}")
+    # 序列中依次出现的合约及其最后一个 (时间戳, 价格)
+    runs = []
+    for series in stream_unadjusted(download, contract_info, schedule, chunks, field):
+        if not len(series):
+            continue
+        ends = np.append(np.flatnonzero(series.contracts[1:] != series.contracts[:-1]), len(series) - 1)
+        for position in ends:
+            code = int(series.contracts[position])
+            if runs and runs[-1][0] == code:
+                runs[-1] = (code, series.times[position], series.values[position])
+            else:
+                runs.append((code, series.times[position], series.values[position]))
+
+    chunk_ends = np.array([chunk_time_range(chunk_start, chunk_end)[1] for chunk_start, chunk_end in chunks])
+    gaps = np.zeros(max(len(runs) - 1, 0)) if adjust == "difference" else np.ones(max(len(runs) - 1, 0))
+    for k, ((_, old_time, old_value), (new_code, _, _)) in enumerate(zip(runs[:-1], runs[1:])):
+        order_book_id = schedule["order_book_id"].iloc[new_code]
+        new_contract = contract_info.iloc[[new_code]]
+        # 从旧合约最后一个价格所在的段开始向后查找新合约的价格
+        for chunk_start, chunk_end in chunks[np.searchsorted(chunk_ends, old_time, side = "right"):]:
+            times, values = contract_prices(download(new_contract, chunk_start, chunk_end), order_book_id, field)
+            slot = np.searchsorted(times, old_time)
+            if slot < len(times):
+                if adjust == "difference":
+                    gaps[k] = values[slot] - old_value
+                elif old_value != 0:
+                    gaps[k] = values[slot] / old_value
+                break
+
+    adjustment = np.zeros(len(schedule)) if adjust == "difference" else np.ones(len(schedule))
+    if adjust == "difference":
+        later = np.concatenate([np.cumsum(gaps[::-1])[::-1], [0.0]])
+    else:
+        later = np.concatenate([np.cumprod(gaps[::-1])[::-1], [1.0]])
+    for segment, (code, _, _) in enumerate(runs):
+        adjustment[code] = later[segment]
+    return adjustment
+
+
+def stream_continuous(download, contract_info: pd.DataFrame, schedule: pd.DataFrame, chunks: list, field: str = "close", adjust: str = None):
+    """
+    逐段返回一条腿的 ContinuousSeries，拼接起来与 build_continuous 一次计算的结果相同。
+    download(合约信息表, 开始日期, 结束日期) 返回 download_hist_data 格式的表格或 PricePanel。
+    复权时需要之后全部换月的价差，先扫描一遍历史（使用缓存时第二遍不再下载），再逐段输出。
+    """
+    adjustment = roll_adjustment(download, contract_info, schedule, chunks, field, adjust) if adjust is not None else None
+    for series in stream_unadjusted(download, contract_info, schedule, chunks, field):
+        if adjustment is not None and len(series):
+            if adjust == "difference":
+                values = series.values + adjustment[series.contracts]
+            else:
+                values = series.values * adjustment[series.contracts]
+            series = ContinuousSeries(series.times, values, series.contracts, series.schedule)
+        yield series
+
+
+def stream_aligned(leg_streams: list, calendar: SessionCalendar = None, max_staleness = None):
+    """
+    逐段对齐多条腿，返回 (时间戳数组, 价格矩阵)，与对完整序列调用 align_continuous 的结果相同。
+    每条腿上一段的最后一个价格带入下一段，只输出比之前各段所有时间戳都晚的时间点。
+    """
+    carried = [None] * len(leg_streams)
+    previous_end = None
+    for chunk in zip(*leg_streams):
+        series_list = []
+        for i, series in enumerate(chunk):
+            if carried[i] is not None:
+                series = ContinuousSeries(
+                    np.concatenate([carried[i].times, series.times]),
+                    np.concatenate([carried[i].values, series.values]),
+                    np.concatenate([carried[i].contracts, series.contracts]),
+                    series.schedule,
+                )
+            if len(series):
+                carried[i] = ContinuousSeries(series.times[-1:], series.values[-1:], series.contracts[-1:], series.schedule)
+            series_list.append(series)
+        times, matrix = align_continuous(series_list, calendar, max_staleness)
+        if previous_end is not None:
+            keep = times > previous_end
+            times, matrix = times[keep], matrix[keep]
+        ends = [leg.times[-1] for leg in carried if leg is not None]
+        if ends:
+            previous_end = max(ends)
+        yield times, matrix
+
+
+def stream_spread(
+    formula: str,
+    leg_contract_info: dict,
+    data_source,
+    frequency: str = "1m",
+    chunk_days: int = None,
+    max_staleness = None,
+    roll_days_before: int = 0,
+    roll_reference: str = "de_listed_date",
+    back_adjust: str = None,
+):
+    """
+    逐段计算价差，每次返回一段价差序列（pandas Series）。
+
+    leg_contract_info 为 {合约代码: 历年合约信息表}，合约信息表需包含
+    order_book_id、listed_date、de_listed_date 三列，有 trading_hours 列时只在各腿交易时段的交集内计算价差。
+    data_source 为 DataSource、PriceCache，或 download(合约信息表, 开始日期, 结束日期) 函数
+    （如 SpreadCalculation.download_hist_data）。
+    roll_days_before、roll_reference、back_adjust 与 SpreadCalculation 的参数相同，
+    max_staleness 为向前填充的最长时间，见 trading_hours.align_to_calendar。
+    """
+    compiled_formula = compile_formula(formula)
+    if chunk_days is None:
+        chunk_days = default_chunk_days(frequency)
+    download = data_source if callable(data_source) else source_download(data_source, frequency)
+
+    infos = [leg_contract_info[leg] for leg in compiled_formula.dependencies]
+    calendar = None
+    if frequency != "1d":
+        calendar = SessionCalendar.intersection([SessionCalendar.from_contract_info(info) for info in infos])
+    field = price_field_for(frequency)
+    chunks = spread_chunks(infos, chunk_days)
+    streams = [
+        stream_continuous(download, info, roll_schedule(info, roll_days_before, roll_reference), chunks, field, back_adjust)
+        for info in infos
+    ]
+    for times, matrix in stream_aligned(streams, calendar, max_staleness):
+        if len(times) == 0:
+            continue
+        spread = compiled_formula.evaluate_matrix(matrix)
+        yield pd.Series(spread, index = pd.DatetimeIndex(times.view("datetime64[ns]")), name = "spread")
+
+
+def spread_chunks(infos: list, chunk_days: int) -> list:
+    """
+    从各条腿最早的上市日期到最晚的退市日期（仍在交易的合约到今天）的分段。
+    """
+    start = min(pd.Timestamp(info["listed_date"].min()) for info in infos)
+    end = min(max(pd.Timestamp(info["de_listed_date"].max()) for info in infos), pd.Timestamp(dt.date.today()))
+    return list(date_chunks(start, end, chunk_days))
@@ -0,0 +1,91 @@
+"""
+套利组合可交易时间段的筛选器。
+
+原先的筛选器对每个时间戳逐个比较月份，分钟数据上要执行上百万次Python循环。
+这里先按合约月份生成一张12个月的查询表，再用 DatetimeIndex.month 数组一次查表得到筛选器；
+另外支持按每条腿的首个交割日 start_delivery_date，在交割前N个交易日退出。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .seasonal import trading_days_to_expiry
+
+
+@lru_cache(maxsize = None)
+def month_window_table(contract_months: tuple) -> np.ndarray:
+    """
+    返回长度为13的查询表，table[month] 表示该月份是否处于可交易时间段。
+
+    个人交易者不能持有进入交割月的合约：
+    月份相差不超过6个月时，可交易时间为最小月份之前、最大月份之后；
+    否则为最小月份与最大月份之间。
+    """
+    min_month = min(contract_months)
+    max_month = max(contract_months)
+    months = np.arange(13)
+    if max_month - min_month <= 6:
+        table = (months < min_month) | (months > max_month)
+    else:
+        table = (months > min_month) & (months < max_month)
+    table.flags.writeable = False
+    return table
+
+
+def month_window_mask(index, contract_months) -> np.ndarray:
+    """
+    index 为时间序列的索引，contract_months 为各条腿的合约月份，如[5, 9]。
+    """
+    months = pd.DatetimeIndex(index).month.to_numpy()
+    return month_window_table(tuple(sorted(set(contract_months))))[months]
+
+
+def delivery_exit_mask(index, start_delivery_dates, exit_days: int) -> np.ndarray:
+    """
+    start_delivery_dates 为某条腿历年合约的首个交割日。
+    每个时间戳对应最近一个尚未交割的合约，距离其首个交割日不少于exit_days个交易日时为True。
+    """
+    index = pd.DatetimeIndex(index)
+    deliveries = np.sort(pd.to_datetime(pd.Series(start_delivery_dates)).dropna().to_numpy(dtype = "datetime64[ns]"))
+    mask = np.zeros(len(index), dtype = bool)
+    if len(index) == 0 or len(deliveries) == 0:
+        return mask
+
+    dates = index.normalize().as_unit("ns").asi8
+    position = np.searchsorted(deliveries.astype(np.int64), dates, side = "left")
+    upcoming = position < len(deliveries)
+    next_delivery = deliveries[np.minimum(position, len(deliveries) - 1)]
+    days = trading_days_to_expiry(index, next_delivery)
+    mask[upcoming] = days[upcoming] >= exit_days
+    return mask
+
+
+class TradeWindowMasks:
+    """
+    同一时间序列上的筛选器缓存，合约月份相同的公式共用同一个筛选器。
+    """
+
+    def __init__(self, index) -> None:
+        self.index = pd.DatetimeIndex(index)
+        self.months = self.index.month.to_numpy()
+        self.masks = {}
+
+    def month_mask(self, contract_months) -> np.ndarray:
+        key = tuple(sorted(set(contract_months)))
+        if key not in self.masks:
+            mask = month_window_table(key)[self.months]
+            # 缓存的筛选器为只读，需要修改时先复制
+            mask.flags.writeable = False
+            self.masks[key] = mask
+        return self.masks[key]
+
+    def delivery_mask(self, leg_delivery_dates: list, exit_days: int) -> np.ndarray:
+        """
+        leg_delivery_dates 为每条腿历年合约首个交割日的列表，所有腿都满足条件时为True。
+        """
+        mask = np.ones(len(self.index), dtype = bool)
+        for start_delivery_dates in leg_delivery_dates:
+            mask &= delivery_exit_mask(self.index, start_delivery_dates, exit_days)
+        return mask
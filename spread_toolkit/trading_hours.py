@@ -0,0 +1,156 @@
+"""
+交易时段日历和分钟、tick数据的多腿对齐。
+
+all_instruments 的 trading_hours 列为合约的交易时段，如 "21:01-23:00,09:01-10:15,10:31-11:30,13:31-15:00"。
+每种交易时段字符串只解析一次，编译成一天1440分钟的开市标记和连续时段编号；
+多条腿的日历取交集，只在所有腿都开市的分钟计算价差。
+
+对齐时每条腿用 searchsorted 找到每个时间点之前最近的一个价格（向前填充），
+超过 max_staleness 的旧价格、其他时段（如前一天日盘收盘价填到夜盘）的价格视为缺失，
+不会用一条腿的过期价格和另一条腿的新价格算出并不存在的价差。
+只分配 (时间点数 × 腿数) 的数组，不需要先外连接成宽表再dropna。
+"""
+
+import numpy as np
+import pandas as pd
+
+
+MINUTES_PER_DAY = 1440
+
+NANOSECONDS_PER_MINUTE = 60 * 1000 * 1000 * 1000
+
+
+def parse_trading_hours(trading_hours: str) -> np.ndarray:
+    """
+    将交易时段字符串解析成长度1440的开市标记，第i个元素表示第i分钟的K线是否开市。
+    时段的开始、结束时间都包含在内，夜盘跨过零点时（如 "21:01-02:30"）分成零点前后两段。
+    """
+    is_open = np.zeros(MINUTES_PER_DAY, dtype = bool)
+    for period in trading_hours.split(","):
+        start, end = (text.strip() for text in period.split("-"))
+        start_minute = int(start[:2]) * 60 + int(start[3:5])
+        end_minute = int(end[:2]) * 60 + int(end[3:5])
+        if start_minute <= end_minute:
+            is_open[start_minute:end_minute + 1] = True
+        else:
+            is_open[start_minute:] = True
+            is_open[:end_minute + 1] = True
+    return is_open
+
+
+def minute_of_day(times: np.ndarray) -> np.ndarray:
+    """
+    int64纳秒时间戳所属的分钟K线（K线时间为结束时间，21:00:30的tick属于21:01的K线），返回0到1439。
+    """
+    times = np.asarray(times, dtype = np.int64)
+    return (-((-times) // NANOSECONDS_PER_MINUTE)) % MINUTES_PER_DAY
+
+
+class SessionCalendar:
+    """
+    is_open 为一天1440分钟的开市标记。segment 为每分钟所属的连续时段编号，休市的分钟为-1；
+    anchor 为一个休市的分钟，按 anchor 切分交易日，跨零点的夜盘属于同一个时段。
+    """
+
+    # 按交易时段字符串缓存编译好的日历，同一进程内只解析一次
+    compiled_calendars = {}
+
+    def __init__(self, is_open: np.ndarray) -> None:
+        self.is_open = np.asarray(is_open, dtype = bool)
+        closed = np.flatnonzero(~self.is_open)
+        # 全天开市时不存在休市的分钟，每天零点切分
+        self.anchor = int(closed[0]) if len(closed) else 0
+
+        # 从 anchor 开始的一天内，连续开市的分钟为同一个时段
+        rotated = np.roll(self.is_open, -self.anchor)
+        starts = rotated & ~np.roll(rotated, 1)
+        if len(closed) == 0:
+            starts[:] = False
+            starts[0] = True
+        rotated_segment = np.where(rotated, np.cumsum(starts) - 1, -1)
+        self.segment = np.roll(rotated_segment, self.anchor)
+        self.segment_count = int(starts.sum())
+
+    @classmethod
+    def from_trading_hours(cls, trading_hours: str) -> "SessionCalendar":
+        if trading_hours not in cls.compiled_calendars:
+            cls.compiled_calendars[trading_hours] = cls(parse_trading_hours(trading_hours))
+        return cls.compiled_calendars[trading_hours]
+
+    @classmethod
+    def from_contract_info(cls, contract_info: pd.DataFrame):
+        """
+        用合约信息表中最后一个（最新）合约的交易时段，没有 trading_hours 列时返回None。
+        """
+        if "trading_hours" not in contract_info or contract_info.empty:
+            return None
+        trading_hours = contract_info["trading_hours"].dropna()
+        return cls.from_trading_hours(trading_hours.iloc[-1]) if len(trading_hours) else None
+
+    @classmethod
+    def intersection(cls, calendars: list):
+        """
+        多个日历共同开市的分钟，忽略其中的None；全部为None时返回None。
+        """
+        calendars = [calendar for calendar in calendars if calendar is not None]
+        if not calendars:
+            return None
+        is_open = np.logical_and.reduce([calendar.is_open for calendar in calendars])
+        return cls(is_open)
+
+    def contains(self, times: np.ndarray) -> np.ndarray:
+        return self.is_open[minute_of_day(times)]
+
+    def session_key(self, times: np.ndarray) -> np.ndarray:
+        """
+        每个时间戳所在的交易时段编号，同一天同一连续时段的时间戳编号相同，休市时为-1。
+        """
+        times = np.asarray(times, dtype = np.int64)
+        minute = minute_of_day(times)
+        # K线所属分钟的绝对编号减去 anchor 后按天切分，同一时段不会跨过 anchor
+        absolute_minute = -((-times) // NANOSECONDS_PER_MINUTE)
+        day = (absolute_minute - self.anchor) // MINUTES_PER_DAY
+        segment = self.segment[minute]
+        return np.where(segment >= 0, day * max(self.segment_count, 1) + segment, -1)
+
+
+def align_to_calendar(
+    times_list: list,
+    values_list: list,
+    calendar: SessionCalendar = None,
+    max_staleness = None,
+    cross_session: bool = False,
+):
+    """
+    多条腿的 (时间戳数组, 价格数组) 按交易时段对齐，每条腿的时间戳需按时间排序、不重复。
+    时间点为各条腿时间戳的并集中日历开市的部分，每条腿取该时间点之前最近的价格；
+    价格的时间与时间点相差超过 max_staleness（pd.Timedelta 或 "5min" 这样的字符串），
+    或者不在同一交易时段（cross_session 为False时）时视为缺失。
+    max_staleness 为None时只使用恰好在该时间点的价格，与时间戳取交集相同。
+    返回 (时间戳数组, 价格矩阵)，只保留所有腿都有价格的时间点，矩阵的列与腿的顺序相同。
+    """
+    if not times_list:
+        return np.zeros(0, dtype = np.int64), np.zeros((0, 0))
+    grid = np.unique(np.concatenate([np.asarray(times, dtype = np.int64) for times in times_list]))
+    if calendar is not None:
+        grid = grid[calendar.contains(grid)]
+    staleness = 0 if max_staleness is None else pd.Timedelta(max_staleness).value
+    grid_session = calendar.session_key(grid) if calendar is not None and not cross_session else None
+
+    matrix = np.empty((len(grid), len(times_list)))
+    valid = np.ones(len(grid), dtype = bool)
+    for i, (times, values) in enumerate(zip(times_list, values_list)):
+        times = np.asarray(times, dtype = np.int64)
+        position = np.searchsorted(times, grid, side = "right") - 1
+        found = position >= 0
+        position = np.maximum(position, 0)
+        if len(times) == 0:
+            valid[:] = False
+            continue
+        source_times = times[position]
+        found &= grid - source_times <= staleness
+        if grid_session is not None:
+            found &= calendar.session_key(source_times) == grid_session
+        valid &= found
+        matrix[:, i] = np.asarray(values, dtype = np.float64)[position]
+    return grid[valid], matrix[valid]
@@ -0,0 +1,275 @@
+"""
+测试共用的设置：共享代码库 spread_toolkit 位于仓库根目录。
+没有安装vnpy、vnpy_spreadtrading时，用只包含策略用到部分的最小实现代替，
+ZscoreGridStrategy 的回放、与向量化回测的对照测试不依赖vnpy也能运行。
+"""
+
+import importlib.util
+import os
+import sys
+import types
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from spread_toolkit.datasource import DataSource
+
+
+class DailyDataSource(DataSource):
+    """
+    每个工作日一根日K线的内存数据源，价格只由合约代码和日期决定，记录每次请求的日期范围。
+    listed 为 {合约代码: (上市日期, 退市日期)}，不在其中的合约不限制日期；
+    until 不为空时只返回该日期之前的行情，模拟当时能下载到的数据。
+    """
+
+    def __init__(self, listed: dict = None, until = None) -> None:
+        self.listed = {order_book_id: (pd.Timestamp(start), pd.Timestamp(end)) for order_book_id, (start, end) in (listed or {}).items()}
+        self.until = until
+        self.calls = []
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1d") -> pd.DataFrame:
+        self.calls.append((order_book_id, str(start_date), str(end_date)))
+        listed, de_listed = self.listed.get(order_book_id, (pd.Timestamp("2000-01-01"), pd.Timestamp("2100-01-01")))
+        start = max(pd.Timestamp(start_date), listed)
+        end = min(pd.Timestamp(end_date), de_listed)
+        if self.until is not None:
+            end = min(end, pd.Timestamp(self.until))
+        index = pd.bdate_range(start, end) if start <= end else pd.DatetimeIndex([])
+        seed = sum(map(ord, order_book_id))
+        close = 3000.0 + seed + (index - listed).days.to_numpy() * 0.5 + index.dayofyear.to_numpy() % 7
+        return pd.DataFrame({"open": close, "close": close}, index = index)
+
+
+def install_vnpy_stubs() -> None:
+    """
+    注册 vnpy.trader.constant、vnpy.trader.object、vnpy.trader.utility 和 vnpy_spreadtrading 的最小实现，
+    接口和行为与vnpy中策略、回放用到的部分相同。
+    """
+
+    class Direction(Enum):
+        LONG = "多"
+        SHORT = "空"
+        NET = "净"
+
+    class Exchange(Enum):
+        LOCAL = "LOCAL"
+
+    class Interval(Enum):
+        MINUTE = "1m"
+        HOUR = "1h"
+        DAILY = "d"
+        TICK = "tick"
+
+    class EngineType(Enum):
+        LIVE = "实盘"
+        BACKTESTING = "回测"
+
+    @dataclass
+    class TickData:
+        gateway_name: str
+        symbol: str
+        exchange: Exchange
+        datetime: datetime
+        name: str = ""
+        volume: float = 0
+        turnover: float = 0
+        open_interest: float = 0
+        last_price: float = 0
+        high_price: float = 0
+        low_price: float = 0
+        bid_price_1: float = 0
+        ask_price_1: float = 0
+        bid_volume_1: float = 0
+        ask_volume_1: float = 0
+
+    @dataclass
+    class BarData:
+        gateway_name: str
+        symbol: str
+        exchange: Exchange
+        datetime: datetime
+        interval: Interval = None
+        volume: float = 0
+        turnover: float = 0
+        open_interest: float = 0
+        open_price: float = 0
+        high_price: float = 0
+        low_price: float = 0
+        close_price: float = 0
+
+    @dataclass
+    class OrderData:
+        gateway_name: str
+        symbol: str
+        exchange: Exchange
+        orderid: str
+
+    @dataclass
+    class TradeData:
+        gateway_name: str
+        symbol: str
+        exchange: Exchange
+        orderid: str
+        tradeid: str
+
+    class BarGenerator:
+        """
+        由tick合成1分钟K线，新的一分钟的tick到达时推送上一根K线，与vnpy的 BarGenerator.update_tick 相同。
+        """
+
+        def __init__(self, on_bar) -> None:
+            self.on_bar = on_bar
+            self.bar = None
+            self.last_tick = None
+
+        def update_tick(self, tick) -> None:
+            if not tick.last_price:
+                return
+            new_minute = self.bar is None
+            if not new_minute and (self.bar.datetime.minute != tick.datetime.minute or self.bar.datetime.hour != tick.datetime.hour):
+                self.bar.datetime = self.bar.datetime.replace(second = 0, microsecond = 0)
+                self.on_bar(self.bar)
+                new_minute = True
+
+            if new_minute:
+                self.bar = BarData(
+                    symbol = tick.symbol,
+                    exchange = tick.exchange,
+                    interval = Interval.MINUTE,
+                    datetime = tick.datetime,
+                    gateway_name = tick.gateway_name,
+                    open_price = tick.last_price,
+                    high_price = tick.last_price,
+                    low_price = tick.last_price,
+                    close_price = tick.last_price,
+                    open_interest = tick.open_interest,
+                )
+            else:
+                self.bar.high_price = max(self.bar.high_price, tick.last_price)
+                self.bar.low_price = min(self.bar.low_price, tick.last_price)
+                self.bar.close_price = tick.last_price
+                self.bar.open_interest = tick.open_interest
+                self.bar.datetime = tick.datetime
+
+            if self.last_tick is not None:
+                self.bar.volume += max(tick.volume - self.last_tick.volume, 0)
+                self.bar.turnover += max(tick.turnover - self.last_tick.turnover, 0)
+            self.last_tick = tick
+
+    class SpreadAlgoTemplate:
+        pass
+
+    class SpreadData:
+        pass
+
+    class SpreadStrategyTemplate:
+        """
+        vnpy_spreadtrading 策略模板中与策略引擎交互的部分。
+        """
+
+        author = ""
+        parameters = []
+        variables = []
+
+        def __init__(self, strategy_engine, strategy_name: str, spread, setting: dict) -> None:
+            self.strategy_engine = strategy_engine
+            self.strategy_name = strategy_name
+            self.spread = spread
+            self.spread_name = spread.name
+            self.inited = False
+            self.trading = False
+            self.variables = ["inited", "trading"] + list(self.variables)
+            self.vt_orderids = set()
+            self.algoids = set()
+            self.update_setting(setting)
+
+        def update_setting(self, setting: dict) -> None:
+            for name in self.parameters:
+                if name in setting:
+                    setattr(self, name, setting[name])
+
+        def update_spread_algo(self, algo) -> None:
+            if not algo.is_active() and algo.algoid in self.algoids:
+                self.algoids.remove(algo.algoid)
+            self.on_spread_algo(algo)
+
+        def on_spread_algo(self, algo) -> None:
+            pass
+
+        def start_algo(self, direction, price: float, volume: float, payup: int, interval: int, lock: bool, extra: dict) -> str:
+            if not self.trading:
+                return ""
+            algoid = self.strategy_engine.start_algo(self, self.spread_name, direction, price, volume, payup, interval, lock, extra)
+            self.algoids.add(algoid)
+            return algoid
+
+        def start_long_algo(self, price: float, volume: float, payup: int, interval: int, lock: bool = False, extra: dict = None) -> str:
+            return self.start_algo(Direction.LONG, price, volume, payup, interval, lock, extra or {})
+
+        def start_short_algo(self, price: float, volume: float, payup: int, interval: int, lock: bool = False, extra: dict = None) -> str:
+            return self.start_algo(Direction.SHORT, price, volume, payup, interval, lock, extra or {})
+
+        def stop_algo(self, algoid: str) -> None:
+            if not self.trading:
+                return
+            self.strategy_engine.stop_algo(self, algoid)
+
+        def stop_all_algos(self) -> None:
+            for algoid in list(self.algoids):
+                self.stop_algo(algoid)
+
+        def put_event(self) -> None:
+            self.strategy_engine.put_strategy_event(self)
+
+        def write_log(self, msg: str) -> None:
+            self.strategy_engine.write_strategy_log(self, msg)
+
+        def get_engine_type(self):
+            return self.strategy_engine.get_engine_type()
+
+        def get_spread_tick(self):
+            return self.spread.to_tick()
+
+        def get_spread_pos(self) -> float:
+            return self.spread.net_pos
+
+        def load_bar(self, days: int, interval = Interval.MINUTE, callback = None) -> None:
+            self.strategy_engine.load_bar(self.spread, days, interval, callback or self.on_spread_bar)
+
+        def load_tick(self, days: int) -> None:
+            self.strategy_engine.load_tick(self.spread, days, self.on_spread_tick)
+
+    modules = {
+        "vnpy": {},
+        "vnpy.trader": {},
+        "vnpy.trader.constant": {"Direction": Direction, "Exchange": Exchange, "Interval": Interval, "EngineType": EngineType},
+        "vnpy.trader.object": {"TickData": TickData, "BarData": BarData, "OrderData": OrderData, "TradeData": TradeData},
+        "vnpy.trader.utility": {"BarGenerator": BarGenerator},
+        "vnpy_spreadtrading": {
+            "SpreadStrategyTemplate": SpreadStrategyTemplate,
+            "SpreadAlgoTemplate": SpreadAlgoTemplate,
+            "SpreadData": SpreadData,
+            "OrderData": OrderData,
+            "TradeData": TradeData,
+            "TickData": TickData,
+            "BarData": BarData,
+        },
+    }
+    for name, attributes in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+    sys.modules["vnpy"].trader = sys.modules["vnpy.trader"]
+    for name in ("constant", "object", "utility"):
+        setattr(sys.modules["vnpy.trader"], name, sys.modules[f"vnpy.trader.{name}"])
+
+
+# 只有两个包都已安装时使用真实的vnpy，否则全部使用最小实现，避免混用两套类型
+if importlib.util.find_spec("vnpy") is None or importlib.util.find_spec("vnpy_spreadtrading") is None:
+    install_vnpy_stubs()
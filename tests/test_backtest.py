@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from spread_toolkit.backtest import backtest_zscore_grid, replay_strategy_positions, rolling_mean_std, verify_against_strategy
+
+
+def reference_positions(close: np.ndarray, ma_window: int, volume_multiplier: float, max_pos: float) -> np.ndarray:
+    """
+    按 ZscoreGridStrategy.on_spread_signal 的逻辑逐根K线计算仓位，假设委托在当根K线收盘价成交。
+    """
+    mean, std = rolling_mean_std(close, ma_window)
+    warmup = ma_window + 10
+    pos = 0.0
+    positions = np.zeros(len(close))
+    for i in range(len(close)):
+        if i + 1 >= warmup:
+            price_change = close[i] - mean[i]
+            z_score = price_change / std[i] if std[i] > 0 else 0.0
+            if pos > 0 and price_change >= 0:
+                pos = 0.0
+            elif pos < 0 and price_change <= 0:
+                pos = 0.0
+            elif price_change > std[i]:
+                target = max(-max_pos, -math.floor(z_score - 1) * volume_multiplier)
+                pos = min(pos, target)
+            elif price_change < -std[i]:
+                target = min(max_pos, -math.ceil(z_score + 1) * volume_multiplier)
+                pos = max(pos, target)
+        positions[i] = pos
+    return positions
+
+
+def spread_cases():
+    """
+    随机游走的价差，以及整数价差、ma_window为2（z_score恰好为±1）等取整边界的情况。
+    """
+    rng = np.random.default_rng(11)
+    index = pd.date_range("2023-01-03 09:00", periods = 400, freq = "1min")
+    for i in range(12):
+        yield f"normal{i}", pd.Series(100.0 + np.cumsum(rng.normal(0.0, 1.0, 400)), index = index), {"ma_window": 20}
+        yield f"integer{i}", pd.Series(100.0 + np.cumsum(rng.integers(-2, 3, 400)), index = index).astype(float), {"ma_window": 5}
+    for i in range(4):
+        # 两根K线的窗口中，价格与均值的偏离恰好等于一个标准差
+        yield f"unit_z{i}", pd.Series(100.0 + np.cumsum(rng.integers(-3, 4, 400)), index = index).astype(float), {"ma_window": 2}
+    yield "flat", pd.Series(100.0, index = index), {"ma_window": 10}
+    yield "alternating", pd.Series(np.where(np.arange(400) % 2, 101.0, 99.0), index = index), {"ma_window": 4, "max_pos": 10}
+
+
+@pytest.mark.parametrize("name, spread, setting", list(spread_cases()))
+def test_vectorized_matches_reference(name, spread, setting):
+    parameters = {"ma_window": 20, "volume_multiplier": 5, "max_pos": 25, **setting}
+    expected = reference_positions(spread.to_numpy(), **parameters)
+    result = backtest_zscore_grid(spread, **parameters)
+    np.testing.assert_array_equal(result.positions.to_numpy(), expected)
+
+
+@pytest.mark.parametrize("name, spread, setting", list(spread_cases()))
+def test_vectorized_matches_strategy(name, spread, setting):
+    parameters = {"ma_window": 20, "volume_multiplier": 5, "max_pos": 25, **setting}
+    expected = replay_strategy_positions(spread, parameters)
+    result = backtest_zscore_grid(spread, **parameters)
+    np.testing.assert_array_equal(result.positions.to_numpy(), expected)
+
+
+def test_verify_against_strategy(monkeypatch):
+    spread = next(spread_cases())[1]
+    assert verify_against_strategy(spread, {"ma_window": 20})
+
+    # 事件驱动的仓位与向量化回测不同时返回False
+    monkeypatch.setattr("spread_toolkit.backtest.replay_strategy_positions", lambda spread, setting: np.zeros(len(spread)))
+    assert not verify_against_strategy(spread, {"ma_window": 20})
@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import REPO_DIR
+from spread_toolkit.cointegration import (
+    ENGLE_GRANGER_CRITICAL_VALUES,
+    CointegrationScreener,
+    adf_statistic,
+    batched_ols,
+    half_life,
+    kalman_hedge_ratios,
+)
+from spread_toolkit.instrument_catalog import InstrumentCatalog
+
+INSTRUMENTS_CSV = os.path.join(REPO_DIR, "2.Futures Inter-commodity arbitrage analysis", "20230722_all_instruments.csv")
+
+HEDGE_RATIO = 0.8
+PHI = 0.9
+
+
+def cointegrated_pair(n: int, seed: int = 0):
+    """
+    x 为随机游走，y = HEDGE_RATIO * x + 200 + e，e 为系数PHI的AR(1)，半衰期为 -ln2 / (PHI - 1) 根K线。
+    """
+    rng = np.random.default_rng(seed)
+    x = 3000.0 + np.cumsum(rng.normal(0.0, 10.0, n))
+    e = np.zeros(n)
+    shocks = rng.normal(0.0, 5.0, n)
+    for t in range(1, n):
+        e[t] = PHI * e[t - 1] + shocks[t]
+    return HEDGE_RATIO * x + 200.0 + e, x
+
+
+def ols(y: np.ndarray, X: np.ndarray):
+    """
+    逐组的参考实现：先回归求系数，再由残差计算方差和系数标准误。
+    """
+    beta = np.linalg.lstsq(X, y, rcond = None)[0]
+    residuals = y - X @ beta
+    sigma2 = residuals @ residuals / (len(y) - X.shape[1])
+    stderr = np.sqrt(sigma2 * np.diag(np.linalg.inv(X.T @ X)))
+    return beta, residuals, sigma2, stderr
+
+
+def test_batched_ols_matches_lstsq_with_missing_values():
+    rng = np.random.default_rng(1)
+    k, n, p = 4, 300, 3
+    X = rng.normal(size = (k, n, p))
+    y = np.einsum("knp,kp->kn", X, rng.normal(size = (k, p))) + rng.normal(0.0, 0.1, (k, n))
+    y[0, :10] = np.nan
+    X[1, 20:25, 1] = np.nan
+
+    beta, residuals, sigma2, stderr = batched_ols(y, X)
+    for i in range(k):
+        valid = np.isfinite(y[i]) & np.isfinite(X[i]).all(axis = 1)
+        expected = ols(y[i, valid], X[i, valid])
+        np.testing.assert_allclose(beta[i], expected[0], rtol = 1e-10)
+        np.testing.assert_allclose(residuals[i, valid], expected[1], atol = 1e-10)
+        assert np.isnan(residuals[i, ~valid]).all()
+        np.testing.assert_allclose(sigma2[i], expected[2], rtol = 1e-10)
+        np.testing.assert_allclose(stderr[i], expected[3], rtol = 1e-8)
+
+
+@pytest.mark.parametrize("lags", [1, 2])
+def test_adf_statistic_matches_two_pass_ols(lags):
+    y, x = cointegrated_pair(1000)
+    X = np.stack([x, np.ones_like(x)], axis = 1)
+    _, residuals, _, _ = ols(y, X)
+
+    # 第二次回归：Δe_t 对 e_{t-1} 和滞后差分回归，不含常数项
+    diff = np.diff(residuals)
+    regressors = [residuals[lags:-1]] + [diff[lags - i:len(diff) - i] for i in range(1, lags + 1)]
+    beta, _, _, stderr = ols(diff[lags:], np.stack(regressors, axis = 1))
+
+    tstat, n_obs = adf_statistic(residuals[None, :], lags)
+    assert n_obs[0] == len(diff) - lags
+    np.testing.assert_allclose(tstat[0], beta[0] / stderr[0], rtol = 1e-8)
+
+
+def test_cointegrated_pair_hedge_ratio_and_half_life():
+    y, x = cointegrated_pair(5000)
+    X = np.stack([x, np.ones_like(x)], axis = 1)[None]
+    beta, residuals, _, _ = batched_ols(y[None], X)
+    assert beta[0, 0] == pytest.approx(HEDGE_RATIO, abs = 0.01)
+    assert half_life(residuals)[0] == pytest.approx(-np.log(2.0) / (PHI - 1.0), rel = 0.2)
+    assert adf_statistic(residuals)[0][0] < ENGLE_GRANGER_CRITICAL_VALUES[2]["1%"]
+
+    # 两条独立的随机游走没有协整关系，残差不回复时半衰期很长
+    rng = np.random.default_rng(8)
+    walk = np.cumsum(rng.normal(size = 5000))
+    _, residuals, _, _ = batched_ols(walk[None] + 100.0, X)
+    assert adf_statistic(residuals)[0][0] > ENGLE_GRANGER_CRITICAL_VALUES[2]["10%"]
+    assert half_life(residuals)[0] > 100
+
+
+def test_kalman_hedge_ratios_track_changes():
+    rng = np.random.default_rng(3)
+    n = 2000
+    x = 3000.0 + np.cumsum(rng.normal(0.0, 10.0, n))
+    ratio = np.where(np.arange(n) < n // 2, 0.8, 1.2)
+    y = ratio * x + rng.normal(0.0, 5.0, n)
+    # 不含常数项，价格水平很高时常数项与系数难以区分
+    X = x[None, :, None]
+
+    filtered = kalman_hedge_ratios(y[None], X, delta = 1e-3)
+    assert filtered.shape == (1, n, 1)
+    assert filtered[0, n // 2 - 1, 0] == pytest.approx(0.8, abs = 0.01)
+    assert filtered[0, -1, 0] == pytest.approx(1.2, abs = 0.01)
+
+    # 状态噪声为0时系数保持初始值；缺失值处只预测不更新
+    y_missing = y.copy()
+    y_missing[100] = np.nan
+    initial = np.array([[1.0]])
+    fixed = kalman_hedge_ratios(y_missing[None], X, delta = 0.0, initial_beta = initial, observation_var = np.array([25.0]))
+    np.testing.assert_allclose(fixed[0], np.broadcast_to(initial, (n, 1)))
+    moving = kalman_hedge_ratios(y_missing[None], X, delta = 1e-3)
+    np.testing.assert_array_equal(moving[0, 100], moving[0, 99])
+
+
+class SimulatedPrices:
+    """
+    主力连续合约的模拟收盘价：HC88 与 RB88 协整，其余品种为独立的随机游走。
+    """
+
+    def __init__(self, n: int = 1500) -> None:
+        self.index = pd.bdate_range("2017-01-02", periods = n)
+        self.hc, self.rb = cointegrated_pair(n, seed = 5)
+
+    def get_price(self, order_book_id: str, start_date = None, end_date = None, frequency: str = "1d") -> pd.DataFrame:
+        if order_book_id == "HC88":
+            close = self.hc
+        elif order_book_id == "RB88":
+            close = self.rb
+        else:
+            rng = np.random.default_rng(sum(map(ord, order_book_id)))
+            close = 3000.0 + np.cumsum(rng.normal(0.0, 10.0, len(self.index)))
+        return pd.DataFrame({"close": close}, index = self.index)
+
+
+@pytest.mark.parametrize("hedge_method", ["ols", "rolling", "kalman"])
+def test_screener_finds_cointegrated_pair(hedge_method):
+    catalog = InstrumentCatalog.from_csv(INSTRUMENTS_CSV)
+    screener = CointegrationScreener(
+        catalog, SimulatedPrices(), "2017-01-01", "2022-12-31",
+        industry_names = ["焦煤钢矿"], hedge_method = hedge_method, chunk_size = 7,
+    )
+    results = screener.run()
+
+    # 行业内9个品种两两组合，分批计算后合并
+    assert len(results) == 36
+    assert results["adf_stat"].is_monotonic_increasing
+    best = results.iloc[0]
+    assert best["symbols"] == ("HC88", "RB88")
+    assert best["cointegrated"]
+    # 滚动窗口、卡尔曼滤波只用最近的数据，估计误差比全样本OLS大
+    assert best["hedge_ratios"][0] == pytest.approx(HEDGE_RATIO, abs = 0.02 if hedge_method == "ols" else 0.06)
+    assert best["half_life"] == pytest.approx(-np.log(2.0) / (PHI - 1.0), rel = 0.3)
+    assert best["formula"] == f"HC10 - RB10*{round(best['hedge_ratios'][0], 3):g}"
+    assert screener.top_formulas(1) == [best["formula"]]
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spread_toolkit.formula import CompiledFormula, compile_formula
+
+
+@pytest.mark.parametrize("formula", [
+    "__import__('os').system('ls')",
+    "RB10 ** 2",
+    "RB10 // 2",
+    "abs(RB10)",
+    "RB10.real",
+    "RB10[0]",
+    "RB10 if I09 else J09",
+    "rb",
+    "'RB10' + 1",
+    "RB10 and I09",
+    "lambda: RB10",
+    "RB10 -",
+])
+def test_rejects_unsupported_syntax(formula):
+    with pytest.raises(ValueError):
+        CompiledFormula(formula)
+
+
+def test_linear_weights():
+    compiled = CompiledFormula("RB10*1.6 - I09 - J09*0.5")
+    assert compiled.dependencies == ["RB10", "I09", "J09"]
+    assert compiled.linear_weights == pytest.approx({"RB10": 1.6, "I09": -1.0, "J09": -0.5})
+    assert compiled.constant == 0.0
+
+    # 同一合约多次出现时权重合并；除以常数、括号、负号和常数项都是线性的
+    compiled = CompiledFormula("-(RB10 - HC10*0.9)/2 + 3*RB10 + 10")
+    assert compiled.dependencies == ["RB10", "HC10"]
+    assert compiled.linear_weights == pytest.approx({"RB10": 2.5, "HC10": 0.45})
+    assert compiled.constant == 10.0
+
+    for formula in ("RB10 * HC10", "RB10 / HC10", "RB10 / 0", "(RB10 - HC10) / (RB10 + HC10)"):
+        compiled = CompiledFormula(formula)
+        assert compiled.linear_weights is None and compiled.constant is None
+
+
+@pytest.mark.parametrize("formula", ["RB10*1.6 - I09 - J09*0.5", "RB10 / I09 - J09 * 0.01", "-RB10 + 100"])
+def test_evaluate_matrix_matches_direct_computation(formula):
+    rng = np.random.default_rng(0)
+    compiled = compile_formula(formula)
+    matrix = rng.uniform(500.0, 5000.0, (200, len(compiled.dependencies)))
+    matrix[5, 0] = np.nan
+    columns = dict(zip(compiled.dependencies, matrix.T))
+
+    # 直接计算：公式中的合约代码替换为对应的价格列
+    expected = eval(formula, {}, columns)
+    result = compiled.evaluate_matrix(matrix)
+    np.testing.assert_allclose(result, expected, rtol = 1e-12)
+    assert np.isnan(result[5])
+    np.testing.assert_allclose(compiled.evaluate(columns), expected, rtol = 1e-12)
+    np.testing.assert_allclose(compiled.evaluate(list(matrix.T)), expected, rtol = 1e-12)
+
+
+def test_evaluate_aligns_series():
+    compiled = compile_formula("RB10 - HC10*0.9")
+    rb = pd.Series([3600.0, 3610.0, 3620.0], index = pd.to_datetime(["2023-01-03", "2023-01-04", "2023-01-05"]))
+    hc = pd.Series([3700.0, 3720.0], index = pd.to_datetime(["2023-01-04", "2023-01-05"]))
+    spread = compiled.evaluate({"RB10": rb, "HC10": hc})
+    assert np.isnan(spread.iloc[0])
+    np.testing.assert_allclose(spread.iloc[1:], [3610.0 - 3330.0, 3620.0 - 3348.0])
+
+
+def test_compile_formula_is_cached():
+    assert compile_formula("RB10 - HC10") is compile_formula("RB10 - HC10")
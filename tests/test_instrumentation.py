@@ -0,0 +1,45 @@
+import threading
+
+from spread_toolkit.instrumentation import HotPathMetrics, MetricsExporter
+
+
+def test_render_while_adding_metrics():
+    metrics = HotPathMetrics("strategy")
+    exporter = MetricsExporter()
+    exporter.register(metrics)
+    errors = []
+    done = threading.Event()
+
+    def render():
+        try:
+            while not done.is_set():
+                exporter.render()
+                metrics.summary()
+        except Exception as error:
+            errors.append(error)
+
+    thread = threading.Thread(target = render)
+    thread.start()
+    try:
+        for i in range(20000):
+            metrics.observe(f"metric_{i}", i)
+            metrics.increment(f"counter_{i}")
+    finally:
+        done.set()
+        thread.join()
+    assert errors == []
+    assert len(metrics.summary()["latency"]) == 20000
+
+
+def test_prometheus_counts_consistent():
+    metrics = HotPathMetrics("strategy", metrics = ["on_spread_tick"], counters = ["algo_starts"])
+    text = metrics.to_prometheus()
+    assert 'spread_strategy_on_spread_tick_seconds_count{strategy="strategy"} 0' in text
+    assert 'spread_strategy_algo_starts_total{strategy="strategy"} 0' in text
+    for elapsed in (500, 3000, 2 * 10 ** 9):
+        metrics.observe("on_spread_tick", elapsed)
+    metrics.increment("algo_starts", 2)
+    text = metrics.to_prometheus()
+    assert 'spread_strategy_on_spread_tick_seconds_bucket{strategy="strategy",le="+Inf"} 3' in text
+    assert 'spread_strategy_on_spread_tick_seconds_count{strategy="strategy"} 3' in text
+    assert 'spread_strategy_algo_starts_total{strategy="strategy"} 2' in text
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from vnpy.trader.constant import Exchange
+from vnpy.trader.object import TickData
+
+from spread_toolkit.formula import compile_formula
+from spread_toolkit.monitor import ColumnStats, UniverseMonitor, csr_rows, simulated_leg_ticks
+from spread_toolkit.rolling import EwmaStats
+
+FORMULAS = ["RB10 - HC10*0.9", "RB10 / HC10", "I09 - J09*0.5 + 100", "HC10 - I09*3", "J09*2 - RB10"]
+LEGS = ["RB10", "HC10", "I09", "J09"]
+
+
+def test_csr_rows():
+    indptr = np.array([0, 2, 2, 5, 6])
+    positions, counts = csr_rows(indptr, np.array([2, 0, 1, 3]))
+    np.testing.assert_array_equal(positions, [2, 3, 4, 0, 1, 5])
+    np.testing.assert_array_equal(counts, [3, 2, 0, 1])
+
+
+@pytest.mark.parametrize("recompute_chunk", [0, 2])
+def test_sma_column_stats_match_pandas_rolling(recompute_chunk):
+    rng = np.random.default_rng(12)
+    steps, columns, window = 300, 5, 20
+    # 价格水平高、波动小时增量更新的误差最明显
+    values = 3000.0 + np.cumsum(rng.normal(0.0, 1.0, (steps, columns)), axis = 0)
+    # 每列按自己的节奏更新，未更新的列不变
+    updated = rng.random((steps, columns)) < 0.6
+    stats = ColumnStats(columns, window, "sma", recompute_chunk)
+    history = [[] for _ in range(columns)]
+    for step in range(steps):
+        cols = np.flatnonzero(updated[step])
+        stats.update(cols, values[step, cols])
+        for column in cols.tolist():
+            history[column].append(values[step, column])
+
+        for column in range(columns):
+            if not history[column]:
+                continue
+            series = pd.Series(history[column])
+            assert stats.count[column] == len(series)
+            assert stats.mean[column] == pytest.approx(series.rolling(window, min_periods = 1).mean().iloc[-1], rel = 1e-12)
+            expected_std = series.rolling(window, min_periods = 1).std(ddof = 0).iloc[-1]
+            assert stats.std[column] == pytest.approx(expected_std, rel = 1e-6, abs = 1e-9)
+
+
+def test_ewma_column_stats_match_scalar_stats():
+    rng = np.random.default_rng(13)
+    values = 3000.0 + np.cumsum(rng.normal(0.0, 1.0, (200, 3)), axis = 0)
+    stats = ColumnStats(3, 20, "ewma")
+    scalars = [EwmaStats(20) for _ in range(3)]
+    for row in values:
+        stats.update(np.arange(3), row)
+        for scalar, value in zip(scalars, row):
+            scalar.update(value)
+    np.testing.assert_allclose(stats.mean, pd.DataFrame(values).ewm(span = 20, adjust = False).mean().iloc[-1], rtol = 1e-12)
+    np.testing.assert_allclose(stats.std, [scalar.std for scalar in scalars], rtol = 1e-10)
+
+    with pytest.raises(ValueError):
+        ColumnStats(3, 20, "median")
+
+
+def make_ticks(moment: datetime, prices: dict) -> list:
+    return [
+        TickData(gateway_name = "SIM", symbol = symbol, exchange = Exchange.LOCAL, datetime = moment, last_price = price)
+        for symbol, price in prices.items()
+    ]
+
+
+def test_universe_monitor_ranking_after_update_ticks():
+    rng = np.random.default_rng(14)
+    window = 5
+    monitor = UniverseMonitor(FORMULAS, window = window, bar_interval = 60.0, top_n = 3, publish_interval = None, recompute_chunk = 1)
+    published = []
+    monitor.subscribe(lambda table, timestamp: published.append(timestamp))
+
+    prices = dict(zip(LEGS, [3600.0, 3700.0, 800.0, 2500.0]))
+    start = datetime(2023, 1, 3, 9, 0)
+    closes = []
+    for minute in range(30):
+        for second in (0, 20, 40):
+            # 每批只有部分腿有新价格，同一条腿可能出现两次
+            moving = [leg for leg in LEGS if rng.random() < 0.5]
+            ticks = []
+            for leg in moving:
+                prices[leg] = round(prices[leg] + rng.normal(0.0, 5.0), 1)
+                ticks.extend(make_ticks(start + timedelta(minutes = minute, seconds = second), {leg: prices[leg] - 1.0}))
+                ticks.extend(make_ticks(start + timedelta(minutes = minute, seconds = second), {leg: prices[leg]}))
+            if minute == 0 and second == 0:
+                ticks = make_ticks(start, prices)
+            monitor.update_ticks(ticks)
+        closes.append([compile_formula(formula).evaluate(prices) for formula in FORMULAS])
+
+    # 当前价差与直接计算相同
+    expected_spread = np.array(closes[-1])
+    np.testing.assert_allclose(monitor.spread, expected_spread, rtol = 1e-12)
+    assert monitor.bars == 29
+    assert len(published) == monitor.updates
+
+    # 滚动统计量来自已完成的29根K线
+    bars = pd.DataFrame(closes[:-1], columns = FORMULAS)
+    mean = bars.rolling(window).mean().iloc[-1].to_numpy()
+    std = bars.rolling(window).std(ddof = 0).iloc[-1].to_numpy()
+    np.testing.assert_allclose(monitor.stats.mean, mean, rtol = 1e-10)
+    np.testing.assert_allclose(monitor.stats.std, std, rtol = 1e-6)
+
+    zscores = (expected_spread - mean) / std
+    order = np.argsort(-np.abs(zscores), kind = "stable")
+    table = monitor.table
+    assert table["formula"].to_list() == [FORMULAS[i] for i in order[:3]]
+    np.testing.assert_allclose(table["zscore"], zscores[order[:3]], rtol = 1e-6)
+    assert (table["bars"] == 29).all()
+    assert monitor.ranking(0)["formula"].to_list() == [FORMULAS[i] for i in order]
+
+
+def test_universe_monitor_waits_for_all_legs_and_min_periods():
+    monitor = UniverseMonitor(FORMULAS[:2], window = 3, bar_interval = 1.0, symbol_map = {"RB10": "RB2310"})
+    monitor.update("2023-01-03 09:00:00", ["rb2310", "ZN10"], [3600.0, 20000.0])
+    assert np.isnan(monitor.spread).all()
+    monitor.update("2023-01-03 09:00:00.5", ["HC10"], [3700.0])
+    np.testing.assert_allclose(monitor.spread, [3600.0 - 3330.0, 3600.0 / 3700.0])
+
+    # K线数量达到 min_periods 之前没有z_score
+    for second, price in enumerate([3610.0, 3620.0, 3615.0], start = 1):
+        assert monitor.ranking().empty
+        monitor.update(pd.Timestamp("2023-01-03 09:00:00") + pd.Timedelta(seconds = second), [0], [price])
+    assert monitor.bars == 3
+    assert len(monitor.ranking()) == 2
+
+
+def test_simulated_leg_ticks():
+    feed = list(simulated_leg_ticks(LEGS, 50, prices = [3600.0, 3700.0, 800.0, 2500.0], seed = 1))
+    assert len(feed) == 50
+    timestamp, legs, prices = feed[0]
+    np.testing.assert_array_equal(legs, np.arange(4))
+    np.testing.assert_array_equal(prices, [3600.0, 3700.0, 800.0, 2500.0])
+    assert feed[1][0] - timestamp == pd.Timedelta("500ms")
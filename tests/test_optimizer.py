@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from spread_toolkit.backtest import backtest_zscore_grid
+from spread_toolkit.optimizer import ZscoreGridOptimizer
+
+
+def random_spreads(count: int, n: int = 300):
+    rng = np.random.default_rng(7)
+    for i in range(count):
+        steps = rng.integers(-3, 4, n) if i % 2 else rng.normal(0.0, 1.0, n)
+        yield pd.Series(1000.0 + np.cumsum(steps), index = pd.date_range("2020-01-01", periods = n))
+
+
+def test_optimizer_matches_backtest():
+    ranges = {"ma_window": [5, 10, 20], "volume_multiplier": [1, 5], "max_pos": [5, 25]}
+    for spread in random_spreads(40):
+        results = ZscoreGridOptimizer(spread, ranges, max_workers = 1).run()
+        for row in results.drop_duplicates(["ma_window", "volume_multiplier", "max_pos"]).itertuples():
+            expected = backtest_zscore_grid(spread, row.ma_window, row.volume_multiplier, row.max_pos)
+            assert row.total_pnl == expected.total_pnl
+            assert row.trade_count == np.count_nonzero(expected.trades["volume"])
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spread_toolkit.formula import compile_formula
+from spread_toolkit.parallel import ParallelSpreadRunner, SharedArray, split_batches
+from spread_toolkit.seasonal import seasonal_frame
+
+FORMULAS = ["RB10 - HC10*0.9", "RB10*1.6 - I09 - J09*0.5", "HC10 / RB10", "J09 - I09 + 100", "-HC10"]
+
+
+@pytest.fixture(scope = "module")
+def leg_prices():
+    rng = np.random.default_rng(6)
+    index = pd.date_range("2019-01-01", "2022-06-30", freq = "D").append(pd.DatetimeIndex(["2022-06-30 14:00"]))
+    prices = pd.DataFrame(
+        3000.0 + np.cumsum(rng.normal(0.0, 10.0, (len(index), 4)), axis = 0),
+        index = index, columns = ["RB10", "HC10", "I09", "J09"],
+    )
+    prices.iloc[10, 1] = np.nan
+    return prices
+
+
+def test_shared_array_round_trip():
+    array = np.arange(12, dtype = np.int64).reshape(3, 4)
+    shared = SharedArray.from_array(array)
+    name, shape, dtype = shared.spec
+    assert shape == (3, 4) and np.dtype(dtype) == np.int64
+
+    # 按名字读取的是同一块内存，两边的修改互相可见
+    attached = SharedArray.attach(shared.spec)
+    np.testing.assert_array_equal(attached.array, array)
+    attached.array[1, 2] = -1
+    assert shared.array[1, 2] == -1
+    attached.close()
+    shared.close()
+    with pytest.raises(FileNotFoundError):
+        SharedArray.attach((name, shape, dtype))
+
+    filled = SharedArray.create((2, 0), np.float64, fill = np.nan)
+    assert filled.array.shape == (2, 0)
+    filled.close()
+
+
+def test_split_batches():
+    items = list(range(7))
+    batches = split_batches(items, 3)
+    assert batches == [[0, 3, 6], [1, 4], [2, 5]]
+    assert split_batches(items, 20) == [[i] for i in items]
+    assert split_batches([], 4) == []
+
+
+@pytest.mark.parametrize("max_workers", [2, 3])
+def test_evaluate_formulas_matches_serial(leg_prices, max_workers):
+    serial = ParallelSpreadRunner(max_workers = 1).evaluate_formulas(leg_prices, FORMULAS)
+    parallel = ParallelSpreadRunner(max_workers = max_workers).evaluate_formulas(leg_prices, FORMULAS)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+    assert list(serial.columns) == FORMULAS
+    for formula in FORMULAS:
+        expected = compile_formula(formula).evaluate({leg: leg_prices[leg] for leg in leg_prices.columns})
+        np.testing.assert_allclose(serial[formula].to_numpy(), expected.to_numpy(), rtol = 1e-12)
+
+
+def test_split_by_year_matches_seasonal_frame(leg_prices):
+    spreads = ParallelSpreadRunner(max_workers = 1).evaluate_formulas(leg_prices, FORMULAS[:2])
+    serial = ParallelSpreadRunner(max_workers = 1).split_by_year(spreads)
+    parallel = ParallelSpreadRunner(max_workers = 2).split_by_year(spreads)
+    for formula in FORMULAS[:2]:
+        pd.testing.assert_frame_equal(parallel[formula], serial[formula])
+        expected = seasonal_frame(spreads[formula])
+        np.testing.assert_array_equal(serial[formula].to_numpy(), expected.to_numpy())
+        assert list(serial[formula].columns) == [2019, 2020, 2021, 2022]
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spread_toolkit.plotting import downsample, downsample_indices, lttb_indices, minmax_indices
+
+
+@pytest.fixture(scope = "module")
+def values():
+    rng = np.random.default_rng(11)
+    values = np.cumsum(rng.normal(0.0, 1.0, 10007))
+    # 中间的尖峰
+    values[4321] = values.max() + 50.0
+    values[7654] = values.min() - 50.0
+    return values
+
+
+def test_lttb_keeps_endpoints_and_spikes(values):
+    indices = lttb_indices(values, 500)
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == len(values) - 1
+    assert (np.diff(indices) > 0).all()
+    # 尖峰与前后的点构成的三角形面积最大，一定被保留
+    assert 4321 in indices and 7654 in indices
+
+    # 点数不超过阈值或阈值太小时不降采样
+    np.testing.assert_array_equal(lttb_indices(values[:100], 100), np.arange(100))
+    np.testing.assert_array_equal(lttb_indices(values[:100], 2), np.arange(100))
+
+
+@pytest.mark.parametrize("threshold", [10, 333, 2000])
+def test_minmax_keeps_endpoints_and_extrema(values, threshold):
+    indices = minmax_indices(values, threshold)
+    assert indices[0] == 0 and indices[-1] == len(values) - 1
+    assert (np.diff(indices) > 0).all()
+    assert len(indices) <= threshold + 2
+    assert values[indices].max() == values.max() and values[indices].min() == values.min()
+
+    # 每个区间的最高点、最低点都被保留
+    buckets = threshold // 2
+    size = -(-len(values) // buckets)
+    for start in range(0, len(values), size):
+        chunk = values[start:start + size]
+        assert start + int(chunk.argmax()) in indices
+        assert start + int(chunk.argmin()) in indices
+
+
+def test_downsample_skips_missing_values(values):
+    series = pd.Series(values, index = pd.date_range("2023-01-03 09:00", periods = len(values), freq = "min"))
+    series.iloc[::7] = np.nan
+    series.iloc[-1] = np.nan
+
+    sampled = downsample(series, 300, method = "minmax")
+    assert sampled.notna().all()
+    assert sampled.index[0] == series.index[1] and sampled.index[-1] == series.index[-2]
+    assert sampled.max() == series.max() and sampled.min() == series.min()
+    assert len(downsample(series, 300)) == 300
+    assert downsample(series, None).equals(series.dropna())
+
+    with pytest.raises(ValueError):
+        downsample_indices(values, 100, method = "mean")
@@ -0,0 +1,31 @@
+import pandas as pd
+
+from conftest import DailyDataSource
+from spread_toolkit.price_cache import PriceCache
+
+
+def test_late_first_request_does_not_truncate_history(tmp_path):
+    source = DailyDataSource({"X2112": ("2020-01-01", "2021-12-31")})
+    cache = PriceCache(str(tmp_path), source)
+    expected = source.get_price("X2112", "2020-01-01", "2021-12-31")
+    expected.index = expected.index.as_unit("ns")
+
+    late = cache.get_price("X2112", "2021-06-01", "2021-12-31", de_listed_date = "2021-12-31", listed_date = "2020-01-01")
+    assert late.index[0] == pd.Timestamp("2021-06-01")
+
+    full = cache.get_price("X2112", "2020-01-01", "2021-12-31", de_listed_date = "2021-12-31", listed_date = "2020-01-01")
+    assert len(full) == len(expected)
+    pd.testing.assert_frame_equal(full, expected, check_names = False, check_freq = False)
+
+    # 从上市日到退市日的缓存完整后不再访问数据源
+    calls = len(source.calls)
+    cache.get_price("X2112", "2020-01-01", "2021-12-31", de_listed_date = "2021-12-31", listed_date = "2020-01-01")
+    assert len(source.calls) == calls
+
+
+def test_cache_without_listed_date_still_fills_head(tmp_path):
+    source = DailyDataSource({"X2112": ("2020-01-01", "2021-12-31")})
+    cache = PriceCache(str(tmp_path), source)
+    cache.get_price("X2112", "2021-06-01", "2021-12-31", de_listed_date = "2021-12-31")
+    full = cache.get_price("X2112", "2020-01-01", "2021-12-31", de_listed_date = "2021-12-31")
+    assert len(full) == len(pd.bdate_range("2020-01-01", "2021-12-31"))
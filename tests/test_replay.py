@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from vnpy.trader.constant import Direction
+
+from spread_toolkit.backtest import load_strategy_class
+from spread_toolkit.replay import ReplayStrategyEngine, capacity_sweep, replay, synthetic_ticks
+
+
+class BreakoutStrategy:
+    """
+    只实现引擎接口的简单策略：空仓时以卖一价挂买单，持仓时以买一价加 take_profit 挂卖单。
+    """
+
+    def __init__(self, strategy_engine, strategy_name: str, spread, setting: dict) -> None:
+        self.strategy_engine = strategy_engine
+        self.strategy_name = strategy_name
+        self.spread = spread
+        self.take_profit = setting.get("take_profit", 1.0)
+        self.algoids = set()
+        self.spread_pos = 0.0
+        self.inited = False
+        self.trading = False
+        self.positions = []
+
+    def on_init(self) -> None:
+        pass
+
+    def on_start(self) -> None:
+        pass
+
+    def on_spread_data(self) -> None:
+        self.positions.append(self.spread_pos)
+        if self.algoids:
+            return
+        if self.spread_pos == 0:
+            order = (Direction.LONG, self.spread.ask_price)
+        else:
+            order = (Direction.SHORT, self.spread.bid_price + self.take_profit)
+        self.algoids.add(self.strategy_engine.start_algo(self, self.spread.name, order[0], order[1], 1, 0, 0, False, {}))
+
+    def update_spread_algo(self, algo) -> None:
+        if not algo.is_active():
+            self.algoids.discard(algo.algoid)
+
+    def on_spread_pos(self) -> None:
+        self.spread_pos = self.spread.net_pos
+
+
+def test_synthetic_ticks():
+    ticks = synthetic_ticks(500, freq = "250ms", price = 200.0, tick_size = 0.5, seed = 3)
+    assert len(ticks) == 500
+    assert (ticks.index[1:] - ticks.index[:-1] == pd.Timedelta("250ms")).all()
+    np.testing.assert_array_equal(ticks["ask_price"] - ticks["bid_price"], 0.5)
+    np.testing.assert_array_equal(ticks["bid_price"] % 0.5, 0.0)
+    pd.testing.assert_frame_equal(ticks, synthetic_ticks(500, freq = "250ms", price = 200.0, tick_size = 0.5, seed = 3))
+
+
+def test_match_fills_at_opposite_price():
+    engine = ReplayStrategyEngine()
+    strategy = engine.add_strategy(BreakoutStrategy, "stub")
+    long_id = engine.start_algo(strategy, "stub", Direction.LONG, 100.0, 2, 0, 0, False, {})
+    short_id = engine.start_algo(strategy, "stub", Direction.SHORT, 105.0, 1, 0, 0, False, {})
+
+    # 卖一价高于买单价格、买一价低于卖单价格，都不成交
+    engine.match("t0", 99.0, 101.0)
+    assert engine.trades == []
+    engine.match("t1", 99.0, 100.0)
+    assert engine.trades == [("t1", "stub", 2, 100.0)]
+    assert not engine.algos[long_id].is_active()
+    assert strategy.spread_pos == 2
+    engine.match("t2", 106.0, 107.0)
+    assert engine.trades[-1] == ("t2", "stub", -1, 106.0)
+    assert engine.algos[short_id].traded_price == 106.0
+    assert strategy.spread_pos == 1
+    assert engine.active_algos == []
+    assert [call[0] for call in engine.calls] == ["start_algo", "start_algo"]
+
+
+def test_fill_all_and_stop_algo():
+    engine = ReplayStrategyEngine()
+    strategy = engine.add_strategy(BreakoutStrategy, "stub")
+    stopped = engine.start_algo(strategy, "stub", Direction.LONG, 90.0, 1, 0, 0, False, {})
+    engine.start_algo(strategy, "stub", Direction.LONG, 90.0, 3, 0, 0, False, {})
+    engine.start_algo(strategy, "stub", Direction.SHORT, 110.0, 1, 0, 0, False, {})
+    engine.stop_algo(strategy, stopped)
+    engine.stop_algo(strategy, stopped)
+    assert engine.counters["stop_algo"] == 1
+
+    # 不比较委托价，全部以给定价格成交
+    engine.fill_all("t", 100.0)
+    assert strategy.spread_pos == 2
+    assert sorted(engine.trades) == [("t", "stub", -1, 100.0), ("t", "stub", 3, 100.0)]
+    assert engine.active_algos == []
+
+
+def test_replay_with_stub_strategy():
+    ticks = synthetic_ticks(2000, seed = 2)
+    engine = ReplayStrategyEngine()
+    strategies = [engine.add_strategy(BreakoutStrategy, f"stub{i}", {"take_profit": i + 1.0}) for i in range(3)]
+    engine.init_strategies()
+    report = replay(engine, ticks)
+
+    assert report.ticks == 2000 and report.strategies == 3
+    assert report.latency.count == 6000
+    assert report.counters["fill"] == len(engine.trades) > 0
+    for strategy in strategies:
+        assert len(strategy.positions) == 2000
+        assert strategy.spread_pos == sum(volume for _, name, volume, _ in engine.trades if name == strategy.strategy_name)
+    record = report.to_dict()
+    assert record["callbacks_per_second"] == pytest.approx(3 * record["ticks_per_second"])
+
+
+def test_capacity_sweep():
+    ticks = synthetic_ticks(500, seed = 4)
+    result = capacity_sweep(BreakoutStrategy, ticks, strategy_counts = (1, 2, 4), setting_factory = lambda i: {"take_profit": 1.0 + i})
+    assert result["strategies"].to_list() == [1, 2, 4]
+    assert (result["ticks"] == 500).all()
+    assert {"ticks_per_second", "callback_p99_us", "fill", "max_rss_mb"} <= set(result.columns)
+
+    # p99超过耗时预算后不再增加策略数量
+    result = capacity_sweep(BreakoutStrategy, ticks, strategy_counts = (1, 2, 4), latency_budget_us = 0.0)
+    assert result["strategies"].to_list() == [1]
+
+
+def test_replay_fills_update_positions():
+    strategy_class = load_strategy_class()
+    engine = ReplayStrategyEngine()
+    strategy = engine.add_strategy(strategy_class, "replay", {"ma_window": 20})
+    engine.init_strategies()
+    report = replay(engine, synthetic_ticks(20000, volatility = 2.0, seed = 1))
+
+    assert report.counters["fill"] > 0
+    assert strategy.spread_pos == sum(volume for _, _, volume, _ in engine.trades)
+    for algo in engine.algos.values():
+        if algo.traded:
+            # 买价差成交价不高于委托价，卖价差成交价不低于委托价
+            if algo.direction == Direction.LONG:
+                assert algo.traded_price <= algo.price
+            else:
+                assert algo.traded_price >= algo.price
+
+
+def test_fill_all_ignores_order_price():
+    engine = ReplayStrategyEngine()
+    strategy = engine.add_strategy(load_strategy_class(), "replay", {})
+    strategy.trading = True
+    engine.start_algo(strategy, "replay", Direction.LONG, -101.0, 2, 0, 0, False, {})
+    engine.start_algo(strategy, "replay", Direction.SHORT, -102.0, 1, 0, 0, False, {})
+
+    engine.match(None, -100.0, -100.0)
+    assert strategy.spread_pos == -1
+    engine.fill_all(None, -100.0)
+    assert strategy.spread_pos == 1
+    assert engine.active_algos == []
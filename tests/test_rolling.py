@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spread_toolkit.rolling import EwmaStats, RollingWindowStats, create_stats, rolling_mean_std
+
+
+def sequential(values, window, recompute_interval = None):
+    stats = RollingWindowStats(window, recompute_interval)
+    mean, std = [], []
+    for value in values:
+        stats.update(value)
+        mean.append(stats.mean if stats.inited else np.nan)
+        std.append(stats.std if stats.inited else np.nan)
+    return np.array(mean), np.array(std)
+
+
+@pytest.mark.parametrize("window, recompute_interval", [(1, None), (5, None), (20, 7), (33, 1), (60, 100)])
+@pytest.mark.parametrize("integer", [False, True])
+def test_vectorized_kernel_matches_incremental(window, recompute_interval, integer):
+    rng = np.random.default_rng(window)
+    if integer:
+        close = 3000.0 + np.cumsum(rng.integers(-3, 4, 2500)).astype(float)
+    else:
+        close = 100.0 + np.cumsum(rng.normal(0.0, 1.0, 2500))
+
+    mean, std = rolling_mean_std(close, window, recompute_interval)
+    expected_mean, expected_std = sequential(close, window, recompute_interval)
+    np.testing.assert_array_equal(mean, expected_mean)
+    np.testing.assert_array_equal(std, expected_std)
+
+    rolling = pd.Series(close).rolling(window)
+    np.testing.assert_allclose(mean[window - 1:], rolling.mean().to_numpy()[window - 1:], rtol = 1e-12)
+    np.testing.assert_allclose(std[window - 1:], rolling.std(ddof = 0).to_numpy()[window - 1:], rtol = 1e-6, atol = 1e-6)
+
+
+def test_recompute_is_exact():
+    close = np.array([1e8 + 0.1, 1e8 + 0.2, 1e8 + 0.3, 1e8 + 0.4])
+    stats = RollingWindowStats(3)
+    for value in close[:3]:
+        stats.update(value)
+    assert stats.mean == pytest.approx(1e8 + 0.2, abs = 1e-7)
+    assert stats.std == pytest.approx(np.std(close[:3]), rel = 1e-9)
+    mean, std = rolling_mean_std(close, 3)
+    assert np.isnan(mean[1]) and mean[2] == stats.mean and std[2] == stats.std
+
+
+def test_ewma_matches_pandas_recursion():
+    values = np.random.default_rng(1).normal(0.0, 1.0, 300).cumsum()
+    stats = create_stats("ewma", 20)
+    assert isinstance(stats, EwmaStats)
+    means = []
+    for value in values:
+        stats.update(value)
+        means.append(stats.mean)
+    expected = pd.Series(values).ewm(span = 20, adjust = False).mean().to_numpy()
+    np.testing.assert_allclose(means, expected, rtol = 1e-12)
+    with pytest.raises(ValueError):
+        create_stats("median", 20)
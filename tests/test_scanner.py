@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import REPO_DIR, DailyDataSource
+from spread_toolkit.analysis import SpreadCalculation
+from spread_toolkit.instrument_catalog import InstrumentCatalog
+from spread_toolkit.price_cache import PriceCache
+from spread_toolkit.scanner import SpreadScanner
+
+INSTRUMENTS_CSV = os.path.join(REPO_DIR, "2.Futures Inter-commodity arbitrage analysis", "20230722_all_instruments.csv")
+
+FORMULAS = ["RB10 - HC10*0.9", "RB10 - RB01", "RB10 / HC10"]
+
+
+@pytest.fixture(scope = "module")
+def catalog():
+    return InstrumentCatalog.from_csv(INSTRUMENTS_CSV)
+
+
+@pytest.mark.parametrize("back_adjust", [None, "difference"])
+def test_scanner_matches_spread_calculation(tmp_path, catalog, back_adjust):
+    cache = PriceCache(str(tmp_path / "cache"), DailyDataSource())
+    settings = dict(roll_reference = "start_delivery_date", roll_days_before = 3, back_adjust = back_adjust)
+    scanner = SpreadScanner(FORMULAS, catalog, cache, 3, **settings)
+    spreads = scanner.calculate_spreads()
+
+    for formula in FORMULAS:
+        calculation = SpreadCalculation(formula, 3, catalog = catalog, price_cache = cache, **settings)
+        calculation.calculate_spread()
+        expected = calculation.spread["spread"]
+        actual = spreads[formula].dropna()
+        assert len(expected) > 0
+        np.testing.assert_array_equal(actual.index.as_unit("ns").asi8, expected.index.as_unit("ns").asi8)
+        np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol = 1e-12, atol = 1e-9)
+
+
+def test_scanner_downloads_each_contract_once(tmp_path, catalog):
+    source = DailyDataSource()
+    scanner = SpreadScanner(FORMULAS, catalog, PriceCache(str(tmp_path / "cache"), source), 3)
+    scanner.download_legs()
+    order_book_ids = [call[0] for call in source.calls]
+    assert len(order_book_ids) == len(set(order_book_ids))
+    assert list(scanner.leg_prices.columns) == ["RB10", "HC10", "RB01"]
+    assert pd.DatetimeIndex(scanner.leg_prices.index).is_monotonic_increasing
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import REPO_DIR, DailyDataSource
+from spread_toolkit.analysis import SpreadCalculation
+from spread_toolkit.fetcher import ConcurrentFetcher
+from spread_toolkit.instrument_catalog import InstrumentCatalog
+from spread_toolkit.seasonal import expiry_seasonal_frame, seasonal_frame, trading_days_to_expiry
+
+INSTRUMENTS_CSV = os.path.join(REPO_DIR, "2.Futures Inter-commodity arbitrage analysis", "20230722_all_instruments.csv")
+
+
+@pytest.fixture(scope = "module")
+def catalog():
+    return InstrumentCatalog.from_csv(INSTRUMENTS_CSV)
+
+
+def test_seasonal_frame_rows_by_monthday():
+    index = pd.DatetimeIndex(["2020-02-28", "2020-02-29", "2021-02-28", "2021-03-01", "2021-03-01 14:00"])
+    frame = seasonal_frame(pd.Series([1.0, 2.0, 3.0, 4.0, 5.0], index = index))
+    assert list(frame.columns) == [2020, 2021]
+    assert frame.loc["02-29", 2020] == 2.0
+    assert np.isnan(frame.loc["02-29", 2021])
+    # 同一天只保留最后一个价格
+    assert frame.loc["03-01", 2021] == 5.0
+
+
+def test_trading_days_to_expiry():
+    index = pd.DatetimeIndex(["2023-01-02", "2023-01-03", "2023-01-05", "2023-01-06"])
+    days = trading_days_to_expiry(index, pd.DatetimeIndex(["2023-01-06"] * 3 + ["2023-01-10"]))
+    # 序列之后的日期按工作日补足
+    np.testing.assert_array_equal(days, [3, 2, 1, 2])
+
+
+def test_expiry_seasonal_uses_roll_schedule(catalog):
+    with ConcurrentFetcher(DailyDataSource(), max_workers = 2) as fetcher:
+        calculation = SpreadCalculation("RB10 - HC10*0.9", 3, catalog = catalog, fetcher = fetcher, roll_days_before = 5)
+        calculation.calculate_spread()
+    frame = calculation.expiry_seasonal(max_days = 120)
+    spread = calculation.spread["spread"]
+    contract_info = catalog.lookup("RB10", 3)
+
+    expiries = pd.to_datetime(contract_info["de_listed_date"]).dt.date.to_list()
+    assert list(frame.columns) == expiries
+    assert frame.index[0] == 120 and frame.index[-1] == 0
+    # 提前5个工作日换月，到期前5个交易日没有价格；最后一个合约不换月
+    assert frame.iloc[-5:, :-1].isna().all().all()
+    assert frame.iloc[-6].notna().all()
+    assert frame.iloc[-5:, -1].notna().all()
+
+    for expiry in expiries[:-1]:
+        # 距离到期120到5个交易日（换月日）的价差属于该合约
+        roll = pd.Timestamp(np.busday_offset(expiry, -5, roll = "backward"))
+        expected = spread[spread.index <= roll].iloc[-116:]
+        column = frame[expiry].dropna()
+        assert column.index[-1] == 5
+        np.testing.assert_array_equal(column.to_numpy(), expected.to_numpy())
+    assert expiry_seasonal_frame(spread, np.full(len(spread), np.datetime64(expiries[-1], "ns")), 120).shape == (121, 1)
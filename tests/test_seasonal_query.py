@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spread_toolkit.seasonal import seasonal_frame
+from spread_toolkit.seasonal_query import SeasonalIndex, rank_seasonal, slot_of
+
+WINDOW = 5
+
+
+@pytest.fixture(scope = "module")
+def spread():
+    rng = np.random.default_rng(9)
+    index = pd.bdate_range("2015-01-01", "2023-06-30")
+    # 整数价差，同一窗口内有相同的值
+    return pd.Series(np.round(100.0 + np.cumsum(rng.normal(0.0, 2.0, len(index)))), index = index)
+
+
+def brute_sample(spread: pd.Series, date, years: int) -> np.ndarray:
+    """
+    直接在季节图数据上截取 date 之前 years 年、同一日期前后 WINDOW 天的价差，跨年时接到相邻年份。
+    """
+    frame = seasonal_frame(spread)
+    flat = frame.to_numpy().T.ravel()
+    year = pd.Timestamp(date).year
+    slot = slot_of(date)
+    values = []
+    for prior in range(year - years, year):
+        if prior not in frame.columns:
+            continue
+        center = (prior - frame.columns[0]) * 366 + slot
+        values.extend(flat[max(center - WINDOW, 0):center + WINDOW + 1])
+    values = np.asarray(values)
+    return values[~np.isnan(values)]
+
+
+@pytest.mark.parametrize("date", ["2023-03-15", "2023-01-02", "2022-12-30", "2020-02-29"])
+@pytest.mark.parametrize("years", [1, 3, 5])
+def test_percentile_matches_brute_force(spread, date, years):
+    index = SeasonalIndex.from_spread(spread, WINDOW)
+    sample = brute_sample(spread, date, years)
+    np.testing.assert_array_equal(np.sort(index.sample(date, years)), np.sort(sample))
+
+    # 样本中的值（相同的值都计入）、样本之外的值
+    for value in [sample[0], sample[len(sample) // 2], np.median(sample) + 0.5, sample.min() - 1, sample.max() + 1]:
+        expected = 100.0 * np.count_nonzero(sample <= value) / len(sample)
+        assert index.percentile(value, date, years) == pytest.approx(expected)
+    assert index.percentile(sample.min() - 1, date, years) == 0.0
+    assert index.percentile(sample.max(), date, years) == 100.0
+    assert np.isnan(index.percentile(np.nan, date, years))
+
+
+def test_percentile_without_history(spread):
+    index = SeasonalIndex.from_spread(spread, WINDOW)
+    assert np.isnan(index.percentile(100.0, "2015-06-01", 5))
+    assert len(index.sample("2015-06-01", 5)) == 0
+
+
+def test_quantile_table_matches_nanquantile(spread):
+    index = SeasonalIndex.from_spread(spread, WINDOW)
+    quantiles = (0.1, 0.5, 0.9)
+    table = index.quantile_table(2023, 3, quantiles)
+    assert table.shape == (366, 3)
+    assert index.quantile_table(2023, 3, quantiles) is table
+    for date in ["2023-01-02", "2023-07-01", "2023-12-31"]:
+        expected = np.quantile(brute_sample(spread, date, 3), quantiles)
+        np.testing.assert_allclose(table[slot_of(date)], expected)
+        assert index.quantiles(date, 3, quantiles) == pytest.approx(dict(zip(quantiles, expected)))
+
+
+def test_drawdown():
+    index = pd.to_datetime(["2021-03-01", "2021-03-02", "2021-03-03", "2021-03-04", "2022-03-01", "2022-03-02", "2022-03-03"])
+    values = [10.0, 12.0, 9.0, 11.0, 5.0, 4.0, 6.0]
+    seasonal = SeasonalIndex.from_spread(pd.Series(values, index = index), window = 1)
+    np.testing.assert_array_equal(seasonal.drawdown("2023-03-01", "03-04", years = 2), [3.0, 1.0])
+    np.testing.assert_array_equal(seasonal.drawdown("2023-03-01", "03-04", years = 2, direction = "short"), [2.0, 2.0])
+    with pytest.raises(ValueError):
+        seasonal.drawdown("2023-03-01", "03-04", direction = "flat")
+
+
+def test_rank_seasonal(spread):
+    # 最新价差分别高于、等于、低于往年同期的全部或中位数价差
+    median = spread.copy()
+    median.iloc[-1] = np.median(brute_sample(spread, spread.index[-1], 5))
+    high = spread.copy()
+    high.iloc[-1] = spread.max() + 100
+    low = spread.copy()
+    low.iloc[-1] = spread.min() - 100
+    ranked = rank_seasonal({"high": high, "median": median, "low": low, "empty": spread.iloc[:0]}, years = 5, window = WINDOW, end = "12-31")
+
+    assert ranked["name"].to_list() == ["low", "median", "high"]
+    assert ranked["percentile"].iloc[0] == 0.0 and ranked["percentile"].iloc[-1] == 100.0
+    assert 40.0 < ranked["percentile"].iloc[1] < 60.0
+    base = SeasonalIndex.from_spread(median, WINDOW).query(float(median.iloc[-1]), median.index[-1], 5, "12-31")
+    assert ranked.loc[1, "percentile"] == pytest.approx(base["percentile"])
+    assert ranked.loc[1, "max_drawdown"] == pytest.approx(base["max_drawdown"])
+    assert {"q5", "q50", "q95", "n_obs", "median_drawdown"} <= set(ranked.columns)
+
+    # date 为查询日期时只使用该日期之前的价差
+    earlier = rank_seasonal({"median": spread}, years = 5, window = WINDOW, date = "2022-06-30")
+    assert earlier.loc[0, "date"] <= pd.Timestamp("2022-06-30")
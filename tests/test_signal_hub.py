@@ -0,0 +1,153 @@
+import datetime as dt
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from spread_toolkit.rolling import RollingWindowStats
+from spread_toolkit.signal_hub import SpreadSignalHub
+
+
+class RecordingBarGenerator:
+    def __init__(self, on_bar) -> None:
+        self.on_bar = on_bar
+        self.ticks = []
+
+    def update_tick(self, tick) -> None:
+        self.ticks.append(tick)
+
+
+def make_tick(seconds: float, price: float, volume: float = 10.0):
+    return SimpleNamespace(
+        datetime = dt.datetime(2023, 1, 3, 9, 0) + dt.timedelta(seconds = seconds),
+        last_price = price,
+        bid_price_1 = price - 1,
+        ask_price_1 = price + 1,
+        bid_volume_1 = volume,
+        ask_volume_1 = volume,
+    )
+
+
+def make_bar(i: int, close: float):
+    return SimpleNamespace(datetime = dt.datetime(2023, 1, 3, 9, 0) + dt.timedelta(minutes = i), close_price = close)
+
+
+@pytest.mark.parametrize("integer", [False, True])
+def test_hub_statistics_match_strategy(integer):
+    rng = np.random.default_rng(3)
+    if integer:
+        closes = 100.0 + np.cumsum(rng.integers(-2, 3, 2500)).astype(float)
+    else:
+        closes = 100.0 + np.cumsum(rng.normal(0.0, 1.0, 2500))
+    hub = SpreadSignalHub(RecordingBarGenerator)
+    received = {1: [], 5: [], 20: [], 60: []}
+    for window in received:
+        hub.subscribe("spread", window, lambda bar, mean, std, tick_ns, window = window: received[window].append((mean, std)))
+
+    for i, close in enumerate(closes):
+        hub.update_bar("spread", make_bar(i, close))
+
+    for window, values in received.items():
+        stats = RollingWindowStats(window)
+        expected = []
+        for close in closes:
+            stats.update(close)
+            expected.append((stats.mean, stats.std))
+        assert values == expected
+
+
+def test_late_subscription_uses_history():
+    hub = SpreadSignalHub(RecordingBarGenerator)
+    hub.subscribe("spread", 3, lambda bar, mean, std, tick_ns: None)
+    closes = [1.0, 2.0, 4.0, 8.0, 16.0]
+    for i, close in enumerate(closes[:4]):
+        hub.update_bar("spread", make_bar(i, close))
+
+    received = []
+    hub.subscribe("spread", 4, lambda bar, mean, std, tick_ns: received.append((mean, std)))
+    hub.update_bar("spread", make_bar(4, closes[4]))
+    assert received[0] == pytest.approx((np.mean(closes[1:]), np.std(closes[1:])))
+
+
+def test_hub_keeps_ticks_with_same_prices():
+    hub = SpreadSignalHub(RecordingBarGenerator)
+    hub.subscribe("spread", 5, lambda bar, mean, std, tick_ns: None)
+    first = make_tick(0, 100.0)
+    # 时间、价格相同，成交量不同的两个tick都是真实的行情
+    ticks = [first, first, make_tick(0, 100.0, volume = 20.0), make_tick(0, 101.0)]
+    for tick in ticks:
+        hub.update_tick("spread", tick)
+    assert hub.get_state("spread").bar_generator.ticks == [first, ticks[2], ticks[3]]
+
+
+def test_hub_dedups_by_source_round():
+    hub = SpreadSignalHub(RecordingBarGenerator)
+    hub.subscribe("spread", 5, lambda bar, mean, std, tick_ns: None)
+    strategies = ["a", "b", "c"]
+    updates = [make_tick(0, 100.0), make_tick(0, 100.0), make_tick(1, 101.0)]
+    for i, update in enumerate(updates):
+        # 每个策略各自生成一个内容相同的tick对象，晚启动的策略从第二次更新开始转发
+        for strategy in strategies[:2 + min(i, 1)]:
+            hub.update_tick("spread", SimpleNamespace(**vars(update)), strategy)
+    forwarded = hub.get_state("spread").bar_generator.ticks
+    assert [vars(tick) for tick in forwarded] == [vars(update) for update in updates]
+
+    # 第一个策略停止后，其余策略转发的更新照常处理
+    hub.unsubscribe("spread", None, "a")
+    for strategy in strategies[1:]:
+        hub.update_tick("spread", make_tick(2, 102.0), strategy)
+    assert len(forwarded) == 4
+
+
+def test_hub_passes_tick_time_to_subscribers():
+    received = []
+
+    class MinuteBarGenerator(RecordingBarGenerator):
+        def update_tick(self, tick) -> None:
+            super().update_tick(tick)
+            if len(self.ticks) > 1:
+                self.on_bar(SimpleNamespace(datetime = tick.datetime, close_price = tick.last_price))
+
+    hub = SpreadSignalHub(MinuteBarGenerator)
+    hub.subscribe("spread", 2, lambda bar, mean, std, tick_ns: received.append(tick_ns))
+    hub.update_tick("spread", make_tick(0, 100.0), "a", 111)
+    hub.update_tick("spread", make_tick(0, 100.0), "b", 112)
+    # 由另一个策略转发的tick合成出K线时，传回的是该tick到达的时间
+    hub.update_tick("spread", make_tick(60, 101.0), "b", 222)
+    hub.update_tick("spread", make_tick(60, 101.0), "a", 333)
+    hub.update_bar("spread", make_bar(10, 102.0))
+    assert received == [222, None]
+
+
+def test_hub_bars_match_bar_generator():
+    from vnpy.trader.constant import Exchange
+    from vnpy.trader.object import TickData
+    from vnpy.trader.utility import BarGenerator
+
+    rng = np.random.default_rng(5)
+    start = dt.datetime(2023, 1, 3, 9, 0)
+    updates = []
+    for i in range(2000):
+        # 每个时间戳有两个tick，价格可能相同
+        price = float(100 + rng.integers(-2, 3))
+        updates.append(dict(
+            gateway_name = "TEST", symbol = "spread", exchange = Exchange.LOCAL,
+            datetime = start + dt.timedelta(seconds = (i // 2) * 0.5),
+            last_price = price, bid_price_1 = price - 1, ask_price_1 = price + 1, volume = float(i),
+        ))
+
+    direct = []
+    generator = BarGenerator(direct.append)
+    for update in updates:
+        generator.update_tick(TickData(**update))
+
+    via_hub = []
+    hub = SpreadSignalHub()
+    hub.subscribe("spread", 5, lambda bar, mean, std, tick_ns: via_hub.append(bar))
+    for update in updates:
+        # 两个策略各自生成tick并转发
+        hub.update_tick("spread", TickData(**update), "a")
+        hub.update_tick("spread", TickData(**update), "b")
+
+    assert [(bar.datetime, bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume) for bar in via_hub] == \
+        [(bar.datetime, bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume) for bar in direct]
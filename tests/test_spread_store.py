@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import REPO_DIR, DailyDataSource
+from spread_toolkit.analysis import SpreadCalculation
+from spread_toolkit.fetcher import ConcurrentFetcher
+from spread_toolkit.instrument_catalog import InstrumentCatalog
+from spread_toolkit.panel import PricePanel
+from spread_toolkit.price_cache import PriceCache
+from spread_toolkit.spread_store import SpreadStore
+
+INSTRUMENTS_CSV = os.path.join(REPO_DIR, "2.Futures Inter-commodity arbitrage analysis", "20230722_all_instruments.csv")
+
+FORMULA = "RB10 - HC10*0.9"
+
+# 第一次计算时能下载到的最后一天，之后的行情在增量更新时才出现
+FIRST_RUN = "2022-08-15"
+
+
+@pytest.fixture(scope = "module")
+def catalog():
+    return InstrumentCatalog.from_csv(INSTRUMENTS_CSV)
+
+
+def calculation(catalog, **kwargs):
+    return SpreadCalculation(FORMULA, 3, catalog = catalog, **kwargs)
+
+
+def full_rebuild(catalog) -> pd.Series:
+    with ConcurrentFetcher(DailyDataSource(), max_workers = 2) as fetcher:
+        spread = calculation(catalog, fetcher = fetcher)
+        spread.calculate_spread()
+    return spread.spread["spread"]
+
+
+def assert_same_spread(actual: pd.Series, expected: pd.Series):
+    assert len(actual) == len(expected)
+    np.testing.assert_array_equal(actual.index.as_unit("ns").asi8, expected.index.as_unit("ns").asi8)
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol = 0, atol = 1e-9)
+
+
+def test_update_with_fetcher_matches_rebuild(tmp_path, catalog):
+    store = SpreadStore(str(tmp_path / "store"))
+    source = DailyDataSource(until = FIRST_RUN)
+    with ConcurrentFetcher(source, max_workers = 2) as fetcher:
+        first = calculation(catalog, fetcher = fetcher).update_spread(store)
+        assert first.watermark <= pd.Timestamp(FIRST_RUN)
+        source.until = None
+        updated = calculation(catalog, fetcher = fetcher).update_spread(store)
+    assert updated.watermark > first.watermark
+    assert_same_spread(updated.spread, full_rebuild(catalog))
+
+
+def test_update_with_panel_does_not_download(tmp_path, catalog, monkeypatch):
+    legs = pd.concat([catalog.lookup(leg, 3) for leg in ("RB10", "HC10")])
+    store = SpreadStore(str(tmp_path / "store"))
+    first_panel = PricePanel.from_price_cache(PriceCache(str(tmp_path / "first"), DailyDataSource(until = FIRST_RUN)), legs, dtype = np.float64)
+    full_panel = PricePanel.from_price_cache(PriceCache(str(tmp_path / "full"), DailyDataSource()), legs, dtype = np.float64)
+
+    # 面板中已有全部行情，不应访问rqdatac
+    def no_network():
+        raise AssertionError("使用面板时访问了rqdatac")
+
+    monkeypatch.setattr("spread_toolkit.analysis.ensure_rqdata", no_network)
+    monkeypatch.setattr("spread_toolkit.datasource.ensure_rqdata", no_network)
+    calculation(catalog, panel = first_panel).update_spread(store)
+    updated = calculation(catalog, panel = full_panel).update_spread(store)
+    assert_same_spread(updated.spread, full_rebuild(catalog))
+
+
+def test_update_with_price_cache_keeps_full_history(tmp_path, catalog):
+    store = SpreadStore(str(tmp_path / "store"))
+    with ConcurrentFetcher(DailyDataSource(until = FIRST_RUN), max_workers = 2) as fetcher:
+        calculation(catalog, fetcher = fetcher).update_spread(store)
+
+    # 增量更新时缓存为空，之后用同一个缓存完整计算时不能只有水位线之后的行情
+    cache = PriceCache(str(tmp_path / "cache"), DailyDataSource())
+    updated = calculation(catalog, price_cache = cache).update_spread(store)
+    expected = full_rebuild(catalog)
+    assert_same_spread(updated.spread, expected)
+
+    rebuilt = calculation(catalog, price_cache = cache)
+    rebuilt.calculate_spread()
+    assert_same_spread(rebuilt.spread["spread"], expected)
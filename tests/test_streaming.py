@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import REPO_DIR, DailyDataSource
+from spread_toolkit.analysis import SpreadCalculation
+from spread_toolkit.datasource import DataSource
+from spread_toolkit.fetcher import ConcurrentFetcher
+from spread_toolkit.instrument_catalog import InstrumentCatalog
+from spread_toolkit.panel import PricePanel
+from spread_toolkit.price_cache import PriceCache
+from spread_toolkit.streaming import stream_spread
+
+INSTRUMENTS_CSV = os.path.join(REPO_DIR, "2.Futures Inter-commodity arbitrage analysis", "20230722_all_instruments.csv")
+
+FORMULA = "RB10 - HC10*0.9"
+
+# 夜盘跨过零点的交易时段
+OVERNIGHT_HOURS = "21:01-01:00,09:01-10:15,10:31-11:30,13:31-15:00"
+
+
+class MinuteDataSource(DataSource):
+    """
+    每个工作日几根分钟K线的内存数据源，包括零点前后的夜盘，各合约缺少不同的K线。
+    """
+
+    # 相对交易日零点的分钟数
+    MINUTES = [-150, -60, 30, 9 * 60 + 30, 10 * 60 + 20, 14 * 60]
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1m") -> pd.DataFrame:
+        seed = sum(map(ord, order_book_id))
+        days = pd.bdate_range(start_date, end_date)
+        index = pd.DatetimeIndex([day + pd.Timedelta(minutes = minute) for day in days for minute in self.MINUTES])
+        minutes = (index - pd.Timestamp("2000-01-01")).total_seconds().to_numpy() // 60
+        index = index[(minutes + seed) % 7 != 0]
+        minutes = minutes[(minutes + seed) % 7 != 0]
+        close = 3000.0 + seed + minutes % 97
+        return pd.DataFrame({"open": close, "close": close}, index = index)
+
+
+@pytest.fixture(scope = "module")
+def catalog():
+    return InstrumentCatalog.from_csv(INSTRUMENTS_CSV)
+
+
+def concatenated(calculation: SpreadCalculation, chunk_days: int) -> pd.Series:
+    chunks = list(calculation.stream_spread(chunk_days))
+    assert len(chunks) > 1
+    return pd.concat(chunks)
+
+
+def assert_same_spread(actual: pd.Series, expected: pd.Series):
+    assert len(expected) > 0
+    assert len(actual) == len(expected)
+    np.testing.assert_array_equal(actual.index.as_unit("ns").asi8, expected.index.as_unit("ns").asi8)
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol = 1e-12, atol = 1e-9)
+
+
+@pytest.mark.parametrize("back_adjust", [None, "difference", "ratio"])
+@pytest.mark.parametrize("roll", [("de_listed_date", 0), ("start_delivery_date", 3)])
+def test_stream_matches_calculate_spread(catalog, back_adjust, roll):
+    roll_reference, roll_days_before = roll
+    with ConcurrentFetcher(DailyDataSource(), max_workers = 2) as fetcher:
+        calculation = SpreadCalculation(
+            FORMULA, 3, catalog = catalog, fetcher = fetcher, back_adjust = back_adjust,
+            roll_reference = roll_reference, roll_days_before = roll_days_before, trade_period_filter = True,
+        )
+        calculation.calculate_spread()
+        assert_same_spread(concatenated(calculation, 45), calculation.spread["spread"])
+
+
+def test_stream_uses_price_cache_and_panel(tmp_path, catalog, monkeypatch):
+    legs = pd.concat([catalog.lookup(leg, 3) for leg in ("RB10", "HC10")])
+    cache = PriceCache(str(tmp_path / "cache"), DailyDataSource())
+    panel = PricePanel.from_price_cache(PriceCache(str(tmp_path / "panel"), DailyDataSource()), legs, dtype = np.float64)
+
+    def no_network():
+        raise AssertionError("配置了行情来源时访问了rqdatac")
+
+    monkeypatch.setattr("spread_toolkit.analysis.ensure_rqdata", no_network)
+    monkeypatch.setattr("spread_toolkit.datasource.ensure_rqdata", no_network)
+    for kwargs in ({"price_cache": cache}, {"panel": panel}):
+        calculation = SpreadCalculation(FORMULA, 3, catalog = catalog, back_adjust = "difference", **kwargs)
+        calculation.calculate_spread()
+        assert_same_spread(concatenated(calculation, 60), calculation.spread["spread"])
+
+
+def test_stream_intraday_overnight_session(catalog):
+    instruments = catalog.all_instruments.copy()
+    instruments.loc[instruments["underlying_symbol"].isin(["RB", "HC"]), "trading_hours"] = OVERNIGHT_HOURS
+    catalog = InstrumentCatalog(instruments)
+    with ConcurrentFetcher(MinuteDataSource(), max_workers = 2) as fetcher:
+        calculation = SpreadCalculation(
+            FORMULA, 2, catalog = catalog, fetcher = fetcher, frequency = "1m",
+            max_staleness = pd.Timedelta(hours = 12), roll_days_before = 2,
+        )
+        calculation.calculate_spread()
+        expected = calculation.spread["spread"]
+        # 零点之后的夜盘价格也在价差中
+        assert (expected.index.hour == 0).any()
+        assert_same_spread(concatenated(calculation, 10), expected)
+
+        # 不通过 SpreadCalculation，直接用数据源分段计算
+        leg_contract_info = {leg: calculation.get_aligned_contract_info([leg])[0] for leg in ("RB10", "HC10")}
+        direct = pd.concat(stream_spread(
+            FORMULA, leg_contract_info, MinuteDataSource(), chunk_days = 10,
+            max_staleness = pd.Timedelta(hours = 12), roll_days_before = 2,
+        ))
+        assert_same_spread(direct, expected)
@@ -0,0 +1,136 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from conftest import REPO_DIR
+from spread_toolkit.analysis import SpreadCalculation
+from spread_toolkit.datasource import DataSource
+from spread_toolkit.fetcher import ConcurrentFetcher
+from spread_toolkit.instrument_catalog import InstrumentCatalog
+from spread_toolkit.trading_hours import SessionCalendar, align_to_calendar, minute_of_day, parse_trading_hours
+
+INSTRUMENTS_CSV = os.path.join(REPO_DIR, "2.Futures Inter-commodity arbitrage analysis", "20230722_all_instruments.csv")
+
+RB_HOURS = "21:01-23:00,09:01-10:15,10:31-11:30,13:31-15:00"
+OVERNIGHT_HOURS = "21:01-02:30,09:01-10:15,10:31-11:30,13:31-15:00"
+
+
+def minute(text: str) -> int:
+    return int(text[:2]) * 60 + int(text[3:5])
+
+
+def ns(*texts) -> np.ndarray:
+    return pd.DatetimeIndex(list(texts)).as_unit("ns").asi8
+
+
+def test_parse_trading_hours():
+    is_open = parse_trading_hours(RB_HOURS)
+    assert is_open.shape == (1440,)
+    assert is_open.sum() == 120 + 75 + 60 + 90
+    for text in ("21:01", "23:00", "09:01", "10:15", "10:31", "15:00"):
+        assert is_open[minute(text)]
+    for text in ("21:00", "23:01", "00:00", "10:16", "10:30", "15:01"):
+        assert not is_open[minute(text)]
+
+
+def test_overnight_session_crosses_midnight():
+    is_open = parse_trading_hours(OVERNIGHT_HOURS)
+    for text in ("23:59", "00:00", "02:30"):
+        assert is_open[minute(text)]
+    assert not is_open[minute("02:31")]
+
+    calendar = SessionCalendar(is_open)
+    # 跨零点的夜盘只算一个时段
+    assert calendar.segment_count == 4
+    assert calendar.segment[minute("23:59")] == calendar.segment[minute("00:00")] == calendar.segment[minute("02:30")]
+    assert calendar.segment[minute("03:00")] == -1
+
+
+def test_minute_of_day_uses_bar_end_time():
+    times = ns("2023-01-03 21:00:30", "2023-01-03 21:01:00", "2023-01-03 23:59:30")
+    np.testing.assert_array_equal(minute_of_day(times), [minute("21:01"), minute("21:01"), 0])
+
+
+def test_session_key():
+    calendar = SessionCalendar.from_trading_hours(OVERNIGHT_HOURS)
+    assert SessionCalendar.from_trading_hours(OVERNIGHT_HOURS) is calendar
+    keys = calendar.session_key(ns(
+        "2023-01-03 21:30", "2023-01-03 23:59", "2023-01-04 00:30", "2023-01-04 02:30",
+        "2023-01-04 09:30", "2023-01-04 10:45", "2023-01-04 21:30", "2023-01-04 05:00",
+    ))
+    # 同一个夜盘（跨零点）的编号相同，日盘各时段、下一个夜盘的编号不同，休市为-1
+    assert keys[0] == keys[1] == keys[2] == keys[3]
+    assert len(set(keys[[0, 4, 5, 6]])) == 4
+    assert keys[7] == -1
+
+
+def test_calendar_intersection():
+    index_hours = SessionCalendar.from_trading_hours("09:31-11:30,13:01-15:00")
+    common = SessionCalendar.intersection([SessionCalendar.from_trading_hours(RB_HOURS), index_hours, None])
+    assert common.contains(ns("2023-01-03 09:45", "2023-01-03 13:45"))[0]
+    assert not common.contains(ns("2023-01-03 09:15", "2023-01-03 13:15", "2023-01-03 21:30")).any()
+    assert SessionCalendar.intersection([None]) is None
+
+
+def test_align_to_calendar_staleness():
+    calendar = SessionCalendar.from_trading_hours(RB_HOURS)
+    minutes = pd.date_range("2023-01-03 09:01", "2023-01-03 09:10", freq = "1min")
+    a_times = minutes.as_unit("ns").asi8
+    b_times = ns("2023-01-03 09:01", "2023-01-03 09:05")
+    a_values = np.arange(10.0)
+    b_values = np.array([100.0, 105.0])
+
+    times, matrix = align_to_calendar([a_times, b_times], [a_values, b_values], calendar, "2min")
+    # 09:01、09:05 之后两分钟内向前填充，超过两分钟的价格视为缺失
+    expected = pd.DatetimeIndex(["2023-01-03 09:01", "2023-01-03 09:02", "2023-01-03 09:03",
+                                 "2023-01-03 09:05", "2023-01-03 09:06", "2023-01-03 09:07"])
+    np.testing.assert_array_equal(times, expected.as_unit("ns").asi8)
+    np.testing.assert_array_equal(matrix[:, 1], [100.0, 100.0, 100.0, 105.0, 105.0, 105.0])
+    np.testing.assert_array_equal(matrix[:, 0], [0.0, 1.0, 2.0, 4.0, 5.0, 6.0])
+
+    # 不向前填充时与时间戳取交集相同
+    times, matrix = align_to_calendar([a_times, b_times], [a_values, b_values], calendar)
+    np.testing.assert_array_equal(times, b_times)
+    np.testing.assert_array_equal(matrix, [[0.0, 100.0], [4.0, 105.0]])
+
+
+def test_align_to_calendar_fills_within_session_only():
+    calendar = SessionCalendar.from_trading_hours(OVERNIGHT_HOURS)
+    a_times = ns("2023-01-03 14:59", "2023-01-03 21:01", "2023-01-03 23:30", "2023-01-04 00:30", "2023-01-04 03:00")
+    b_times = ns("2023-01-03 15:00", "2023-01-03 23:00")
+    a_values = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+    b_values = np.array([10.0, 20.0])
+
+    times, matrix = align_to_calendar([a_times, b_times], [a_values, b_values], calendar, "12h")
+    # 日盘收盘价不填到夜盘；夜盘内跨过零点向前填充；休市时间的价格不参与对齐
+    np.testing.assert_array_equal(times, ns("2023-01-03 15:00", "2023-01-03 23:00", "2023-01-03 23:30", "2023-01-04 00:30"))
+    np.testing.assert_array_equal(matrix, [[1.0, 10.0], [2.0, 20.0], [3.0, 20.0], [4.0, 20.0]])
+
+    # cross_session 为True时允许跨时段填充
+    times, matrix = align_to_calendar([a_times, b_times], [a_values, b_values], calendar, "12h", cross_session = True)
+    assert times[1] == ns("2023-01-03 21:01")[0]
+    np.testing.assert_array_equal(matrix[1], [2.0, 10.0])
+
+
+class DayAndNightSource(DataSource):
+    """
+    每个工作日夜盘、上午休市期间和下午各一根分钟K线。
+    """
+
+    def get_price(self, order_book_id: str, start_date, end_date, frequency: str = "1m") -> pd.DataFrame:
+        days = pd.bdate_range(start_date, end_date)
+        index = pd.DatetimeIndex([day + pd.Timedelta(minutes = m) for day in days for m in (-150, 10 * 60 + 20, 14 * 60)])
+        close = 3000.0 + sum(map(ord, order_book_id)) + np.arange(len(index)) % 11
+        return pd.DataFrame({"close": close}, index = index)
+
+
+def test_spread_calculation_uses_catalog_trading_hours():
+    catalog = InstrumentCatalog.from_csv(INSTRUMENTS_CSV)
+    with ConcurrentFetcher(DayAndNightSource(), max_workers = 2) as fetcher:
+        calculation = SpreadCalculation("RB10 - HC10*0.9", 1, catalog = catalog, fetcher = fetcher, frequency = "1m")
+        calculation.calculate_spread()
+    index = calculation.spread.index
+    assert len(index) > 0
+    # 10:20 为上午的休市时间，不计算价差
+    assert set(zip(index.hour, index.minute)) == {(21, 30), (14, 0)}